@@ -0,0 +1,95 @@
+"""
+Compare the JSON codecs on realistic workspace responses and requests.
+
+Run with: PYTHONPATH=src python benchmarks/bench_codec.py
+
+Payloads:
+- list_objects: a response of 10,000 object infos with metadata
+- get_objects2: a response with one Genome-like object with 5,000 features
+- request: a get_objects2 request for 1,000 references
+"""
+import random
+import string
+import timeit
+
+from kbase_workspace_client.codec import StdlibCodec, OrjsonCodec
+
+_REPEAT = 5
+
+
+def _word(rand: random.Random, length: int) -> str:
+    return ''.join(rand.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def list_objects_response(rows: int = 10000) -> dict:
+    rand = random.Random(0)
+    infos = [
+        [objid, f'object_{objid}', 'KBaseGenomes.Genome-17.0', '2020-06-01T12:00:00+0000',
+         rand.randint(1, 20), 'username', 12345, 'username:narrative_1591017600000',
+         '%032x' % rand.getrandbits(128), rand.randint(1000, 10 ** 8),
+         {'Name': _word(rand, 12), 'Domain': 'Bacteria', 'Number features': '5000',
+          'GC content': str(rand.random())}]
+        for objid in range(1, rows + 1)
+    ]
+    return {'version': '1.1', 'result': [infos]}
+
+
+def get_objects2_response(features: int = 5000) -> dict:
+    rand = random.Random(0)
+    data = {
+        'id': 'genome',
+        'scientific_name': 'Escherichia coli',
+        'features': [
+            {'id': f'gene_{i}', 'type': 'gene',
+             'location': [['contig_1', rand.randint(1, 5 * 10 ** 6), '+', rand.randint(100, 3000)]],
+             'function': ' '.join(_word(rand, 8) for _ in range(4)),
+             'protein_translation': _word(rand, 300),
+             'md5': '%032x' % rand.getrandbits(128),
+             'aliases': [[_word(rand, 4), _word(rand, 6)]]}
+            for i in range(features)
+        ],
+    }
+    obj = {
+        'data': data,
+        'info': [1, 'genome', 'KBaseGenomes.Genome-17.0', '2020-06-01T12:00:00+0000', 1,
+                 'username', 12345, 'ws', '0' * 32, 10 ** 7, {}],
+        'provenance': [], 'refs': [], 'extracted_ids': {}, 'created': '2020-06-01T12:00:00+0000',
+    }
+    return {'version': '1.1', 'result': [{'data': [obj]}]}
+
+
+def get_objects2_request(refs: int = 1000) -> dict:
+    return {
+        'version': '1.1',
+        'method': 'Workspace.get_objects2',
+        'params': [{'objects': [{'ref': f'12345/{i}/1'} for i in range(refs)], 'no_data': 1}],
+    }
+
+
+def _best(func) -> float:
+    return min(timeit.repeat(func, number=1, repeat=_REPEAT))
+
+
+def main() -> None:
+    codecs = [StdlibCodec()]
+    try:
+        codecs.append(OrjsonCodec())
+    except ImportError:
+        print('orjson is not installed; only the standard library codec is measured')
+    payloads = [
+        ('list_objects response', list_objects_response()),
+        ('get_objects2 response', get_objects2_response()),
+        ('get_objects2 request', get_objects2_request()),
+    ]
+    print(f"{'payload':<24}{'codec':<8}{'KB':>8}{'dumps ms':>10}{'loads ms':>10}")
+    for (label, payload) in payloads:
+        encoded = StdlibCodec().dumps(payload)
+        for codec in codecs:
+            dumps = _best(lambda: codec.dumps(payload))
+            loads = _best(lambda: codec.loads(encoded))
+            print(f"{label:<24}{codec.name:<8}{len(encoded) / 1e3:>8.0f}"
+                  f"{dumps * 1000:>10.1f}{loads * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Offline benchmarks of the client APIs against the local mock KBase server.
+
+Run with: PYTHONPATH=src python benchmarks/run.py [--quick] [--only NAME ...] [--json PATH]
+
+The mock server runs in a child process, so that it does not compete with the client for the GIL,
+and adds `--latency` seconds to every response and limits each download connection to
+`--bandwidth` MB/s to stand in for a real network. Each benchmark runs `--repeat` times and
+reports:
+- throughput: items (or MB) per second of the median run
+- p50/p95/p99: latency of the individual requests, from a MetricsRecorder
+- requests: requests made per run
+- peak MiB: peak memory allocated by the client in one extra run traced with tracemalloc
+"""
+from multiprocessing import Pipe, Process
+from typing import Any, Callable, Dict, List, NamedTuple
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from kbase_workspace_client import WorkspaceClient
+from kbase_workspace_client.handles import HANDLE_MEMO
+from kbase_workspace_client.metrics import MetricsRecorder
+from test.mock_server import MockKBase
+
+_MIB = 1024 * 1024
+
+# Sizes of the synthetic data, for full and --quick runs
+_SIZES = {
+    'full': {'workspaces': 8, 'objects': 20000, 'data_bytes': 256, 'handles': 5000,
+             'refs': 2000, 'file_mib': 64},
+    'quick': {'workspaces': 2, 'objects': 2000, 'data_bytes': 256, 'handles': 500,
+              'refs': 200, 'file_mib': 4},
+}
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Runs the benchmark once, and returns the number of items it processed
+    run: Callable[[Any], int]
+    # Unit of the items, such as 'infos' or 'MB'
+    unit: str
+
+
+class _Context:
+    """Client, server details, and scratch directory shared by the benchmarks."""
+
+    def __init__(self, client: WorkspaceClient, url: str, sizes: dict, tmp_dir: str):
+        self.client = client
+        # Observers of the current benchmark, for clients the benchmark creates itself
+        self.observers = []  # type: list
+        self.url = url
+        self.sizes = sizes
+        self.tmp_dir = tmp_dir
+        self.file_id = 'bench_file'
+        self.handle_ids = [f'KBH_{idx}' for idx in range(sizes['handles'])]
+        self.refs = [f'1/{objid}/1' for objid in range(1, sizes['refs'] + 1)]
+
+    def dest_path(self) -> str:
+        path = os.path.join(self.tmp_dir, 'download')
+        if os.path.exists(path):
+            os.remove(path)
+        return path
+
+
+def _list_objects(ctx: _Context) -> int:
+    return sum(1 for _ in ctx.client.generate_obj_infos(1))
+
+
+def _list_objects_chunked(ctx: _Context) -> int:
+    infos = ctx.client.generate_obj_infos(
+        1, maxid=ctx.sizes['objects'], workers=4, chunk_size=ctx.sizes['objects'] // 8)
+    return sum(1 for _ in infos)
+
+
+def _scan_workspaces(ctx: _Context) -> int:
+    wsids = range(1, ctx.sizes['workspaces'] + 1)
+    return sum(1 for _ in ctx.client.scan_workspaces(wsids, workers=ctx.sizes['workspaces']))
+
+
+def _req_stream(ctx: _Context) -> int:
+    params = {'ids': [1], 'maxObjectID': ctx.sizes['objects']}
+    return sum(1 for _ in ctx.client.req_stream('list_objects', params, 'item'))
+
+
+def _get_objects(ctx: _Context) -> int:
+    return len(ctx.client.get_objects(ctx.refs))
+
+
+def _get_object_infos(ctx: _Context) -> int:
+    return len(ctx.client.get_object_infos(ctx.refs))
+
+
+def _handles_to_shock(ctx: _Context) -> int:
+    # Measure the lookups rather than the process-wide memo
+    HANDLE_MEMO.clear()
+    return len(ctx.client.handles_to_shock(ctx.handle_ids))
+
+
+def _download(connections: int) -> Callable[[_Context], int]:
+    def run(ctx: _Context) -> int:
+        # Eight ranges, when downloading in ranges
+        range_size = ctx.sizes['file_mib'] * _MIB // 8
+        ctx.client.download_shock_file(
+            ctx.file_id, ctx.dest_path(), connections=connections, range_size=range_size)
+        return ctx.sizes['file_mib'] * _MIB // 10 ** 6
+    return run
+
+
+def _async_get_objects(ctx: _Context) -> int:
+    from kbase_workspace_client.async_client import AsyncWorkspaceClient
+
+    async def run() -> int:
+        async with AsyncWorkspaceClient(ctx.url, observers=ctx.observers) as client:
+            chunks = [ctx.refs[idx:idx + 100] for idx in range(0, len(ctx.refs), 100)]
+            results = await asyncio.gather(*[
+                client.req('get_objects2', {'objects': [{'ref': ref} for ref in chunk]})
+                for chunk in chunks
+            ])
+        return sum(len(result['data']) for result in results)
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+BENCHMARKS = [
+    Benchmark('generate_obj_infos', _list_objects, 'infos'),
+    Benchmark('generate_obj_infos_chunked', _list_objects_chunked, 'infos'),
+    Benchmark('scan_workspaces', _scan_workspaces, 'infos'),
+    Benchmark('req_stream', _req_stream, 'infos'),
+    Benchmark('get_objects', _get_objects, 'objects'),
+    Benchmark('get_object_infos', _get_object_infos, 'infos'),
+    Benchmark('handles_to_shock', _handles_to_shock, 'handles'),
+    Benchmark('download_shock_file', _download(1), 'MB'),
+    Benchmark('download_shock_file_ranged', _download(4), 'MB'),
+    Benchmark('async_get_objects', _async_get_objects, 'objects'),
+]
+
+
+def _serve(conn: Any, sizes: dict, latency: float, bandwidth: float) -> None:
+    """Run the mock server in a child process, sending its URL back through `conn`."""
+    server = MockKBase(latency=latency, bandwidth=bandwidth)
+    server.populate(workspaces=sizes['workspaces'], objects=sizes['objects'],
+                    data_bytes=sizes['data_bytes'])
+    server.add_shock_file(os.urandom(sizes['file_mib'] * _MIB), node_id='bench_file')
+    for idx in range(sizes['handles']):
+        server.add_handle(f'node_{idx}', f'KBH_{idx}')
+    server.start()
+    conn.send(server.url)
+    # Serve until the parent closes its end of the pipe
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+    server.stop()
+
+
+def _measure(bench: Benchmark, ctx: _Context, repeat: int) -> Dict[str, Any]:
+    recorder = MetricsRecorder()
+    ctx.client = WorkspaceClient(ctx.url, observers=[recorder], pool_maxsize=16)
+    ctx.observers = [recorder]
+    durations = []  # type: List[float]
+    items = 0
+    try:
+        # Warm up connections (and the server's code paths) without recording
+        bench.run(ctx)
+        recorder.reset()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            items = bench.run(ctx)
+            durations.append(time.perf_counter() - start)
+        requests = sum(series['requests'] for series in recorder.stats().values())
+        tracemalloc.start()
+        bench.run(ctx)
+        (_, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        ctx.client.close()
+    median = statistics.median(durations)
+    percentiles = [recorder.percentile(q) for q in (50, 95, 99)]
+    return {
+        'name': bench.name,
+        'items': items,
+        'unit': bench.unit,
+        'seconds': median,
+        'throughput': items / median,
+        'p50': percentiles[0],
+        'p95': percentiles[1],
+        'p99': percentiles[2],
+        'requests': requests // repeat,
+        'peak_mib': peak / _MIB,
+    }
+
+
+def _format_ms(seconds: Any) -> str:
+    return '-' if seconds is None else f'{seconds * 1000:.1f}'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--quick', action='store_true', help='use small synthetic data')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of each benchmark')
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='seconds the server waits before each response')
+    parser.add_argument('--bandwidth', type=float, default=25,
+                        help='MB/s of each download connection (0 for unlimited)')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='benchmarks to run')
+    parser.add_argument('--json', metavar='PATH', help='also write the results to a JSON file')
+    args = parser.parse_args()
+    benchmarks = [bench for bench in BENCHMARKS if not args.only or bench.name in args.only]
+    sizes = _SIZES['quick' if args.quick else 'full']
+    (parent_conn, child_conn) = Pipe()
+    server = Process(target=_serve, args=(child_conn, sizes, args.latency,
+                                          args.bandwidth * 10 ** 6 or None))
+    server.start()
+    url = parent_conn.recv()
+    tmp_dir = tempfile.mkdtemp()
+    results = []  # type: List[Dict[str, Any]]
+    try:
+        ctx = _Context(None, url, sizes, tmp_dir)
+        print(f"{'benchmark':<28}{'throughput':>18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'requests':>10}{'peak MiB':>10}")
+        for bench in benchmarks:
+            try:
+                result = _measure(bench, ctx, args.repeat)
+            except ImportError as err:
+                print(f"{bench.name:<28}skipped: {err}")
+                continue
+            results.append(result)
+            throughput = f"{result['throughput']:,.0f} {bench.unit}/s"
+            print(f"{bench.name:<28}{throughput:>18}{_format_ms(result['p50']):>9}"
+                  f"{_format_ms(result['p95']):>9}{_format_ms(result['p99']):>9}"
+                  f"{result['requests']:>10}{result['peak_mib']:>10.1f}")
+    finally:
+        shutil.rmtree(tmp_dir)
+        parent_conn.close()
+        server.join(timeout=10)
+        if server.is_alive():
+            server.terminate()
+    if args.json:
+        settings = {'sizes': sizes, 'latency': args.latency, 'bandwidth': args.bandwidth,
+                    'repeat': args.repeat}
+        with open(args.json, 'w') as fd:
+            json.dump({'settings': settings, 'results': results}, fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 Print all narrative UPAs for an environment to stdout
 """
 import os
+import sys
 
 from kbase_workspace_client import WorkspaceClient
 
@@ -11,13 +12,17 @@ assert 'KBASE_ENDPOINT' in os.environ, 'env var for KBase endpoint is required (
 ws_client = WorkspaceClient(
   url=os.environ['KBASE_ENDPOINT'],
   token=os.environ["TOKEN"],
+  pool_maxsize=16,
 )
 
-narr_ids = []
-for wsid in range(1, 60000):
-    try:
-        for objinfo in ws_client.generate_obj_infos(wsid, admin=True):
-            if objinfo[2] == 'KBaseNarrative.Narrative-4.0':
-                print(f"{objinfo[6]}/{objinfo[0]}/{objinfo[4]}")
-    except Exception:
-        continue
+scan = ws_client.scan_workspaces(
+    range(1, 60000),
+    filter=lambda objinfo: objinfo.type == 'KBaseNarrative.Narrative-4.0',
+    workers=16,
+    rate_limit=100,
+    admin=True,
+)
+with scan:
+    for objinfo in scan:
+        print(f"{objinfo.wsid}/{objinfo.objid}/{objinfo.version}")
+print(f"{len(scan.failures)} workspaces could not be scanned", file=sys.stderr)
@@ -1,4 +1,81 @@
+import importlib
+import sys
+
 from .main import WorkspaceClient, WSInfo, ObjInfo
 from .exceptions import WorkspaceResponseError
 
-__all__ = ['WorkspaceClient', 'WorkspaceResponseError', 'WSInfo', 'ObjInfo']
+# Names from the other submodules, which are only imported once one of their names is used
+_LAZY = {
+    'AsyncWorkspaceClient': 'async_client',
+    'StdlibCodec': 'codec',
+    'OrjsonCodec': 'codec',
+    'ObjectCache': 'cache',
+    'CacheStats': 'cache',
+    'RateLimiter': 'ratelimit',
+    'Resilience': 'resilience',
+    'RetryPolicy': 'resilience',
+    'CircuitBreaker': 'resilience',
+    'AIMDLimiter': 'resilience',
+    'WorkspaceScan': 'scan',
+    'ScanFailure': 'scan',
+    'ExportResult': 'export',
+    'ObjInfoIndex': 'index',
+    'SyncResult': 'index',
+    'ObjInfoTable': 'table',
+    'RefNode': 'traverse',
+    'SeqStats': 'seqstats',
+    'RecordStats': 'seqstats',
+    'RequestEvent': 'metrics',
+    'MetricsRecorder': 'metrics',
+    'Histogram': 'metrics',
+    'serve_metrics': 'metrics',
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ needs python 3.7, so import everything up front
+    for _name in _LAZY:
+        globals()[_name] = __getattr__(_name)
+
+__all__ = [
+    'WorkspaceClient',
+    'AsyncWorkspaceClient',
+    'WorkspaceResponseError',
+    'WSInfo',
+    'ObjInfo',
+    'ObjectCache',
+    'CacheStats',
+    'RateLimiter',
+    'Resilience',
+    'RetryPolicy',
+    'CircuitBreaker',
+    'AIMDLimiter',
+    'WorkspaceScan',
+    'ScanFailure',
+    'ExportResult',
+    'ObjInfoIndex',
+    'SyncResult',
+    'ObjInfoTable',
+    'RefNode',
+    'SeqStats',
+    'RecordStats',
+    'StdlibCodec',
+    'OrjsonCodec',
+    'RequestEvent',
+    'MetricsRecorder',
+    'Histogram',
+    'serve_metrics',
+]
@@ -0,0 +1,484 @@
+"""
+An asyncio version of the WorkspaceClient, built on aiohttp.
+
+Every HTTP request holds a slot in a semaphore while it runs, so a single client can keep a
+large, bounded number of workspace requests in flight. File writes for downloads are handed to
+the default executor so that streaming to disk never blocks the event loop.
+
+aiohttp is an optional dependency; install it with `pip install kbase_workspace_client[async]`.
+Both aiohttp and asyncio are imported on first use, so they add nothing to the package import.
+"""
+import time
+from typing import Optional, Any, AsyncGenerator, List, Sequence, TYPE_CHECKING
+
+from kbase_workspace_client.codec import default_codec
+from kbase_workspace_client.compression import GzipWriter
+from kbase_workspace_client.contigset_to_fasta import contigset_to_fasta
+from kbase_workspace_client.exceptions import (
+    WorkspaceResponseError,
+    IntegrityError,
+    UnauthorizedShockDownload,
+    MissingShockFile,
+)
+from kbase_workspace_client.integrity import Digest, VERIFY_ATTEMPTS
+from kbase_workspace_client.main import (
+    ObjInfo,
+    WSInfo,
+    Timeout,
+    _rpc_result,
+    _FinishedResponse,
+    _admin_payload,
+    _payload_method,
+    _validate_file_for_writing,
+    _download_obj_params,
+    _GENOME_ASSEMBLY_FIELDS,
+    _ASSEMBLY_FILE_FIELDS,
+    _READS_FILE_FIELDS,
+    _assembly_output_path,
+    _assembly_shock_id,
+    _reads_download_targets,
+    _genome_assembly_path,
+    _narrative_ref,
+)
+from kbase_workspace_client.metrics import NULL_PROBE, Observer, measure
+from kbase_workspace_client.shock import download_url, node_file_md5, node_file_size
+
+if TYPE_CHECKING:
+    import asyncio
+
+# Default number of requests allowed in flight at once
+DEFAULT_MAX_CONCURRENCY = 100
+# Size of each block read from the network and written to disk in downloads
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class AsyncWorkspaceClient:
+
+    def __init__(
+            self,
+            url: str,
+            token: str = None,
+            max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+            pool_maxsize: int = 0,
+            keep_alive: bool = True,
+            timeout: Timeout = None,
+            codec: Any = None,
+            observers: Optional[Sequence[Observer]] = None):
+        """
+        Instantiate the asyncio workspace client.
+
+        The underlying aiohttp session is created on the first request, so the client can be
+        constructed outside of a running event loop. Call `await close()` (or use the client with
+        `async with`) to release its connections.
+        Args:
+            url: URL of the workspace service with the root path
+            token: User or service authentication token from KBase. Optional.
+            max_concurrency: max number of requests (including downloads) in flight at once
+            pool_maxsize: max number of connections kept open to a single host (0 for no limit
+                other than `max_concurrency`)
+            keep_alive: reuse connections between requests
+            timeout: seconds to wait for the server, either as one number or as a
+                (connect, read) tuple. Defaults to waiting forever.
+            codec: JSON codec for request and response bodies (see `WorkspaceClient`)
+            observers: functions called with a RequestEvent as each request finishes (see
+                `WorkspaceClient`)
+        """
+        self._url = url.strip('/')
+        self._ws_url = url + '/ws'
+        self._token = token
+        self._max_concurrency = max_concurrency
+        self._pool_maxsize = pool_maxsize
+        self._keep_alive = keep_alive
+        self._timeout = timeout
+        self._codec = codec if codec is not None else default_codec()
+        self._observers = list(observers or [])
+        self._session = None  # type: Any
+        self._semaphore = None  # type: Optional[asyncio.Semaphore]
+
+    async def close(self) -> None:
+        """Close all pooled connections held by the client."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> 'AsyncWorkspaceClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _get_session(self) -> Any:
+        """Create the aiohttp session and semaphore inside the running event loop."""
+        if self._session is None:
+            import aiohttp
+            if isinstance(self._timeout, tuple):
+                (connect, read) = self._timeout
+                timeout = aiohttp.ClientTimeout(total=None, connect=connect, sock_read=read)
+            else:
+                timeout = aiohttp.ClientTimeout(total=self._timeout)
+            connector = aiohttp.TCPConnector(
+                limit=self._max_concurrency,
+                limit_per_host=self._pool_maxsize,
+                force_close=not self._keep_alive,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            import asyncio
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._session
+
+    async def _post(self, payload: dict, file_path: str = None) -> Any:
+        """Post a JSON-RPC payload to the workspace and process the response."""
+        session = self._get_session()
+        headers = {}
+        if self._token:
+            headers['Authorization'] = self._token
+        data = self._codec.dumps(payload)
+        (method, admin) = _payload_method(payload)
+        kind = 'rpc_download' if file_path else 'rpc'
+        with measure(self._observers, kind, method, admin, len(data)) as probe:
+            probe.attempt()
+            async with self._semaphore:
+                async with session.post(self._ws_url, data=data, headers=headers) as resp:
+                    probe.response(resp.status)
+                    if resp.status >= 400:
+                        raise WorkspaceResponseError(await _finish(resp, self._codec))
+                    if file_path:
+                        await _stream_to_file(resp, file_path, probe=probe)
+                        return None
+                    finished = await _finish(resp, self._codec)
+            probe.received(len(finished.content))
+            return _rpc_result(finished.json(), finished)
+
+    async def req(self, method: str, params: dict) -> Any:
+        """
+        Make a normal request to the workspace.
+        Args:
+            method: workspace method name (must be a funcdef in the KIDL spec)
+            params: parameters as python dicts, lists, and values
+        Returns:
+            python data (dicts/lists) of response data from the workspace.
+        Raises:
+            WorkspaceResponseError on an unsuccessful request.
+        """
+        _id = int(time.time() * 1000)
+        payload = {'version': '1.1', 'id': _id, 'method': method, 'params': [params]}
+        return await self._post(payload)
+
+    async def admin_req(self, method: str, params: dict) -> Any:
+        """
+        Make a special workspace admin command.
+        Args:
+            method: workspace method name (must be a funcdef in the KIDL spec)
+            params - parameters as python dicts, lists, and values
+        Returns:
+            python data (dicts/lists) of response data from the workspace.
+        Raises:
+            WorkspaceResponseError on an unsuccessful request.
+        """
+        return await self._post(_admin_payload(method, params))
+
+    async def generate_obj_infos(
+            self,
+            wsid: int,
+            minid: int = 1,
+            maxid: Optional[int] = None,
+            latest: bool = True,
+            admin: bool = False) -> AsyncGenerator[list, None]:
+        """
+        Async generator, yielding all object IDs + version IDs in a workspace.
+        This handles the 10k pagination and will generate *all* ids.
+        Args:
+            wsid: workspace ID
+            latest: Generate only the latest version of each obj, or generate
+                all versions of all objects.
+            admin: Make the "list_objects" request as a Workspace administrator
+        Yields:
+            Object info tuples (as python lists)
+        """
+        params = {"ids": [wsid]}  # type: dict
+        if maxid:
+            params['maxObjectID'] = maxid
+        if not latest:
+            params['showAllVersions'] = 1
+        while True:
+            params['minObjectID'] = minid
+            if admin:
+                part = await self.admin_req("listObjects", params)
+            else:
+                part = await self.req("list_objects", params)
+            if len(part) < 1:
+                break
+            minid = part[-1][0] + 1
+            for obj_info in part:
+                yield obj_info
+
+    async def req_download(self, method: str, params: dict, dest_path: str) -> None:
+        """
+        Make a workspace request and download the response to a file (streaming)
+        Args:
+            method - workspace method name (must be a funcdef in the KIDL spec)
+            params - parameters as python dicts, lists, and values
+            dest_path - filepath where you would like to write out results
+        Raises:
+            WorkspaceResponseError on an unsuccessful request.
+        """
+        _validate_file_for_writing(dest_path)
+        payload = {'version': '1.1', 'method': method, 'params': [params]}
+        await self._post(payload, dest_path)
+
+    async def admin_req_download(self, method: str, params: dict, dest_path: str) -> None:
+        """
+        Make an admin command and download the response to a file (streaming)
+        Args:
+            method - workspace method name (must be a funcdef in the KIDL spec)
+            params - parameters as python dicts, lists, and values
+            dest_path - filepath where you would like to write out results
+        Raises:
+            WorkspaceResponseError on an unsuccessful request.
+        """
+        _validate_file_for_writing(dest_path)
+        await self._post(_admin_payload(method, params), dest_path)
+
+    async def handle_to_shock(self, handle: str) -> str:
+        """
+        Convert a handle ID to a shock ID
+        Args:
+            handle: handle service ID
+        Returns:
+            The shock node ID
+        """
+        session = self._get_session()
+        headers = {'Content-Type': 'application/json'}
+        if self._token:
+            headers['Authorization'] = self._token
+        request_data = {
+            'method': 'AbstractHandle.hids_to_handles',
+            'params': [[handle]],
+            'id': "0"
+        }
+        data = self._codec.dumps(request_data)
+        with measure(self._observers, 'handle', 'hids_to_handles', bytes_sent=len(data)) as probe:
+            probe.attempt()
+            async with self._semaphore:
+                async with session.post(self._url + '/handle_service', data=data,
+                                        headers=headers) as resp:
+                    probe.response(resp.status)
+                    finished = await _finish(resp, self._codec)
+            probe.received(len(finished.content))
+            if finished.status_code >= 400:
+                raise RuntimeError(f"Error from handle_service: {finished.text}")
+            return finished.json()['result'][0][0]['id']
+
+    async def download_shock_file(
+            self,
+            shock_id: str,
+            dest_path: str,
+            compress: bool = False,
+            verify: bool = True) -> None:
+        """
+        Download a file from shock.
+        Args:
+            shock_id
+            dest_path
+            compress: save the file gzipped, as in `WorkspaceClient.download_shock_file`
+            verify: check the downloaded bytes against the node's size and checksum, as in
+                `WorkspaceClient.download_shock_file`
+        Raises:
+            UnauthorizedShockDownload or MissingShockFile on failure
+            RuntimeError if shock responds with an error
+            IntegrityError if the file still doesn't match after retrying
+        """
+        _validate_file_for_writing(dest_path)
+        session = self._get_session()
+        headers = {}
+        if self._token:
+            headers['Authorization'] = 'OAuth ' + self._token
+        # First, fetch some metadata about the file from shock
+        node_url = self._url + '/shock-api/node/' + shock_id
+        async with self._semaphore:
+            with measure(self._observers, 'shock_node', 'node') as probe:
+                probe.attempt()
+                async with session.get(node_url, headers=headers) as resp:
+                    probe.response(resp.status)
+                    finished = await _finish(resp, self._codec)
+                probe.received(len(finished.content))
+                if finished.status_code >= 400:
+                    raise RuntimeError(f"Error from shock: {finished.text}")
+                metadata = finished.json()
+                # Make sure the shock file is present and valid
+                if metadata['status'] == 401:
+                    raise UnauthorizedShockDownload(shock_id)
+                if metadata['status'] == 404:
+                    raise MissingShockFile(shock_id)
+        # Fetch and stream the actual file to dest_path
+        url = download_url(node_url, metadata, compress)
+        # Files that shock compresses for us can't be compared with what it stores
+        raw = verify and url.endswith('?download_raw')
+        (size, md5) = (node_file_size(metadata), node_file_md5(metadata)) if raw \
+            else (None, None)
+        for attempt in range(1, VERIFY_ATTEMPTS + 1):
+            digest = Digest(md5=md5 is not None)
+            # Each attempt takes its own slot, like any other request
+            async with self._semaphore:
+                with measure(self._observers, 'shock_download', 'download') as probe:
+                    probe.attempt()
+                    async with session.get(url, headers=headers) as resp:
+                        probe.response(resp.status)
+                        if resp.status >= 400:
+                            finished = await _finish(resp, self._codec)
+                            probe.received(len(finished.content))
+                            raise RuntimeError(f"Error from shock: {finished.text}")
+                        await _stream_to_file(resp, dest_path, compress, probe, digest)
+            try:
+                digest.check(dest_path, size, md5)
+                return
+            except IntegrityError:
+                if attempt >= VERIFY_ATTEMPTS:
+                    raise
+
+    async def download_assembly_fasta(self, ref: str, save_dir: str, admin: bool = False) -> str:
+        """
+        Download an Assembly object as fasta.
+        Args:
+            ref: a workspace reference ID in the form 'workspace_id/object_id/version'
+            save_dir: the path of a directory in which to save the fasta file
+            admin: whether to make the request as a Workspace administrator
+        Returns:
+            an absolute path of the downloaded fasta file.
+        """
+        # Only the fields that link an Assembly to its fasta file; a ContigSet's contigs are
+        # fetched afterwards
+        ws_obj = await self._download_obj(ref, admin=admin, included=_ASSEMBLY_FILE_FIELDS)
+        output_path = _assembly_output_path(ws_obj, save_dir)
+        if 'ContigSet' in ws_obj['info'][2]:
+            ws_obj = await self._download_obj(ref, admin=admin)
+            # Converting contigs is CPU and disk bound, so keep it off the event loop
+            import asyncio
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, contigset_to_fasta, ws_obj, output_path)
+        else:
+            shock_id = _assembly_shock_id(ws_obj)
+            if not shock_id:
+                shock_id = await self.handle_to_shock(ws_obj['data']['fasta_handle_ref'])
+            await self.download_shock_file(shock_id, output_path)
+        return output_path
+
+    async def download_reads_fastq(
+            self,
+            ref: str,
+            save_dir: str,
+            admin: bool = False,
+            compress: bool = False) -> List[str]:
+        """
+        Download genome reads data as fastq.
+
+        File names follow the same rules as `WorkspaceClient.download_reads_fastq`. For paired,
+        non-interleaved reads, both files are downloaded concurrently.
+        Args:
+            ref: a workspace reference ID in the form 'workspace_id/object_id/version'
+            save_dir: the path of a directory in which to save the fastq files
+            admin: whether to make the request as a Workspace administrator
+            compress: save the files gzipped, with a '.gz' suffix
+        Returns:
+            a list of paths of the downloaded fastq files.
+        """
+        ws_obj = await self._download_obj(ref, admin=admin, included=_READS_FILE_FIELDS)
+        to_download = _reads_download_targets(ws_obj, save_dir, compress)
+        import asyncio
+        await asyncio.gather(*[
+            self.download_shock_file(shock_id, path, compress=compress)
+            for (shock_id, path) in to_download
+        ])
+        return [path for (_, path) in to_download]
+
+    async def get_assembly_from_genome(self, ref: str, admin: bool = False) -> str:
+        """
+        Given a Genome object, fetch the reference to its Assembly object on the workspace.
+        Args:
+            ref is a workspace reference ID in the form 'workspace_id/object_id/version'
+        Returns:
+            workspace reference to an assembly object
+        """
+        ws_obj = await self._download_obj(ref, admin=admin, included=_GENOME_ASSEMBLY_FIELDS)
+        return _genome_assembly_path(ref, ws_obj)
+
+    async def find_narrative(self, wsid: int, admin: bool = False) -> Optional[ObjInfo]:
+        """
+        Fetch the narrative object out of a workspace.
+        Args:
+            wsid: workspace ID
+            admin: whether to make the request as a Workspace administrator
+        Returns:
+            None if no narrative present, or an ObjInfo for the narrative object.
+        """
+        req = self.admin_req if admin else self.req
+        ws_meth = "getWorkspaceInfo" if admin else "get_workspace_info"
+        ref = _narrative_ref(WSInfo(*await req(ws_meth, {"id": wsid})))
+        if ref is None:
+            return None
+        obj_meth = "getObjectInfo" if admin else "get_object_info3"
+        narr_info_raw = (await req(obj_meth, {"objects": [{"ref": ref}]}))["infos"][0]
+        return ObjInfo(*narr_info_raw)
+
+    async def get_object(
+            self,
+            ref: str,
+            fields: Optional[List[str]] = None,
+            admin: bool = False) -> dict:
+        """
+        Fetch one object with get_objects2.
+        Args:
+            ref: workspace reference or reference path
+            fields: object subpaths to fetch instead of the whole data (see
+                `WorkspaceClient.get_object`)
+            admin: make the request as a Workspace administrator
+        Returns:
+            The object data dict, as found in the "data" list of get_objects2
+        """
+        return await self._download_obj(ref, admin=admin, included=fields)
+
+    async def _download_obj(
+            self,
+            ref: str,
+            data: bool = True,
+            admin: bool = False,
+            included: Optional[List[str]] = None) -> dict:
+        """Download an object (or the `included` subpaths of its data) with get_objects2."""
+        params = _download_obj_params(ref, data, included)
+        if admin:
+            ws_obj = await self.admin_req("getObjects", params)
+        else:
+            ws_obj = await self.req("get_objects2", params)
+        return ws_obj['data'][0]
+
+
+async def _finish(resp: Any, codec: Any) -> _FinishedResponse:
+    """Read the full body of an aiohttp response."""
+    return _FinishedResponse(resp.status, await resp.read(), codec)
+
+
+async def _stream_to_file(
+        resp: Any,
+        file_path: str,
+        compress: bool = False,
+        probe: Any = NULL_PROBE,
+        digest: Optional[Digest] = None) -> None:
+    """
+    Write an aiohttp response body to a file, doing the disk writes in the executor.
+    With `compress`, the file is written gzipped. Bytes received are recorded on `probe`, and
+    counted and hashed by `digest`, if given.
+    """
+    import asyncio
+    loop = asyncio.get_event_loop()
+    fd = await loop.run_in_executor(None, open, file_path, 'wb')
+    try:
+        writer = GzipWriter(fd.write) if compress else fd
+        async for chunk in resp.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+            probe.received(len(chunk))
+            if digest is not None:
+                digest.update(chunk)
+            await loop.run_in_executor(None, writer.write, chunk)
+        if compress:
+            await loop.run_in_executor(None, writer.close)
+    finally:
+        await loop.run_in_executor(None, fd.close)
@@ -0,0 +1,160 @@
+"""
+Fetch objects and object infos for large lists of references.
+
+Reference lists are split into batches that the workspace handles comfortably, and the batches
+are sent concurrently from a thread pool. Results come back in the same order as the references.
+A failure is reported in place of the result for each reference it affected, rather than
+aborting the rest of the fetch:
+- References the workspace cannot access get an `InaccessibleWSObject` exception
+- If a whole batch fails (eg. a server error), each of its references gets that batch's exception
+- A batch whose response doesn't have one result per reference fails with `InvalidWSResponse`
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Union
+import copy
+
+from kbase_workspace_client.cache import credential_scope
+from kbase_workspace_client.exceptions import InaccessibleWSObject, InvalidWSResponse
+from kbase_workspace_client.main import ObjInfo
+
+# Default number of references in each get_objects2 request with and without object data
+DEFAULT_OBJECTS_CHUNK_SIZE = 100
+DEFAULT_NO_DATA_CHUNK_SIZE = 1000
+# Default number of references in each get_object_info3 request
+DEFAULT_INFOS_CHUNK_SIZE = 1000
+# Default number of batches in flight at once
+DEFAULT_WORKERS = 4
+
+
+def get_objects(
+        client: Any,
+        refs: Sequence[str],
+        no_data: bool = False,
+        included: Optional[List[str]] = None,
+        chunk_size: Optional[int] = None,
+        workers: int = DEFAULT_WORKERS,
+        admin: bool = False,
+        chsums: Optional[Sequence[Optional[str]]] = None) -> List[Union[dict, Exception]]:
+    """
+    Fetch many objects with get_objects2, in concurrent batches.
+
+    Objects with data are looked up in the client's ObjectCache first, if it has one; only the
+    misses are requested, and then cached.
+    Args:
+        client: the WorkspaceClient to make requests with
+        refs: workspace references or reference paths
+        no_data: leave out the object data, fetching only info, provenance, etc.
+        included: object subpaths to fetch instead of the whole data (eg. ['/assembly_ref'])
+        chunk_size: number of references per request. Defaults to 100, or 1000 with `no_data`.
+        workers: number of requests in flight at once
+        admin: make the requests as a Workspace administrator
+        chsums: known checksum of each object (or None where unknown), such as from the infos of
+            `traverse_refs`. Cached copies that don't match are fetched again.
+    Returns:
+        One entry per reference, in order: either the object data dict (as found in the "data"
+        list of get_objects2), or the exception that prevented fetching it.
+    """
+    if chsums is not None and len(chsums) != len(refs):
+        raise ValueError(f"Got {len(chsums)} checksums for {len(refs)} references")
+    if chunk_size is None:
+        chunk_size = DEFAULT_NO_DATA_CHUNK_SIZE if no_data else DEFAULT_OBJECTS_CHUNK_SIZE
+
+    def fetch(chunk: Sequence[str]) -> list:
+        objects = []  # type: List[dict]
+        for ref in chunk:
+            spec = {'ref': ref}  # type: dict
+            if included:
+                spec['included'] = included
+            objects.append(spec)
+        params = {'objects': objects, 'ignoreErrors': 1}  # type: dict
+        if no_data:
+            params['no_data'] = 1
+        if admin:
+            return client.admin_req("getObjects", params)['data']
+        return client.req("get_objects2", params)['data']
+    cache = None if no_data else getattr(client, '_cache', None)
+    if cache is None:
+        return _fetch_batched(fetch, refs, chunk_size, workers)
+    scope = credential_scope(client._ws_url, client._token, admin)
+    results = [
+        cache.get(ref, included, scope, chsum)
+        for (ref, chsum) in zip(refs, chsums or [None] * len(refs))
+    ]  # type: List[Any]
+    misses = [idx for (idx, result) in enumerate(results) if result is None]
+    fetched = _fetch_batched(fetch, [refs[idx] for idx in misses], chunk_size, workers)
+    for (idx, result) in zip(misses, fetched):
+        if not isinstance(result, Exception):
+            cache.put(refs[idx], result, included, scope)
+        results[idx] = result
+    return results
+
+
+def get_object_infos(
+        client: Any,
+        refs: Sequence[str],
+        chunk_size: int = DEFAULT_INFOS_CHUNK_SIZE,
+        workers: int = DEFAULT_WORKERS,
+        admin: bool = False) -> List[Union[ObjInfo, Exception]]:
+    """
+    Fetch many object infos with get_object_info3, in concurrent batches.
+    Args:
+        client: the WorkspaceClient to make requests with
+        refs: workspace references or reference paths
+        chunk_size: number of references per request
+        workers: number of requests in flight at once
+        admin: make the requests as a Workspace administrator
+    Returns:
+        One entry per reference, in order: either an ObjInfo or the exception that prevented
+        fetching it.
+    """
+    def fetch(chunk: Sequence[str]) -> list:
+        params = {
+            'objects': [{'ref': ref} for ref in chunk],
+            'includeMetadata': 1,
+            'ignoreErrors': 1,
+        }
+        if admin:
+            infos = client.admin_req("getObjectInfo", params)['infos']
+        else:
+            infos = client.req("get_object_info3", params)['infos']
+        return [ObjInfo(*info) if info is not None else None for info in infos]
+    return _fetch_batched(fetch, refs, chunk_size, workers)
+
+
+def _fetch_batched(
+        fetch: Callable[[Sequence[str]], list],
+        refs: Sequence[str],
+        chunk_size: int,
+        workers: int) -> list:
+    """Call `fetch` on chunks of refs in a thread pool and flatten the results in order."""
+    chunks = [refs[idx:idx + chunk_size] for idx in range(0, len(refs), chunk_size)]
+
+    def fetch_chunk(chunk: Sequence[str]) -> list:
+        try:
+            results = fetch(chunk)
+            if len(results) != len(chunk):
+                # Results are matched to references by position, so none of them can be trusted
+                raise InvalidWSResponse(
+                    f"{len(results)} results for a batch of {len(chunk)} references")
+        except Exception as err:
+            # Each reference gets its own exception, so callers can annotate or re-raise them
+            # separately
+            return [err] + [_copy_error(err) for _ in chunk[1:]]
+        return [
+            result if result is not None else InaccessibleWSObject(f"Cannot access {ref}")
+            for (ref, result) in zip(chunk, results)
+        ]
+    if len(chunks) <= 1 or workers <= 1:
+        batches = map(fetch_chunk, chunks)
+        return [result for batch in batches for result in batch]
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        return [result for batch in executor.map(fetch_chunk, chunks) for result in batch]
+
+
+def _copy_error(err: Exception) -> Exception:
+    """Another instance of an exception, with the same traceback."""
+    try:
+        return copy.copy(err).with_traceback(err.__traceback__)
+    except Exception:
+        # Exceptions that can't be rebuilt from their arguments are shared
+        return err
@@ -0,0 +1,280 @@
+"""
+A local cache for downloaded workspace objects.
+
+A fully versioned reference such as `123/4/5` (or a reference path made only of such references)
+always points to the same object data, so it is safe to keep that data around and skip the
+download next time. Unversioned references (`123/4`) and references that use workspace or object
+names can change, so they always bypass the cache.
+
+The cache has two tiers:
+- an in-memory LRU of encoded objects, bounded by total size
+- an optional on-disk store, also bounded by total size, that can be shared by several processes
+
+Access to an object depends on who asks for it, so entries are stored under a scope derived from
+the credentials that fetched them (see `credential_scope`), and are only returned to lookups with
+the same scope. Clients with different tokens can share a cache without reading each other's
+objects.
+
+Entries record the object's checksum (`chsum` in ObjInfo), so a lookup made with a known checksum,
+such as from an ObjInfo fetched earlier, drops an entry that doesn't match it.
+"""
+from collections import OrderedDict, namedtuple
+from typing import Any, List, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+# Snapshot of cache counters
+CacheStats = namedtuple('CacheStats', [
+    "memory_hits",
+    "disk_hits",
+    "misses",
+    "bypassed",
+    "evictions",
+])
+
+# A reference (or reference path) where every component is numeric and versioned
+_IMMUTABLE_REF = re.compile(r'^\d+/\d+/\d+(;\d+/\d+/\d+)*$')
+# When the disk store is over its limit, evict down to this fraction of the limit
+_EVICT_TO = 0.9
+_ENTRY_SUFFIX = '.json'
+
+DEFAULT_MAX_MEMORY_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 10 * 1024 * 1024 * 1024
+
+
+def credential_scope(url: str, token: Optional[str], admin: bool = False) -> str:
+    """
+    Cache scope of the objects fetched from a workspace with a token, as a user or an admin.
+    The token is hashed, so it is never written to the disk tier.
+    """
+    identity = json.dumps([url, token, admin])
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def is_immutable_ref(ref: str) -> bool:
+    """Whether a reference always points at the same object version."""
+    return bool(_IMMUTABLE_REF.match(ref))
+
+
+class ObjectCache:
+    """
+    Thread-safe, two-tier cache of workspace objects keyed by immutable references.
+
+    Objects are stored encoded, so each lookup returns a fresh copy that the caller is free to
+    modify.
+    """
+
+    def __init__(
+            self,
+            max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+            directory: Optional[str] = None,
+            max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        """
+        Args:
+            max_memory_bytes: max total size of encoded objects held in memory (0 to disable)
+            directory: directory for the on-disk tier. No disk tier if not given.
+            max_disk_bytes: max total size of the on-disk tier
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()  # type: OrderedDict
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(CacheStats._fields, 0)
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for (_, size, _) in self._disk_entries())
+
+    def get(self, ref: str, included: Optional[List[str]] = None,
+            scope: str = '', chsum: Optional[str] = None) -> Optional[dict]:
+        """
+        Look up an object.
+        Args:
+            ref: workspace reference or reference path
+            included: object subpaths that were fetched, if not the whole object
+            scope: scope the object was stored under, such as from `credential_scope`
+            chsum: expected object checksum. Entries with a different checksum are dropped.
+        Returns:
+            The object data dict (as from get_objects2), or None on a miss or bypass.
+        """
+        if not is_immutable_ref(ref):
+            self._count('bypassed')
+            return None
+        key = _cache_key(ref, included, scope)
+        with self._lock:
+            encoded = self._memory.get(key)
+            if encoded is not None:
+                self._memory.move_to_end(key)
+        tier = 'memory_hits'
+        if encoded is None and self.directory is not None:
+            encoded = self._read_disk(key)
+            tier = 'disk_hits'
+        if encoded is None:
+            self._count('misses')
+            return None
+        entry = json.loads(encoded)
+        if entry['key'] != key or (chsum is not None and entry['obj']['info'][8] != chsum):
+            self._discard(key)
+            self._count('misses')
+            return None
+        if tier == 'disk_hits':
+            self._put_memory(key, encoded)
+        self._count(tier)
+        return entry['obj']
+
+    def put(self, ref: str, ws_obj: dict, included: Optional[List[str]] = None,
+            scope: str = '') -> None:
+        """
+        Store an object, if its reference is immutable.
+        Args:
+            ref: workspace reference or reference path used to fetch the object
+            ws_obj: object data dict, as from get_objects2
+            included: object subpaths that were fetched, if not the whole object
+            scope: scope of the credentials that fetched the object, such as from
+                `credential_scope`. Only lookups with the same scope find it.
+        """
+        if not is_immutable_ref(ref):
+            return
+        key = _cache_key(ref, included, scope)
+        encoded = json.dumps({'key': key, 'obj': ws_obj}).encode()
+        self._put_memory(key, encoded)
+        if self.directory is not None:
+            self._write_disk(key, encoded)
+
+    def stats(self) -> CacheStats:
+        """Hit, miss, bypass, and eviction counts since the cache was created."""
+        with self._lock:
+            return CacheStats(**self._counts)
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        for (path, _, _) in self._disk_entries():
+            _remove_quietly(path)
+        with self._lock:
+            self._disk_bytes = 0
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[counter] += amount
+
+    def _put_memory(self, key: str, encoded: bytes) -> None:
+        if len(encoded) > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = encoded
+            self._memory_bytes += len(encoded)
+            while self._memory_bytes > self.max_memory_bytes:
+                (_, evicted) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+                self._counts['evictions'] += 1
+
+    def _discard(self, key: str) -> None:
+        """Drop an invalid entry from both tiers."""
+        with self._lock:
+            encoded = self._memory.pop(key, None)
+            if encoded is not None:
+                self._memory_bytes -= len(encoded)
+        if self.directory is not None:
+            _remove_quietly(self._disk_path(key))
+
+    def _disk_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + _ENTRY_SUFFIX)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as fd:
+                encoded = fd.read()
+            # Mark the entry as recently used for eviction
+            os.utime(path)
+        except OSError:
+            # Missing, or evicted by another process in the meantime
+            return None
+        return encoded
+
+    def _write_disk(self, key: str, encoded: bytes) -> None:
+        """Atomically write an entry, so other processes never see a partial file."""
+        path = self._disk_path(key)
+        entry_dir = os.path.dirname(path)
+        os.makedirs(entry_dir, exist_ok=True)
+        (fd, tmp_path) = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fwrite:
+                fwrite.write(encoded)
+            try:
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+        with self._lock:
+            # Overwriting an entry only adds the difference in size
+            self._disk_bytes += len(encoded) - replaced
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _disk_entries(self) -> List[Tuple[str, int, float]]:
+        """List (path, size, last used time) for every entry on disk."""
+        entries = []
+        for (dirpath, _, filenames) in os.walk(self.directory):
+            for name in filenames:
+                if not name.endswith(_ENTRY_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self) -> None:
+        """
+        Remove the least recently used entries until the store is under its limit.
+
+        Other processes may write or evict at the same time, so the directory is re-scanned
+        rather than trusting our own running total.
+        """
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for (_, size, _) in entries)
+        target = self.max_disk_bytes * _EVICT_TO
+        evicted = 0
+        for (path, size, _) in entries:
+            if total <= target:
+                break
+            _remove_quietly(path)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._counts['evictions'] += evicted
+
+
+def _cache_key(ref: str, included: Optional[List[str]], scope: str) -> str:
+    key = scope + ':' + ref if scope else ref
+    if not included:
+        return key
+    return key + '|' + ','.join(sorted(included))
+
+
+def _remove_quietly(path: Any) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
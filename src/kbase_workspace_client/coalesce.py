@@ -0,0 +1,120 @@
+"""
+Coalescing of concurrent identical requests ("single flight").
+
+When several threads make the same read-only request at the same moment, such as workers of a
+pool all resolving the assembly of one genome, only the first one is sent. The others wait for it
+and receive its result, or its exception. Requests are only coalesced while one is in flight;
+nothing is remembered once it finishes (see `ObjectCache` and the handle memo for that).
+
+Only methods that don't change anything on the server are coalesced, listed in
+`READ_ONLY_METHODS` and `READ_ONLY_ADMIN_COMMANDS`.
+"""
+from typing import Any, Callable, Dict, Hashable, Optional
+import json
+import threading
+
+# Workspace methods that are safe to share between concurrent callers
+READ_ONLY_METHODS = frozenset([
+    'ver',
+    'status',
+    'get_workspace_info',
+    'get_workspace_description',
+    'get_permissions_mass',
+    'get_objects2',
+    'get_object_info3',
+    'get_object_history',
+    'get_object_provenance',
+    'get_names_by_prefix',
+    'list_referencing_objects',
+    'list_workspace_info',
+    'list_workspace_ids',
+    'list_objects',
+    'list_modules',
+    'list_all_types',
+    'get_module_info',
+    'get_type_info',
+    'get_jsonschema',
+])
+
+# Workspace administration commands that are safe to share between concurrent callers
+READ_ONLY_ADMIN_COMMANDS = frozenset([
+    'listAdmins',
+    'getWorkspaceInfo',
+    'getWorkspaceDescription',
+    'getPermissions',
+    'getPermissionsMass',
+    'getObjects',
+    'getObjectInfo',
+    'getObjectHistory',
+    'listObjects',
+    'listWorkspaces',
+    'listWorkspaceIDs',
+])
+
+
+def is_read_only(method: str, admin: bool) -> bool:
+    """Whether a workspace method (or admin command) can be coalesced."""
+    return method in (READ_ONLY_ADMIN_COMMANDS if admin else READ_ONLY_METHODS)
+
+
+def rpc_key(url: str, method: str, admin: bool, params: Any) -> Hashable:
+    """Key identifying identical RPC calls: same URL, method, admin flag, and parameters."""
+    # Sort keys so that equal parameters built in a different order share a key
+    return ('rpc', url, method, admin, json.dumps(params, sort_keys=True, default=str))
+
+
+class _Flight:
+    """A call in flight, and its outcome once it finishes."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # type: Any
+        self.error = None  # type: Optional[BaseException]
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time, sharing its outcome with concurrent callers.
+
+    Callers that join a call in flight receive the very same result object as the caller that
+    made it, so results must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._flights = {}  # type: Dict[Hashable, _Flight]
+        self._lock = threading.Lock()
+        # Number of calls that were served by joining another call in flight
+        self.coalesced = 0
+
+    def do(self, key: Hashable, operation: Callable[[], Any]) -> Any:
+        """
+        Run `operation`, unless a call with the same key is in flight, in which case wait for
+        it and return its result (or raise its exception).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = operation()
+        except BaseException as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def in_flight(self) -> int:
+        """Number of distinct calls in flight."""
+        with self._lock:
+            return len(self._flights)
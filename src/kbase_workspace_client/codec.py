@@ -0,0 +1,62 @@
+"""
+JSON codecs for encoding requests and decoding responses.
+
+A codec turns python data into request body bytes, and response body bytes back into python
+data, without going through an intermediate `str`. `default_codec()` picks the fastest codec that
+is installed:
+- `OrjsonCodec`, using orjson (install it with `pip install kbase_workspace_client[fast-json]`)
+- `StdlibCodec`, using the standard library json module
+
+orjson only handles integers that fit in 64 bits, so the orjson codec falls back to the standard
+library for any payload it can't handle, and always returns the same data as `StdlibCodec`.
+"""
+from typing import Any
+import json
+
+
+class StdlibCodec:
+    """JSON codec using the standard library."""
+
+    name = 'json'
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    def loads(self, data: bytes) -> Any:
+        # json.loads detects the encoding of bytes itself
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """JSON codec using orjson, falling back to the standard library for payloads it rejects."""
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._stdlib = StdlibCodec()
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            # Convert non-string keys like the standard library does
+            return self._orjson.dumps(obj, option=self._orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Eg. integers over 64 bits
+            return self._stdlib.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        try:
+            return self._orjson.loads(data)
+        except self._orjson.JSONDecodeError:
+            # Re-parse to either handle what orjson can't (eg. huge integers), or raise the
+            # standard library's error
+            return self._stdlib.loads(data)
+
+
+def default_codec() -> Any:
+    """The fastest installed codec."""
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return StdlibCodec()
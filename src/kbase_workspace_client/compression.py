@@ -0,0 +1,85 @@
+"""
+Compression of request bodies and downloaded files.
+
+Responses are negotiated with `Accept-Encoding: gzip, deflate` and decompressed as they stream in
+by urllib3. Request bodies are only compressed when the client opts in, since not every server
+accepts a `Content-Encoding` on requests.
+
+Shock files can also be saved gzipped. Files that shock already stores gzipped, or that it
+compresses on the fly, are written exactly as they arrive; anything else is compressed on the
+client as it streams to disk.
+"""
+from typing import Any, Callable, Optional
+import zlib
+
+# Encodings the client can decode, sent in the Accept-Encoding header of every request
+ACCEPT_ENCODING = 'gzip, deflate'
+# Encodings the client can apply to request bodies
+REQUEST_ENCODINGS = ('gzip', 'deflate')
+# Request bodies smaller than this many bytes are sent uncompressed
+DEFAULT_COMPRESS_MIN_SIZE = 64 * 1024
+# zlib's fastest level: request bodies are compressed on every attempt, and files as they download
+COMPRESS_LEVEL = 1
+
+# First bytes of every gzip stream
+_GZIP_MAGIC = b'\x1f\x8b'
+# zlib window bits for the gzip and zlib ("deflate" in HTTP) container formats
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """Compress a request body with a Content-Encoding of 'gzip' or 'deflate'."""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, _WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def is_gzip_name(file_name: Optional[str]) -> bool:
+    """Whether a file name says its contents are already gzipped."""
+    return bool(file_name) and file_name.lower().endswith(('.gz', '.gzip'))
+
+
+class GzipWriter:
+    """
+    Writes a downloaded stream as a gzip file.
+
+    If the stream starts with the gzip magic bytes, it is written unchanged. Otherwise it is
+    compressed as it is written. Blocks are held back until there are enough bytes to tell.
+    """
+
+    def __init__(self, write: Callable[[bytes], int]):
+        """
+        Args:
+            write: writes bytes to the destination, such as the `write` method of a file
+        """
+        self._write = write
+        self._compressor = None  # type: Any
+        self._started = False
+        # Start of the stream, held back until it is long enough to check for the magic bytes
+        self._head = b''
+
+    def write(self, block: bytes) -> None:
+        if not block:
+            return
+        if not self._started:
+            self._head += bytes(block)
+            if len(self._head) < len(_GZIP_MAGIC):
+                return
+            self._start(self._head.startswith(_GZIP_MAGIC))
+            (block, self._head) = (self._head, b'')
+        if self._compressor is not None:
+            block = self._compressor.compress(block)
+        self._write(block)
+
+    def close(self) -> None:
+        """Write the end of the compressed stream, if the writer compressed it."""
+        if not self._started:
+            # A download too short to be gzipped (or empty) is compressed
+            self._start(False)
+            self._write(self._compressor.compress(self._head))
+        if self._compressor is not None:
+            self._write(self._compressor.flush())
+
+    def _start(self, gzipped: bool) -> None:
+        self._started = True
+        if not gzipped:
+            self._compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, _WBITS['gzip'])
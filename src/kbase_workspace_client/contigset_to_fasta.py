@@ -2,19 +2,31 @@
 A ContigSet is a legacy KBase datatype that stores all the contigs in a workspace object.
 
 This module provides a utility for converting that data into a fasta file.
+
+Contigs are written straight from their dicts into a buffered file, with each record built as a
+single string, so no per-contig sequence objects are created. The output is identical to
+Biopython's `SeqIO.write(..., "fasta")`, which remains available as an optional fallback
+(install it with `pip install kbase_workspace_client[biopython]`).
 """
-from Bio import SeqIO
-from Bio.SeqRecord import SeqRecord
-from Bio.Seq import Seq
+from typing import Any, Iterable
+import os
+
+# Sequence characters on each line of a fasta record
+DEFAULT_LINE_WIDTH = 60
+# Bytes buffered in memory before each write to disk
+DEFAULT_BUFFER_SIZE = 1024 * 1024
 
 
-def contigset_generate_contigs(ws_obj):
+def contigset_generate_contigs(ws_obj: dict) -> Iterable[Any]:
     """
     A generator that produces Bio.SeqRecord objects for every contig in a ContigSet.
+    Requires the optional `biopython` package.
     Args:
       ws_obj is a workspace data object -- must have a path for data/contigs
     yields SeqRecords
     """
+    from Bio.SeqRecord import SeqRecord
+    from Bio.Seq import Seq
     contigs = ws_obj['data']['contigs']
     for contig in contigs:
         rec = SeqRecord(
@@ -25,6 +37,72 @@ def contigset_generate_contigs(ws_obj):
         yield rec
 
 
-def contigset_to_fasta(ws_obj, output_path):
-    """Write out every contig to a fasta file."""
-    SeqIO.write(contigset_generate_contigs(ws_obj), output_path, "fasta")
+def contigset_to_fasta(ws_obj: dict, output_path: str, biopython: bool = False) -> None:
+    """
+    Write out every contig to a fasta file.
+    Args:
+        ws_obj: workspace data object with a path for data/contigs
+        output_path: fasta file to write
+        biopython: write the file with Biopython's SeqIO instead of the native writer
+    """
+    if biopython:
+        from Bio import SeqIO
+        SeqIO.write(contigset_generate_contigs(ws_obj), output_path, "fasta")
+    else:
+        write_fasta(ws_obj['data']['contigs'], output_path)
+
+
+def write_fasta(
+        contigs: Iterable[dict],
+        output_path: str,
+        line_width: int = DEFAULT_LINE_WIDTH,
+        buffer_size: int = DEFAULT_BUFFER_SIZE) -> int:
+    """
+    Write contigs to a fasta file as they are produced.
+    Args:
+        contigs: contig dicts with an `id`, a `sequence`, and an optional `description`. This can
+            be a generator, such as one from `req_stream`, so that the contigs are never all held
+            in memory at once.
+        output_path: fasta file to write
+        line_width: sequence characters on each line
+        buffer_size: bytes to buffer before writing to disk
+    Returns:
+        the number of contigs written
+    """
+    count = 0
+    try:
+        with open(output_path, 'w', buffering=buffer_size) as fwrite:
+            for contig in contigs:
+                fwrite.write(fasta_record(contig, line_width))
+                count += 1
+    except BaseException:
+        # Don't leave a partial file behind (eg. if a streamed response fails)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return count
+
+
+def fasta_record(contig: dict, line_width: int = DEFAULT_LINE_WIDTH) -> str:
+    """Format a contig dict as a fasta record, with the header and sequence lines."""
+    seq = contig['sequence']
+    lines = [seq[idx:idx + line_width] for idx in range(0, len(seq), line_width)]
+    lines.append('')
+    return '>' + _fasta_title(contig) + '\n' + '\n'.join(lines)
+
+
+def _fasta_title(contig: dict) -> str:
+    """Header line for a contig, following Biopython's conventions."""
+    contig_id = _clean(contig['id'])
+    description = _clean(contig.get('description') or '')
+    if description and description.split(None, 1)[0] == contig_id:
+        # The description already starts with the ID
+        return description
+    if description:
+        return contig_id + ' ' + description
+    return contig_id
+
+
+def _clean(text: str) -> str:
+    """Replace line breaks so the header stays on one line."""
+    return text.replace('\n', ' ').replace('\r', ' ')
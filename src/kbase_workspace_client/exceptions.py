@@ -14,6 +14,24 @@ class WorkspaceResponseError(RuntimeError):
         return f"Workspace error with code {self.status_code}:\n{self.resp_text}"
 
 
+class TransientResponseError(WorkspaceResponseError):
+    """A request failed in a way that may succeed if retried (eg. a 503 response)."""
+
+    def __init__(self, resp, retry_after=None):
+        super().__init__(resp)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(RuntimeError):
+    """Requests are failing fast after too many consecutive failures."""
+
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+
+    def __str__(self):
+        return f"Circuit breaker is open; requests resume in {self.retry_in:.1f}s"
+
+
 class UnauthorizedShockDownload(RuntimeError):
     """The user does not have access to this shock file."""
 
@@ -34,6 +52,30 @@ class MissingShockFile(RuntimeError):
         return "Missing shock file with ID " + self.id
 
 
+class MissingHandle(RuntimeError):
+    """The handle service has no handles for some of the given handle IDs."""
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __str__(self):
+        return "Missing handles with IDs " + ", ".join(self.ids)
+
+
+class IntegrityError(IOError):
+    """A downloaded file doesn't match the size or checksum declared by the server."""
+
+    def __init__(self, path, check, expected, actual):
+        self.path = path
+        # 'size' or 'md5'
+        self.check = check
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        return f"Downloaded {self.check} of {self.path} is {self.actual}, expected {self.expected}"
+
+
 class InvalidUser(Exception):
     """Invalid token for user; cannot authenticate."""
     pass
@@ -0,0 +1,270 @@
+"""
+Export many Assemblies or reads libraries to files at once.
+
+An export runs in three stages:
+- Objects are fetched in batches with get_objects, with only the fields that locate their files.
+  The contigs of legacy ContigSets are fetched one object at a time, as each file is written.
+- Handle IDs of the Assemblies that need them are resolved in bulk
+- Every file is written from a shared thread pool, so the shock files of different objects (and
+  both mates of a paired-end library) download concurrently
+
+All downloads share a byte rate limit and a budget of files open for writing. A result is yielded
+for each reference as soon as all of its files are done, in the order they finish. Files are named
+after their objects, so a reference whose files would take the path of another reference's (such
+as an object with the same name in another workspace) fails rather than overwriting them.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+import os
+import threading
+
+from kbase_workspace_client.batch import get_objects
+from kbase_workspace_client.contigset_to_fasta import contigset_to_fasta
+from kbase_workspace_client.exceptions import FileExists, MissingHandle
+from kbase_workspace_client.main import (
+    _ASSEMBLY_FILE_FIELDS,
+    _READS_FILE_FIELDS,
+    _assembly_output_path,
+    _assembly_shock_id,
+    _download_obj,
+    _reads_download_targets,
+)
+from kbase_workspace_client.ratelimit import RateLimiter
+
+# The outcome of exporting one reference. `error` is None on success, and `paths` are the files
+# written for the reference (which may be partial if `error` is set). `bytes` counts the bytes
+# downloaded from shock, and the bytes written for files made from the object data.
+ExportResult = namedtuple('ExportResult', ['ref', 'paths', 'error', 'bytes'])
+
+DEFAULT_WORKERS = 8
+
+# A file to write for a reference: downloaded from a shock ID or handle ID (gzipped if `compress`
+# is set), or written from the object data itself by `write(path)`
+_Target = namedtuple('_Target', ['path', 'shock_id', 'handle_id', 'write', 'compress'])
+
+
+def export_assemblies(
+        client: Any,
+        refs: Sequence[str],
+        save_dir: str,
+        workers: int = DEFAULT_WORKERS,
+        max_bytes_per_sec: Union[None, float, RateLimiter] = None,
+        max_open_files: Optional[int] = None,
+        progress: Optional[Callable[[str, int], None]] = None,
+        admin: bool = False) -> Iterator[ExportResult]:
+    """
+    Download the fasta files of many Assembly (or legacy ContigSet) objects.
+    Args:
+        client: the WorkspaceClient to make requests with
+        refs: workspace references to Assembly or ContigSet objects
+        save_dir: directory to save the fasta files in
+        workers: number of files downloaded or written at once
+        max_bytes_per_sec: max download rate across all files, or a shared RateLimiter of bytes
+        max_open_files: max number of files open for writing at once, if fewer than `workers`.
+            By default, one per worker.
+        progress: called with (ref, number of bytes) as each chunk of a file is downloaded
+        admin: fetch the objects as a Workspace administrator
+    Yields:
+        An ExportResult for each reference, as soon as its file is done
+    """
+    def plan(ref: str, ws_obj: dict) -> List[_Target]:
+        output_path = _assembly_output_path(ws_obj, save_dir)
+        if 'ContigSet' in ws_obj['info'][2]:
+            def write(path: str) -> None:
+                # Checked against the info from planning, in case the cache holds a stale copy
+                chsum = ws_obj['info'][8]
+                contigset_to_fasta(_download_obj(client, ref, admin=admin, chsum=chsum), path)
+            return [_Target(output_path, None, None, write, False)]
+        shock_id = _assembly_shock_id(ws_obj)
+        handle_id = None if shock_id else ws_obj['data']['fasta_handle_ref']
+        return [_Target(output_path, shock_id, handle_id, None, False)]
+    return _export(client, refs, plan, _ASSEMBLY_FILE_FIELDS, workers, max_bytes_per_sec,
+                   max_open_files, progress, admin)
+
+
+def export_reads(
+        client: Any,
+        refs: Sequence[str],
+        save_dir: str,
+        workers: int = DEFAULT_WORKERS,
+        max_bytes_per_sec: Union[None, float, RateLimiter] = None,
+        max_open_files: Optional[int] = None,
+        progress: Optional[Callable[[str, int], None]] = None,
+        admin: bool = False,
+        compress: bool = False) -> Iterator[ExportResult]:
+    """
+    Download the fastq files of many SingleEndLibrary or PairedEndLibrary objects.
+
+    Files are named as in `download_reads_fastq`.
+    Args:
+        client: the WorkspaceClient to make requests with
+        refs: workspace references to reads libraries
+        save_dir: directory to save the fastq files in
+        workers: number of files downloaded at once
+        max_bytes_per_sec: max download rate across all files, or a shared RateLimiter of bytes
+        max_open_files: max number of files open for writing at once, if fewer than `workers`.
+            By default, one per worker.
+        progress: called with (ref, number of bytes) as each chunk of a file is downloaded
+        admin: fetch the objects as a Workspace administrator
+        compress: save the files gzipped, with a '.gz' suffix
+    Yields:
+        An ExportResult for each reference, as soon as all of its files are done
+    """
+    def plan(ref: str, ws_obj: dict) -> List[_Target]:
+        return [
+            _Target(path, shock_id, None, None, compress)
+            for (shock_id, path) in _reads_download_targets(ws_obj, save_dir, compress)
+        ]
+    return _export(client, refs, plan, _READS_FILE_FIELDS, workers, max_bytes_per_sec,
+                   max_open_files, progress, admin)
+
+
+def _export(
+        client: Any,
+        refs: Sequence[str],
+        plan: Callable[[str, dict], List[_Target]],
+        included: List[str],
+        workers: int,
+        max_bytes_per_sec: Union[None, float, RateLimiter],
+        max_open_files: Optional[int],
+        progress: Optional[Callable[[str, int], None]],
+        admin: bool) -> Iterator[ExportResult]:
+    """
+    Fetch the `included` fields of the objects, plan the files for each one with
+    `plan(ref, ws_obj)`, and write the files from a thread pool.
+    """
+    # Export each reference once
+    refs = list(dict.fromkeys(refs))
+    limiter = max_bytes_per_sec
+    if isinstance(limiter, (int, float)):
+        limiter = RateLimiter(limiter, burst=limiter)
+    # Each worker has at most one file open, so only a smaller budget needs enforcing
+    open_files = None  # type: Optional[threading.BoundedSemaphore]
+    if max_open_files is not None and max_open_files < workers:
+        open_files = threading.BoundedSemaphore(max(1, max_open_files))
+    # Bytes downloaded for each reference
+    sizes = dict.fromkeys(refs, 0)  # type: Dict[str, int]
+    sizes_lock = threading.Lock()
+
+    def write_target(ref: str, target: _Target) -> None:
+        def on_chunk(nbytes: int) -> None:
+            if limiter is not None:
+                limiter.acquire(nbytes)
+            with sizes_lock:
+                sizes[ref] += nbytes
+            if progress is not None:
+                progress(ref, nbytes)
+        if open_files is not None:
+            with open_files:
+                write_file(ref, target, on_chunk)
+        else:
+            write_file(ref, target, on_chunk)
+
+    def write_file(ref: str, target: _Target, on_chunk: Callable[[int], None]) -> None:
+        if target.write is None:
+            client.download_shock_file(
+                target.shock_id, target.path, on_chunk=on_chunk, compress=target.compress)
+            return
+        target.write(target.path)
+        # Counted once the file is written, as it comes from object data rather than shock
+        nbytes = os.path.getsize(target.path)
+        with sizes_lock:
+            sizes[ref] += nbytes
+        if progress is not None:
+            progress(ref, nbytes)
+
+    # Stage 1: fetch the objects and work out the files to write
+    plans = {}  # type: Dict[str, List[_Target]]
+    # Reference whose files go to each path
+    owners = {}  # type: Dict[str, str]
+    for (ref, ws_obj) in zip(refs, get_objects(client, refs, included=included, admin=admin)):
+        if isinstance(ws_obj, Exception):
+            yield ExportResult(ref, [], ws_obj, 0)
+            continue
+        try:
+            targets = plan(ref, ws_obj)
+        except Exception as err:
+            yield ExportResult(ref, [], err, 0)
+            continue
+        clash = next((target.path for target in targets if target.path in owners), None)
+        if clash is not None:
+            # Two downloads into one file would clobber each other
+            yield ExportResult(ref, [], FileExists(
+                f"File {clash} is already being exported for {owners[clash]}"), 0)
+            continue
+        owners.update((target.path, ref) for target in targets)
+        plans[ref] = targets
+    # Stage 2: resolve the handles of every object in bulk
+    yield from _resolve_handles(client, plans)
+    if not plans:
+        return
+    # Stage 3: write every file from a shared pool
+    remaining = {ref: len(targets) for (ref, targets) in plans.items()}
+    errors = {}  # type: Dict[str, Exception]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = {
+            executor.submit(write_target, ref, target): ref
+            for (ref, targets) in plans.items()
+            for target in targets
+        }
+        try:
+            while pending:
+                (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ref = pending.pop(future)
+                    error = future.exception()
+                    if error is not None and ref not in errors:
+                        errors[ref] = error
+                    remaining[ref] -= 1
+                    if remaining[ref] == 0:
+                        paths = [target.path for target in plans[ref]]
+                        yield ExportResult(ref, paths, errors.get(ref), sizes[ref])
+        finally:
+            # Stopped early: let running files finish, but don't start any more
+            for future in pending:
+                future.cancel()
+
+
+def _resolve_handles(client: Any, plans: Dict[str, List[_Target]]) -> Iterator[ExportResult]:
+    """
+    Fill in the shock IDs of targets that only have a handle ID, in one bulk lookup.
+    References whose handles can't be resolved are removed from `plans` and yielded as failures.
+    """
+    handle_ids = [
+        target.handle_id
+        for targets in plans.values()
+        for target in targets
+        if target.handle_id is not None
+    ]
+    if not handle_ids:
+        return
+    try:
+        shock_ids = dict(zip(handle_ids, client.handles_to_shock(handle_ids)))
+    except MissingHandle as err:
+        # Only fail the references with missing handles. The others were remembered by the
+        # handle memo, so looking them up again makes no requests.
+        missing = set(err.ids)
+        yield from _drop_plans(plans, lambda target: target.handle_id in missing, err)
+        yield from _resolve_handles(client, plans)
+        return
+    except Exception as err:
+        yield from _drop_plans(plans, lambda target: target.handle_id is not None, err)
+        return
+    for (ref, targets) in plans.items():
+        plans[ref] = [
+            target._replace(shock_id=shock_ids[target.handle_id], handle_id=None)
+            if target.handle_id is not None else target
+            for target in targets
+        ]
+
+
+def _drop_plans(
+        plans: Dict[str, List[_Target]],
+        affected: Callable[[_Target], bool],
+        error: Exception) -> Iterator[ExportResult]:
+    """Remove the references with an affected target from `plans`, yielding them as failures."""
+    failed = [ref for (ref, targets) in plans.items() if any(map(affected, targets))]
+    for ref in failed:
+        del plans[ref]
+        yield ExportResult(ref, [], error, 0)
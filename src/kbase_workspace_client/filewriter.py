@@ -0,0 +1,242 @@
+"""
+Large-buffer write path for downloads.
+
+A FileWriter collects downloaded bytes in one preallocated buffer and writes it out in large
+writes, straight to the file descriptor. Identity-encoded responses are read with `readinto`
+directly from the socket into the free part of that buffer, so a download takes a handful of
+Python-level reads and one `write()` per buffer, and its bytes are never copied between Python
+objects on the way.
+
+Files can be preallocated to their final size up front, which keeps them contiguous on disk, and
+synced to disk when they are closed.
+"""
+from typing import Any, Callable, Optional, Union
+import http.client
+import os
+
+# Bytes collected before each write to disk. A multiple of the page size, so that writes
+# starting at an aligned offset stay aligned.
+DEFAULT_BUFFER_SIZE = 8 * 1024 * 1024
+# Content-Encoding values whose bytes on the wire are the body itself
+_IDENTITY = (None, '', 'identity')
+
+Bytes = Union[bytes, bytearray, memoryview]
+
+
+class FileWriter:
+    """
+    Writes a file, or a region of one, through a reusable preallocated buffer.
+
+    Use as a context manager; the buffer is written out and the file closed on exit. Closing
+    after an error skips the final write.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            offset: int = 0,
+            size: Optional[int] = None,
+            buffer_size: int = DEFAULT_BUFFER_SIZE,
+            fsync: bool = False,
+            truncate: bool = True,
+            buffer: Optional[bytearray] = None):
+        """
+        Args:
+            path: file to write
+            offset: position in the file to start writing at
+            size: preallocate the file to this many bytes, if given. A truncated file is cut back
+                to the bytes written when it is closed.
+            buffer_size: bytes collected before each write
+            fsync: flush the file to disk when it is closed
+            truncate: create or empty the file, rather than writing into an existing one
+            buffer: a buffer to reuse, such as one from an earlier writer in the same thread. A
+                new one of `buffer_size` bytes is allocated by default.
+        """
+        flags = os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+        if truncate:
+            flags |= os.O_CREAT | os.O_TRUNC
+        self._fd = os.open(path, flags, 0o666)
+        self._fsync = fsync
+        self._truncate = truncate
+        self._preallocated = size is not None
+        self._buffer = memoryview(buffer if buffer is not None else bytearray(buffer_size))
+        # Bytes of the buffer in use
+        self._used = 0
+        # Bytes written to the file, or waiting in the buffer
+        self.written = 0
+        try:
+            if size is not None:
+                _preallocate(self._fd, size)
+            if offset:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def write(self, data: Bytes) -> int:
+        """Copy bytes into the buffer, writing the buffer out each time it fills."""
+        view = memoryview(data).cast('B')
+        while view:
+            free = self.free()
+            count = min(len(free), len(view))
+            free[:count] = view[:count]
+            self.commit(count)
+            view = view[count:]
+        return len(data)
+
+    def free(self) -> memoryview:
+        """The unused part of the buffer, to read into. Follow with `commit`."""
+        if self._used == len(self._buffer):
+            self.flush()
+        return self._buffer[self._used:]
+
+    def commit(self, count: int) -> None:
+        """Record that `count` bytes were read into the start of the view from `free`."""
+        self._used += count
+        self.written += count
+
+    def flush(self) -> None:
+        """Write out the buffered bytes."""
+        view = self._buffer[:self._used]
+        while view:
+            view = view[os.write(self._fd, view):]
+        self._used = 0
+
+    def close(self, flush: bool = True) -> None:
+        try:
+            if flush:
+                self.flush()
+                if self._preallocated and self._truncate:
+                    # A short download leaves no preallocated tail behind
+                    os.ftruncate(self._fd, self.written)
+                if self._fsync:
+                    os.fsync(self._fd)
+        finally:
+            os.close(self._fd)
+
+    def __enter__(self) -> 'FileWriter':
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        self.close(flush=exc_type is None)
+
+
+def copy_response(
+        resp: Any,
+        writer: Any,
+        chunk_size: int,
+        on_block: Optional[Callable[[Bytes], None]] = None) -> int:
+    """
+    Copy a streamed requests response body into a writer.
+
+    When the writer is a FileWriter and the body isn't content-encoded, the body is read into the
+    writer's buffer: straight from the socket where urllib3 allows it, and otherwise through
+    urllib3's `read`. Other bodies are decoded and written in `chunk_size` chunks.
+    Args:
+        resp: a requests response, made with `stream=True`
+        writer: a FileWriter, or any object with a `write` method
+        chunk_size: max bytes to read at a time
+        on_block: called with each block read, before the writer may reuse its memory
+    Returns:
+        The number of bytes of the body received, before any decoding
+    Raises:
+        requests.exceptions.ChunkedEncodingError if the connection closes before the end of the
+            body, as `iter_content` does
+    """
+    if not (isinstance(writer, FileWriter) and
+            resp.headers.get('Content-Encoding') in _IDENTITY):
+        for block in resp.iter_content(chunk_size):
+            if on_block is not None:
+                on_block(block)
+            writer.write(block)
+        return resp.raw.tell()
+    fileobj = _socket_reader(resp)
+    # Including any of the body that urllib3 read before
+    received = resp.raw.tell()
+    while True:
+        view = writer.free()[:chunk_size]
+        count = _readinto(fileobj, view) if fileobj is not None else _read_raw(resp.raw, view)
+        if not count:
+            break
+        if on_block is not None:
+            on_block(view[:count])
+        writer.commit(count)
+        received += count
+    # http.client stops quietly when the connection closes early
+    declared = resp.headers.get('Content-Length')
+    if declared is not None and received < int(declared):
+        raise _incomplete(f"Connection closed after {received} of {declared} bytes")
+    if fileobj is not None:
+        # urllib3 didn't see the body being read; reading the finished body through it lets it
+        # put the connection back in the pool, rather than closing it along with the response
+        resp.raw.read()
+    return received
+
+
+def _socket_reader(resp: Any) -> Optional[http.client.HTTPResponse]:
+    """
+    The http.client response beneath a requests response, to read its body from the socket
+    straight into a buffer (urllib3's `readinto` reads into a new bytes object and copies it).
+    None if urllib3 doesn't expose one, or has already read some of the body into its own
+    buffers, which reading the socket directly would skip.
+    """
+    fileobj = getattr(resp.raw, '_fp', None)
+    if not isinstance(fileobj, http.client.HTTPResponse) or resp.raw.tell():
+        return None
+    return fileobj
+
+
+def _readinto(fileobj: http.client.HTTPResponse, view: memoryview) -> int:
+    """Read from the socket into a buffer, raising a cut-off body the way requests does."""
+    try:
+        return fileobj.readinto(view)
+    except http.client.IncompleteRead as err:
+        raise _incomplete(str(err))
+
+
+def _read_raw(raw: Any, view: memoryview) -> int:
+    """Read through urllib3 (or any file-like object) and copy the block into a buffer."""
+    # Only imported on first use, like requests
+    from urllib3.exceptions import ProtocolError
+    try:
+        block = raw.read(len(view))
+    except ProtocolError as err:
+        raise _incomplete(str(err))
+    view[:len(block)] = block
+    return len(block)
+
+
+def _incomplete(message: str) -> Exception:
+    """The error requests raises for a body that is cut off."""
+    import requests
+    return requests.exceptions.ChunkedEncodingError(message)
+
+
+def allocate(path: str, size: int, reserve: bool = False) -> None:
+    """
+    Create, or empty, a file of `size` bytes to be written at any offset.
+    Args:
+        path: file to create
+        size: size of the file in bytes
+        reserve: reserve the disk space up front, where the filesystem supports it. Otherwise the
+            file is sparse until it is written.
+    """
+    with open(path, 'wb') as fd:
+        if reserve:
+            _preallocate(fd.fileno(), size)
+        else:
+            fd.truncate(size)
+
+
+def _preallocate(fd: int, size: int) -> None:
+    """Reserve disk space for a file, or at least set its size where that isn't supported."""
+    fallocate = getattr(os, 'posix_fallocate', None)
+    if fallocate is not None and size > 0:
+        try:
+            fallocate(fd, 0, size)
+            return
+        except OSError:
+            # Not supported by the filesystem
+            pass
+    if os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
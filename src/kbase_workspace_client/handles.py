@@ -0,0 +1,89 @@
+"""
+Resolve handle service IDs to shock node IDs.
+
+The handle service's `hids_to_handles` method accepts a list, so handles are resolved in a few
+chunked requests rather than one request each. A handle always points at the same shock node, so
+resolved IDs are kept in a process-wide memo shared by every client with the same token.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from kbase_workspace_client.exceptions import MissingHandle
+from kbase_workspace_client.memo import TTLMemo
+
+# Default number of handle IDs to send in each hids_to_handles request
+DEFAULT_CHUNK_SIZE = 1000
+
+# Memo of (handle service URL, token, handle ID) to shock node ID, shared across clients
+HANDLE_MEMO = TTLMemo(maxsize=100000, ttl=24 * 60 * 60)
+
+
+def handles_to_shock(
+        transport: Any,
+        handle_url: str,
+        token: str,
+        handle_ids: Sequence[str],
+        chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[str]:
+    """
+    Convert handle IDs to shock node IDs, using the memo where possible.
+    Args:
+        transport: the client Transport to make the requests with
+        handle_url: URL of the handle service
+        token: authentication token, if any
+        handle_ids: handle service IDs
+        chunk_size: max number of handle IDs to send in each request
+    Returns:
+        Shock node IDs, in the same order as `handle_ids`
+    Raises:
+        MissingHandle if the handle service does not return some handle
+    """
+    resolved = {}  # type: Dict[str, Optional[str]]
+    todo = []  # type: List[str]
+    for hid in handle_ids:
+        if hid in resolved:
+            continue
+        shock_id = HANDLE_MEMO.get((handle_url, token, hid))
+        if shock_id is not None:
+            resolved[hid] = shock_id
+        else:
+            # Placeholder so that duplicate IDs are only requested once
+            resolved[hid] = None
+            todo.append(hid)
+    for idx in range(0, len(todo), chunk_size):
+        chunk = todo[idx:idx + chunk_size]
+        # Concurrent lookups of the same handles (eg. from handle_to_shock) share one request
+        handles = transport.coalesce(
+            ('hids_to_handles', handle_url, token, tuple(chunk)),
+            lambda: _hids_to_handles(transport, handle_url, token, chunk))
+        for handle in handles:
+            resolved[handle['hid']] = handle['id']
+            HANDLE_MEMO.put((handle_url, token, handle['hid']), handle['id'])
+    missing = [hid for hid in todo if resolved[hid] is None]
+    if missing:
+        raise MissingHandle(missing)
+    return [resolved[hid] for hid in handle_ids]
+
+
+def _hids_to_handles(
+        transport: Any,
+        handle_url: str,
+        token: str,
+        handle_ids: List[str]) -> List[dict]:
+    """Make one AbstractHandle.hids_to_handles request."""
+    request_data = {
+        'method': 'AbstractHandle.hids_to_handles',
+        'params': [handle_ids],
+        'id': "0"
+    }
+    (data, headers) = transport.encode(request_data)
+    headers['Content-Type'] = 'application/json'
+    if token:
+        headers['Authorization'] = token
+
+    with transport.measure('handle', 'hids_to_handles', bytes_sent=len(data)) as probe:
+        def attempt() -> List[dict]:
+            resp = transport.post(handle_url, data=data, headers=headers, probe=probe)
+            if not resp.ok:
+                raise RuntimeError(f"Error from handle_service: {resp.text}")
+            probe.received(len(resp.content))
+            return transport.codec.loads(resp.content)['result'][0]
+        return transport.call(attempt, probe)
@@ -0,0 +1,290 @@
+"""
+A local SQLite index of workspace and object infos.
+
+Syncing the index lists the workspaces and only re-scans those whose `moddate` changed since the
+last sync, so keeping a large index up to date costs little more than one listing request.
+Queries by type, workspace, user, or save date then run locally against indexed columns.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, List, Optional
+import json
+import threading
+
+from kbase_workspace_client.main import ObjInfo, WSInfo
+from kbase_workspace_client.scan import ScanFailure
+
+# Summary of a sync: numbers of workspaces seen, re-scanned, and dropped from the index, and
+# the workspaces that could not be fetched or scanned
+SyncResult = namedtuple('SyncResult', ['checked', 'updated', 'removed', 'failures'])
+
+# Object infos are written to the database in batches of this many rows
+_INSERT_BATCH = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    id INTEGER PRIMARY KEY,
+    workspace TEXT,
+    owner TEXT,
+    moddate TEXT,
+    max_objid INTEGER,
+    user_permission TEXT,
+    globalread TEXT,
+    lockstat TEXT,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS objects (
+    objid INTEGER NOT NULL,
+    name TEXT,
+    type TEXT,
+    save_date TEXT,
+    version INTEGER NOT NULL,
+    saved_by TEXT,
+    wsid INTEGER NOT NULL,
+    workspace TEXT,
+    chsum TEXT,
+    size INTEGER,
+    meta TEXT,
+    PRIMARY KEY (wsid, objid, version)
+);
+CREATE INDEX IF NOT EXISTS objects_type ON objects (type);
+CREATE INDEX IF NOT EXISTS objects_saved_by ON objects (saved_by);
+CREATE INDEX IF NOT EXISTS objects_save_date ON objects (save_date);
+CREATE TEMP TABLE IF NOT EXISTS staged_objects AS SELECT * FROM objects WHERE 0;
+CREATE INDEX IF NOT EXISTS temp.staged_objects_wsid ON staged_objects (wsid);
+"""
+
+
+class ObjInfoIndex:
+    """
+    SQLite database of WSInfo and ObjInfo tuples, kept up to date with `sync`.
+
+    The index can be shared between threads, and can be queried while it syncs: the infos of
+    re-scanned workspaces are staged and swapped in once the scan finishes. Open the same file
+    from several processes to share an index, but only sync it from one process at a time.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        """
+        Args:
+            path: SQLite database file. Defaults to an in-memory database.
+        """
+        # Imported here to keep it out of the package import
+        import sqlite3
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            if path != ':memory:':
+                # Let other processes read while this one writes
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> 'ObjInfoIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def sync(
+            self,
+            client: Any,
+            wsids: Optional[Iterable[int]] = None,
+            workers: int = 8,
+            admin: bool = False,
+            latest: bool = True) -> SyncResult:
+        """
+        Bring the index up to date with the workspace.
+        Args:
+            client: the WorkspaceClient to make requests with
+            wsids: workspace IDs to sync. By default, every workspace the user can see is synced
+                and workspaces that are no longer visible are dropped from the index.
+            workers: number of requests in flight at once
+            admin: make the requests as a Workspace administrator
+            latest: only index the latest version of each object. This only applies to
+                workspaces that are re-scanned in this sync.
+        Returns:
+            A SyncResult. Workspaces that failed keep their previous contents and are retried
+            on the next sync.
+        """
+        failures = []  # type: List[ScanFailure]
+        if wsids is None:
+            ws_infos = _list_ws_infos(client, admin)
+        else:
+            ws_infos = _fetch_ws_infos(client, wsids, workers, admin, failures)
+        known = self._moddates()
+        changed = {info.id: info for info in ws_infos if known.get(info.id) != info.moddate}
+        removed = []  # type: List[int]
+        if wsids is None:
+            visible = {info.id for info in ws_infos}
+            removed = [wsid for wsid in known if wsid not in visible]
+            self._delete_workspaces(removed)
+        updated = []  # type: List[WSInfo]
+        if changed:
+            scan = client.scan_workspaces(changed, workers=workers, admin=admin, latest=latest)
+            self._stage_objects(scan)
+            failures.extend(scan.failures)
+            # Only replace the workspaces that were fully scanned
+            failed = {failure.wsid for failure in scan.failures}
+            updated = [info for info in changed.values() if info.id not in failed]
+            self._swap_objects(updated)
+        return SyncResult(len(ws_infos), len(updated), len(removed), failures)
+
+    def objects(
+            self,
+            type: Optional[str] = None,
+            wsid: Optional[int] = None,
+            saved_by: Optional[str] = None,
+            saved_after: Optional[str] = None,
+            saved_before: Optional[str] = None) -> List[ObjInfo]:
+        """
+        Find indexed object infos. Every given filter must match.
+        Args:
+            type: full type with version (eg. 'KBaseNarrative.Narrative-4.0'), or a type name
+                without version to match every version of it
+            wsid: workspace ID
+            saved_by: username of the user that saved the object
+            saved_after: only objects saved at or after this ISO timestamp
+            saved_before: only objects saved before this ISO timestamp
+        Returns:
+            ObjInfo tuples ordered by workspace ID, object ID, and version
+        """
+        (where, params) = _object_filters(type, wsid, saved_by, saved_after, saved_before)
+        sql = "SELECT * FROM objects" + where + " ORDER BY wsid, objid, version"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_row_to_obj_info(row) for row in rows]
+
+    def count(
+            self,
+            type: Optional[str] = None,
+            wsid: Optional[int] = None,
+            saved_by: Optional[str] = None,
+            saved_after: Optional[str] = None,
+            saved_before: Optional[str] = None) -> int:
+        """Count the indexed object infos matching the same filters as `objects`."""
+        (where, params) = _object_filters(type, wsid, saved_by, saved_after, saved_before)
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM objects" + where, params).fetchone()[0]
+
+    def workspaces(self) -> List[WSInfo]:
+        """The WSInfo of every indexed workspace, as of the last sync."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM workspaces ORDER BY id").fetchall()
+        return [_row_to_ws_info(row) for row in rows]
+
+    def _moddates(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, moddate FROM workspaces"))
+
+    def _delete_workspaces(self, wsids: List[int]) -> None:
+        params = [(wsid,) for wsid in wsids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM objects WHERE wsid = ?", params)
+            self._conn.executemany("DELETE FROM workspaces WHERE id = ?", params)
+
+    def _stage_objects(self, obj_infos: Iterable[ObjInfo]) -> None:
+        """Write object infos to the staging table in batches, without blocking queries long."""
+        with self._lock:
+            # Clear out anything left by an interrupted sync
+            self._conn.execute("DELETE FROM staged_objects")
+        batch = []  # type: list
+        for info in obj_infos:
+            batch.append(info[:10] + (json.dumps(info.meta),))
+            if len(batch) >= _INSERT_BATCH:
+                self._insert_staged(batch)
+                batch = []
+        self._insert_staged(batch)
+
+    def _insert_staged(self, rows: list) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO staged_objects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _swap_objects(self, ws_infos: List[WSInfo]) -> None:
+        """
+        In one transaction, replace the objects of the given workspaces with the staged ones and
+        record their new infos.
+        """
+        params = [(info.id,) for info in ws_infos]
+        rows = [info[:8] + (json.dumps(info.metadata),) for info in ws_infos]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM objects WHERE wsid = ?", params)
+            self._conn.executemany(
+                "INSERT INTO objects SELECT * FROM staged_objects WHERE wsid = ?", params)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO workspaces VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute("DELETE FROM staged_objects")
+
+
+def _list_ws_infos(client: Any, admin: bool) -> List[WSInfo]:
+    """List the info of every workspace visible to the user (or every workspace, as admin)."""
+    if admin:
+        infos = client.admin_req("listWorkspaces", {})
+    else:
+        infos = client.req("list_workspace_info", {})
+    return [WSInfo(*info) for info in infos]
+
+
+def _fetch_ws_infos(
+        client: Any,
+        wsids: Iterable[int],
+        workers: int,
+        admin: bool,
+        failures: List[ScanFailure]) -> List[WSInfo]:
+    """Fetch the info of each workspace, recording the ones that fail in `failures`."""
+    def fetch(wsid: int) -> Any:
+        try:
+            if admin:
+                return WSInfo(*client.admin_req("getWorkspaceInfo", {"id": wsid}))
+            return WSInfo(*client.req("get_workspace_info", {"id": wsid}))
+        except Exception as err:
+            return ScanFailure(wsid, err)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(fetch, wsids))
+    failures.extend(result for result in results if isinstance(result, ScanFailure))
+    return [result for result in results if isinstance(result, WSInfo)]
+
+
+def _object_filters(
+        type: Optional[str],
+        wsid: Optional[int],
+        saved_by: Optional[str],
+        saved_after: Optional[str],
+        saved_before: Optional[str]) -> tuple:
+    """Build a WHERE clause and its parameters for the object filters."""
+    clauses = []  # type: List[str]
+    params = []  # type: list
+    if type is not None:
+        if '-' in type:
+            clauses.append("type = ?")
+            params.append(type)
+        else:
+            # Every version of the type, as a range so the index on type is used
+            clauses.append("type >= ? AND type < ?")
+            params.extend([type + '-', type + '.'])
+    if wsid is not None:
+        clauses.append("wsid = ?")
+        params.append(wsid)
+    if saved_by is not None:
+        clauses.append("saved_by = ?")
+        params.append(saved_by)
+    if saved_after is not None:
+        clauses.append("save_date >= ?")
+        params.append(saved_after)
+    if saved_before is not None:
+        clauses.append("save_date < ?")
+        params.append(saved_before)
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return (where, params)
+
+
+def _row_to_obj_info(row: tuple) -> ObjInfo:
+    return ObjInfo(*row[:10], json.loads(row[10]))
+
+
+def _row_to_ws_info(row: tuple) -> WSInfo:
+    return WSInfo(*row[:8], json.loads(row[8]))
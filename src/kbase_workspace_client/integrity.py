@@ -0,0 +1,71 @@
+"""
+Integrity checks of downloaded files, computed while the bytes stream to disk.
+
+Downloads count (and, where the server declares a checksum, md5-hash) the bytes they write as
+they write them, so a file never has to be read again to validate it. A download that doesn't
+match its declared size or checksum raises IntegrityError, and is retried a few times first.
+
+An md5 checksum can only be computed over the bytes in file order, so it is only checked for
+downloads that receive the file in order: a single stream, or ranges fetched one after another
+over one connection. Ranged downloads over several connections (or resumed from an earlier attempt)
+check the size of each range instead.
+"""
+from typing import Any, Callable, Optional
+import hashlib
+import logging
+
+from kbase_workspace_client.exceptions import IntegrityError
+
+# Attempts at a download (or at one range of a download) that fails its integrity checks
+VERIFY_ATTEMPTS = 3
+
+_log = logging.getLogger(__name__)
+
+
+class Digest:
+    """Size and, optionally, md5 checksum of the bytes written by a download."""
+
+    def __init__(self, md5: bool = True):
+        self.size = 0
+        self._md5 = hashlib.md5() if md5 else None
+
+    def update(self, block: bytes) -> None:
+        self.size += len(block)
+        if self._md5 is not None:
+            self._md5.update(block)
+
+    def copy(self) -> 'Digest':
+        """A digest of the same bytes so far, to continue separately from this one."""
+        other = Digest(md5=False)
+        other.size = self.size
+        other._md5 = self._md5.copy() if self._md5 is not None else None
+        return other
+
+    def hexdigest(self) -> Optional[str]:
+        return self._md5.hexdigest() if self._md5 is not None else None
+
+    def check(self, path: str, size: Optional[int] = None, md5: Optional[str] = None) -> None:
+        """
+        Compare the bytes written with the expected size and md5 checksum, where given.
+        Raises:
+            IntegrityError on a mismatch
+        """
+        if size is not None and self.size != size:
+            raise IntegrityError(path, 'size', size, self.size)
+        if md5 is not None and self._md5 is not None and self.hexdigest() != md5.lower():
+            raise IntegrityError(path, 'md5', md5.lower(), self.hexdigest())
+
+
+def retry_on_mismatch(operation: Callable[[], Any], attempts: int = VERIFY_ATTEMPTS) -> Any:
+    """
+    Run a download, running it again if it fails its integrity checks.
+    Raises:
+        IntegrityError if the last attempt fails its checks
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation()
+        except IntegrityError as err:
+            if attempt >= attempts:
+                raise
+            _log.warning("%s; retrying (attempt %d of %d)", err, attempt + 1, attempts)
@@ -0,0 +1,71 @@
+"""
+Incremental parsing of large JSON-RPC responses.
+
+Rather than loading a whole response body (and the full python object tree for it) into memory,
+these helpers walk the JSON as it arrives and only build the elements found under a given path.
+Peak memory is then bounded by the size of the largest single element.
+
+Paths use the ijson prefix syntax: keys are separated by dots and `item` stands for every element
+of an array. For example, in a `get_objects2` result:
+- `data.item` is each object in `result[0].data`
+- `data.item.data.contigs.item` is each contig in each object's `data.contigs`
+
+ijson is an optional dependency; install it with `pip install kbase_workspace_client[stream]`.
+"""
+from typing import Any, BinaryIO, Generator, Iterator, Optional, Tuple
+
+# Bytes to read from the response at a time
+_READ_SIZE = 64 * 1024
+
+
+class ErrorMember(Exception):
+    """The JSON object being parsed has an error member; `error` holds its value."""
+
+    def __init__(self, error: Any):
+        self.error = error
+
+
+def result_prefix(path: str) -> str:
+    """Convert a path within a JSON-RPC result into a prefix for the whole response body."""
+    return 'result.item.' + path if path else 'result.item'
+
+
+def iter_json_items(
+        fileobj: BinaryIO,
+        prefix: str,
+        error_key: Optional[str] = None) -> Generator[Any, None, None]:
+    """
+    Yield every JSON value found at `prefix` in a file-like object, parsing as we go.
+    Args:
+        fileobj: binary file-like object with a `read` method (eg. a raw HTTP response)
+        prefix: ijson-style path to the values to yield
+        error_key: top-level key that holds an error instead of a result (eg. `error` in a
+            JSON-RPC response)
+    Yields:
+        python values (dicts, lists, strings, numbers) built for each matching element only
+    Raises:
+        ErrorMember with the value under `error_key`, when the object has one
+    """
+    try:
+        import ijson
+    except ImportError:
+        raise ImportError(
+            "Streaming JSON parsing requires ijson; "
+            "install it with `pip install kbase_workspace_client[stream]`")
+    if error_key is None:
+        yield from ijson.items(fileobj, prefix, use_float=True, buf_size=_READ_SIZE)
+        return
+    events = ijson.parse(fileobj, use_float=True, buf_size=_READ_SIZE)
+    yield from ijson.items(_check_error(iter(events), error_key), prefix)
+
+
+def _check_error(
+        events: Iterator[Tuple[str, str, Any]],
+        error_key: str) -> Generator[Tuple[str, str, Any], None, None]:
+    """Pass parser events through, raising ErrorMember once the top-level `error_key` starts."""
+    import ijson
+    for event in events:
+        if event[0] == '' and event[1] == 'map_key' and event[2] == error_key:
+            # The rest of the error value is small; build it from the remaining events
+            raise ErrorMember(next(ijson.items(events, error_key), None))
+        yield event
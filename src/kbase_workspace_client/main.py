@@ -1,20 +1,57 @@
 from collections import namedtuple
-from typing import Optional, Any, Generator, List
-import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Optional, Any, Callable, Generator, Iterable, Iterator, List, Sequence, Tuple, Union,
+    TYPE_CHECKING,
+)
 import os
-import requests
 import time
 
-from kbase_workspace_client.contigset_to_fasta import contigset_to_fasta
+from kbase_workspace_client.cache import credential_scope, ObjectCache
+from kbase_workspace_client.contigset_to_fasta import contigset_to_fasta, write_fasta
+from kbase_workspace_client.handles import (
+    handles_to_shock,
+    DEFAULT_CHUNK_SIZE as DEFAULT_HANDLES_CHUNK_SIZE,
+)
+from kbase_workspace_client.json_stream import ErrorMember, iter_json_items, result_prefix
+from kbase_workspace_client.pagination import prefetch_pages, chunked_pages
+from kbase_workspace_client.ratelimit import RateLimiter
+from kbase_workspace_client.shock import (
+    fetch_node,
+    node_file_md5,
+    node_file_size,
+    stream_download,
+    ranged_download,
+    can_resume,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_RANGE_SIZE,
+)
+from kbase_workspace_client.resilience import Resilience
+from kbase_workspace_client.session import (
+    make_session,
+    Transport,
+    DEFAULT_POOL_CONNECTIONS,
+    DEFAULT_POOL_MAXSIZE,
+)
+from kbase_workspace_client.compression import DEFAULT_COMPRESS_MIN_SIZE
+from kbase_workspace_client.metrics import Observer
+from kbase_workspace_client.coalesce import is_read_only, rpc_key
+from kbase_workspace_client.filewriter import copy_response, FileWriter
+from kbase_workspace_client.integrity import retry_on_mismatch
 from kbase_workspace_client.exceptions import (
     WorkspaceResponseError,
-    UnauthorizedShockDownload,
-    MissingShockFile,
+    IntegrityError,
     InvalidWSType,
     FileExists,
     InvalidGenome,
 )
 
+if TYPE_CHECKING:
+    from kbase_workspace_client.scan import WorkspaceScan  # noqa: F401
+    from kbase_workspace_client.export import ExportResult  # noqa: F401
+    from kbase_workspace_client.table import ObjInfoTable  # noqa: F401
+    from kbase_workspace_client.traverse import RefNode  # noqa: F401
+
 # Named tuples for object info and workspace info
 ObjInfo = namedtuple('ObjInfo', [
   "objid",
@@ -41,26 +78,160 @@ WSInfo = namedtuple('WSInfo', [
   "metadata",
 ])
 
+# Max number of object infos returned by one "list_objects" request
+_LIST_OBJECTS_LIMIT = 10000
+# Path to each contig of a ContigSet in a get_objects2 result
+_CONTIGS_PATH = 'data.item.data.contigs.item'
+# Object subpaths read by the download helpers, fetched with get_objects2 "included" paths
+# rather than downloading whole objects (Genomes and ContigSets can be hundreds of MB)
+_GENOME_ASSEMBLY_FIELDS = ['/assembly_ref', '/contigset_ref']
+_ASSEMBLY_FILE_FIELDS = ['/fasta_handle_ref', '/fasta_handle_info/shock_id']
+_READS_FILE_FIELDS = ['/interleaved', '/lib/file/id', '/lib1/file/id', '/lib2/file/id']
+
+# Seconds to wait for a connection and for data; or a single number for both
+Timeout = Union[None, float, Tuple[float, float]]
 
-def _post_req(payload: dict, url: str, token: Optional[str], file_path: str = None) -> Any:
-    """Make a post request to the workspace server and process the response."""
-    headers = {'Authorization': token}
-    with requests.post(url, data=json.dumps(payload), headers=headers, stream=True) as resp:
-        if not resp.ok:
-            raise WorkspaceResponseError(resp)
+
+def _post_req(
+        transport: Transport,
+        payload: dict,
+        url: str,
+        token: Optional[str],
+        file_path: str = None,
+        decode: bool = True) -> Any:
+    """
+    Make a post request to the workspace server and process the response.
+
+    With `decode=False`, the response is returned with its body read but not yet parsed, to be
+    parsed by `_decode_result`.
+    """
+    (data, headers) = transport.encode(payload)
+    headers['Authorization'] = token
+    (method, admin) = _payload_method(payload)
+    kind = 'rpc_download' if file_path else 'rpc'
+    with transport.measure(kind, method, admin, len(data)) as probe:
+        def attempt() -> Any:
+            with transport.post(url, data=data, headers=headers, stream=True, probe=probe) as resp:
+                if not resp.ok:
+                    raise WorkspaceResponseError(resp)
+                if file_path:
+                    # Stream the response to a file, decompressing it as it arrives
+                    with FileWriter(file_path) as writer:
+                        received = copy_response(resp, writer, DEFAULT_CHUNK_SIZE,
+                                                 lambda block: probe.received(len(block)))
+                    _check_length(resp, file_path, received)
+                else:
+                    # Parse the response as JSON in memory and check for errors
+                    probe.received(len(resp.content))
+                    return _decode_result(transport, resp) if decode else resp
         if file_path:
-            # Stream the response to a file
-            with open(file_path, 'wb') as fd:
-                for chunk in resp.iter_content(chunk_size=1024):
-                    fd.write(chunk)
-        else:
-            # Parse the response as JSON in memory and check for errors
-            resp_json = resp.json()
-            if 'error' in resp_json:
-                raise WorkspaceResponseError(resp)
-            elif 'result' not in resp_json or not len(resp_json['result']):
+            # A truncated download is requested again
+            return retry_on_mismatch(lambda: transport.call(attempt, probe))
+        return transport.call(attempt, probe)
+
+
+def _check_length(resp: Any, file_path: str, received: int) -> None:
+    """
+    Check that a streamed response body was as long as its Content-Length header said. The
+    `received` bytes are counted as they come off the connection, before any gzip decoding.
+    Raises:
+        IntegrityError if the body was cut short
+    """
+    declared = resp.headers.get('Content-Length')
+    if declared is not None and received != int(declared):
+        raise IntegrityError(file_path, 'size', int(declared), received)
+
+
+def _post_req_stream(
+        transport: Transport,
+        payload: dict,
+        url: str,
+        token: Optional[str],
+        path: str) -> Generator[Any, None, None]:
+    """Make a post request to the workspace and incrementally parse items out of the result."""
+    (data, headers) = transport.encode(payload)
+    headers['Authorization'] = token
+    (method, admin) = _payload_method(payload)
+    with transport.measure('rpc_stream', method, admin, len(data)) as probe:
+        # Only the initial request can be retried; items may already be yielded after that
+        resp = transport.call(
+            lambda: transport.post(url, data=data, headers=headers, stream=True, probe=probe),
+            probe)
+        with resp:
+            if not resp.ok:
                 raise WorkspaceResponseError(resp)
-            return resp_json['result'][0]
+            # Let urllib3 undo any gzip or deflate encoding as the parser reads
+            resp.raw.decode_content = True
+            try:
+                yield from iter_json_items(
+                    _CountingReader(resp.raw, probe), result_prefix(path), error_key='error')
+            except ErrorMember as err:
+                # A JSON-RPC error can come with a 200 status; report it as `_post` does
+                body = transport.codec.dumps({'version': '1.1', 'error': err.error})
+                raise WorkspaceResponseError(
+                    _FinishedResponse(resp.status_code, body, transport.codec)) from None
+
+
+def _decode_result(transport: Transport, resp: Any) -> Any:
+    """Parse the result out of a JSON-RPC response whose body has been read."""
+    return _rpc_result(transport.codec.loads(resp.content), resp)
+
+
+def _rpc_result(resp_json: dict, resp: Any) -> Any:
+    """Pull the result out of a parsed JSON-RPC response, raising on any errors."""
+    if 'error' in resp_json:
+        raise WorkspaceResponseError(resp)
+    elif 'result' not in resp_json or not len(resp_json['result']):
+        raise WorkspaceResponseError(resp)
+    return resp_json['result'][0]
+
+
+class _FinishedResponse:
+    """The parts of a fully-read response that WorkspaceResponseError looks at."""
+
+    def __init__(self, status_code: int, content: bytes, codec: Any):
+        self.status_code = status_code
+        self.content = content
+        self._codec = codec
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(errors='replace')
+
+    def json(self) -> Any:
+        return self._codec.loads(self.content)
+
+
+class _CountingReader:
+    """Reads from a file-like object, recording the number of bytes read on a probe."""
+
+    def __init__(self, fileobj: Any, probe: Any):
+        self._fileobj = fileobj
+        self._probe = probe
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        self._probe.received(len(data))
+        return data
+
+
+def _payload_method(payload: dict) -> Tuple[str, bool]:
+    """The workspace method (or admin command) called by a JSON-RPC payload, and if it's admin."""
+    method = payload['method']
+    if method == 'Workspace.administer':
+        return (payload['params'][0]['command'], True)
+    if method.startswith('Workspace.'):
+        method = method[len('Workspace.'):]
+    return (method, False)
+
+
+def _admin_payload(method: str, params: dict) -> dict:
+    """Wrap a method call in the JSON-RPC payload for the workspace administration interface."""
+    return {
+        'version': '1.1',
+        'method': 'Workspace.administer',
+        'params': [{'command': method, 'params': params}]
+    }
 
 
 def _validate_file_for_writing(dest_path: str) -> None:
@@ -76,16 +247,98 @@ def _validate_file_for_writing(dest_path: str) -> None:
 
 class WorkspaceClient:
 
-    def __init__(self, url: str, token: str = None):
+    def __init__(
+            self,
+            url: str,
+            token: str = None,
+            pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+            pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+            pool_block: bool = False,
+            keep_alive: bool = True,
+            timeout: Timeout = None,
+            cache: Optional[ObjectCache] = None,
+            resilience: Optional[Resilience] = None,
+            codec: Any = None,
+            compress_requests: Optional[str] = None,
+            compress_min_size: int = DEFAULT_COMPRESS_MIN_SIZE,
+            observers: Optional[Sequence[Observer]] = None,
+            coalesce: bool = True):
         """
         Instantiate the workspace client.
+
+        Every request made by the client goes through one pooled, thread-safe HTTP session, so
+        a single client can be shared between threads. Call `close()` (or use the client as a
+        context manager) to release its connections.
         Args:
             url: URL of the workspace service with the root path
             token: User or service authentication token from KBase. Optional.
+            pool_connections: number of per-host connection pools to keep around
+            pool_maxsize: max number of connections kept open to a single host
+            pool_block: block when all connections to a host are in use, rather than opening
+                extra connections that get discarded afterwards
+            keep_alive: reuse connections between requests
+            timeout: seconds to wait for the server, either as one number or as a
+                (connect, read) tuple. Defaults to waiting forever.
+            cache: an ObjectCache for objects fetched by the download helpers. Only objects
+                fetched by fully versioned references are cached.
+            resilience: retry, rate limiting, and circuit breaker policy applied to every
+                request. By default, each request is made once.
+            codec: JSON codec used to encode requests and decode responses, such as
+                `StdlibCodec()` or `OrjsonCodec()` from `kbase_workspace_client.codec`. By
+                default, orjson is used if it is installed.
+            compress_requests: Content-Encoding to compress large request bodies (such as
+                get_objects2 requests for many references) with: 'gzip' or 'deflate'. Only use
+                this with servers that accept compressed requests. Responses are always
+                negotiated with `Accept-Encoding: gzip, deflate`.
+            compress_min_size: only compress request bodies of at least this many bytes
+            observers: functions called with a RequestEvent as each RPC, handle lookup, and
+                shock request or download finishes, such as a MetricsRecorder. See
+                `kbase_workspace_client.metrics`.
+            coalesce: when threads make identical read-only requests (same method, parameters,
+                and admin flag) at the same time, send only one and share its response between
+                them. Each caller parses the response into its own result. See
+                `kbase_workspace_client.coalesce`.
         """
         self._url = url.strip('/')
         self._ws_url = url + '/ws'
         self._token = token
+        self._cache = cache
+        session = make_session(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+        )
+        self._transport = Transport(
+            session, timeout, resilience, codec, compress_requests, compress_min_size, observers,
+            coalesce)
+
+    def close(self) -> None:
+        """Close all pooled connections held by the client."""
+        self._transport.close()
+
+    def __enter__(self) -> 'WorkspaceClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _post(self, payload: dict, file_path: str = None) -> Any:
+        """
+        Post a JSON-RPC payload to the workspace using the pooled session.
+
+        Read-only calls that are identical to one already in flight wait for it and share its
+        response, rather than being sent again.
+        """
+        (method, admin) = _payload_method(payload)
+        if file_path is not None or not is_read_only(method, admin):
+            return _post_req(self._transport, payload, self._ws_url, self._token, file_path)
+        params = payload['params'][0]['params'] if admin else payload['params']
+        resp = self._transport.coalesce(
+            rpc_key(self._ws_url, method, admin, params),
+            lambda: _post_req(self._transport, payload, self._ws_url, self._token, decode=False))
+        # Every caller parses the shared body itself, so none of them share result objects
+        return _decode_result(self._transport, resp)
 
     def req(self, method: str, params: dict) -> Any:
         """
@@ -100,7 +353,7 @@ class WorkspaceClient:
         """
         _id = int(time.time() * 1000)
         payload = {'version': '1.1', 'id': _id, 'method': method, 'params': [params]}
-        return _post_req(payload, self._ws_url, self._token)
+        return self._post(payload)
 
     def generate_obj_infos(
             self,
@@ -108,35 +361,246 @@ class WorkspaceClient:
             minid: int = 1,
             maxid: Optional[int] = None,
             latest: bool = True,
-            admin: bool = False) -> Generator[list, None, None]:
+            admin: bool = False,
+            prefetch: int = 0,
+            workers: int = 1,
+            chunk_size: int = _LIST_OBJECTS_LIMIT) -> Generator[list, None, None]:
         """
         Generator, yielding all object IDs + version IDs in a workspace.
         This handles the 10k pagination and will generate *all* ids.
+
+        Pages can be fetched ahead of the consumer, in order to overlap network round trips with
+        processing. Either way, object infos are yielded in object ID order.
         Args:
             wsid: workspace ID
+            minid: first object ID to generate
+            maxid: last object ID to generate (eg. from `WSInfo.max_objid`)
             latest: Generate only the latest version of each obj, or generate
                 all versions of all objects.
             admin: Make the "list_objects" request as a Workspace administrator
+            prefetch: number of pages to fetch in the background ahead of the consumer
+            workers: when `maxid` is given, split the object ID range into chunks and fetch
+                this many chunks at once
+            chunk_size: number of object IDs in each chunk when `workers` is more than 1
         Yields:
             Object info tuples (as python lists)
         """
-        params = {"ids": [wsid]}  # type: dict
-        if maxid:
-            params['maxObjectID'] = maxid
-        if not latest:
-            params['showAllVersions'] = 1
-        while True:
-            params['minObjectID'] = minid
-            if admin:
-                part = self.admin_req("listObjects", params)
-            else:
-                part = self.req("list_objects", params)
-            if len(part) < 1:
-                break
-            minid = part[-1][0] + 1
+        if workers > 1 and maxid:
+            def fetch_chunk(lo, hi):
+                return list(_obj_info_pages(self, wsid, lo, hi, latest, admin))
+            pages = chunked_pages(fetch_chunk, minid, maxid, chunk_size, workers)
+        else:
+            pages = _obj_info_pages(self, wsid, minid, maxid, latest, admin)
+            if prefetch > 0:
+                pages = prefetch_pages(pages, prefetch)
+        for part in pages:
             for obj_info in part:
                 yield obj_info
 
+    def obj_info_table(
+            self,
+            wsid: int,
+            minid: int = 1,
+            maxid: Optional[int] = None,
+            latest: bool = True,
+            admin: bool = False,
+            prefetch: int = 0,
+            workers: int = 1,
+            chunk_size: int = _LIST_OBJECTS_LIMIT) -> 'ObjInfoTable':
+        """
+        Fetch the object infos in a workspace into a compact, columnar ObjInfoTable.
+
+        Takes the same arguments as `generate_obj_infos`. To collect infos from many workspaces,
+        pass the results of `scan_workspaces` to `ObjInfoTable.from_infos`.
+        Returns:
+            An ObjInfoTable of the object infos, in object ID order
+        """
+        from kbase_workspace_client.table import ObjInfoTable
+        return ObjInfoTable.from_infos(self.generate_obj_infos(
+            wsid, minid=minid, maxid=maxid, latest=latest, admin=admin, prefetch=prefetch,
+            workers=workers, chunk_size=chunk_size))
+
+    def req_stream(self, method: str, params: dict, path: str) -> Generator[Any, None, None]:
+        """
+        Make a normal request to the workspace and parse the response incrementally.
+
+        Only the elements found at `path` in the result are built in memory, one at a time.
+        Requires the optional `ijson` package.
+        Args:
+            method: workspace method name (must be a funcdef in the KIDL spec)
+            params: parameters as python dicts, lists, and values
+            path: dotted path into the result, where `item` stands for every element of an
+                array. For example, `data.item.data.contigs.item` for "get_objects2" yields each
+                contig of each object.
+        Yields:
+            python data (dicts/lists) for each element found at `path`
+        Raises:
+            WorkspaceResponseError on an unsuccessful request.
+        """
+        _id = int(time.time() * 1000)
+        payload = {'version': '1.1', 'id': _id, 'method': method, 'params': [params]}
+        return _post_req_stream(self._transport, payload, self._ws_url, self._token, path)
+
+    def admin_req_stream(
+            self,
+            method: str,
+            params: dict,
+            path: str) -> Generator[Any, None, None]:
+        """
+        Make a special workspace admin command and parse the response incrementally.
+        Args:
+            method: workspace method name (must be a funcdef in the KIDL spec)
+            params: parameters as python dicts, lists, and values
+            path: dotted path into the result (see `req_stream`)
+        Yields:
+            python data (dicts/lists) for each element found at `path`
+        Raises:
+            WorkspaceResponseError on an unsuccessful request.
+        """
+        return _post_req_stream(
+            self._transport, _admin_payload(method, params), self._ws_url, self._token, path)
+
+    def scan_workspaces(
+            self,
+            wsids: Iterable[int],
+            filter: Optional[Callable[[ObjInfo], bool]] = None,
+            workers: int = 8,
+            rate_limit: Union[None, float, RateLimiter] = None,
+            admin: bool = False,
+            latest: bool = True) -> 'WorkspaceScan':
+        """
+        Scan the objects in many workspaces in parallel using a pool of threads.
+        Args:
+            wsids: workspace IDs to scan
+            filter: only yield the object infos for which this returns True
+            workers: number of threads making requests at once
+            rate_limit: max number of "list_objects" requests per second across all workers,
+                or a RateLimiter shared with other work. Unlimited by default.
+            admin: make the requests as a Workspace administrator
+            latest: only yield the latest version of each object
+        Returns:
+            A WorkspaceScan, which yields ObjInfo tuples as they arrive and collects a
+            ScanFailure for each workspace that could not be scanned in its `failures` list.
+            Stop early with `close()` or by breaking out of the iteration.
+        """
+        from kbase_workspace_client.scan import WorkspaceScan
+        return WorkspaceScan(
+            self, wsids, filter=filter, workers=workers, rate_limit=rate_limit,
+            admin=admin, latest=latest)
+
+    def get_object(
+            self,
+            ref: str,
+            fields: Optional[List[str]] = None,
+            admin: bool = False,
+            chsum: Optional[str] = None) -> dict:
+        """
+        Fetch one object with get_objects2, going through the client's cache if it has one.
+        Args:
+            ref: workspace reference or reference path
+            fields: object subpaths to fetch instead of the whole data, such as
+                ['/assembly_ref', '/features/*/id'] (the get_objects2 "included" paths). Paths
+                that are missing from the object are left out.
+            admin: make the request as a Workspace administrator
+            chsum: the object's checksum, if known (eg. from an ObjInfo or a RefNode). A cached
+                copy with a different checksum is fetched again.
+        Returns:
+            The object data dict, as found in the "data" list of get_objects2
+        Raises:
+            WorkspaceResponseError on an unsuccessful request.
+        """
+        return _download_obj(self, ref, admin=admin, included=fields, chsum=chsum)
+
+    def get_objects(
+            self,
+            refs: Sequence[str],
+            no_data: bool = False,
+            included: Optional[List[str]] = None,
+            chunk_size: Optional[int] = None,
+            workers: int = 4,
+            admin: bool = False,
+            chsums: Optional[Sequence[Optional[str]]] = None) -> List[Union[dict, Exception]]:
+        """
+        Fetch many objects with get_objects2, split into batches sent concurrently.
+
+        Objects with data are looked up in the client's cache first, if it has one, and only the
+        rest are requested.
+        Args:
+            refs: workspace references or reference paths
+            no_data: leave out the object data, fetching only info, provenance, etc.
+            included: object subpaths to fetch instead of the whole data
+            chunk_size: number of references per request. Defaults to 100, or 1000 with
+                `no_data`.
+            workers: number of requests in flight at once
+            admin: make the requests as a Workspace administrator
+            chsums: known checksum of each object, or None where unknown (eg. from
+                `get_object_infos` or `traverse_refs`). Cached copies that don't match are
+                fetched again.
+        Returns:
+            One entry per reference, in the same order: either the object data dict, or the
+            exception that prevented fetching it (InaccessibleWSObject if the workspace could
+            not access the object).
+        """
+        from kbase_workspace_client.batch import get_objects
+        return get_objects(
+            self, refs, no_data=no_data, included=included, chunk_size=chunk_size,
+            workers=workers, admin=admin, chsums=chsums)
+
+    def get_object_infos(
+            self,
+            refs: Sequence[str],
+            chunk_size: int = 1000,
+            workers: int = 4,
+            admin: bool = False) -> List[Union[ObjInfo, Exception]]:
+        """
+        Fetch many object infos with get_object_info3, split into batches sent concurrently.
+        Args:
+            refs: workspace references or reference paths
+            chunk_size: number of references per request
+            workers: number of requests in flight at once
+            admin: make the requests as a Workspace administrator
+        Returns:
+            One entry per reference, in the same order: either an ObjInfo, or the exception that
+            prevented fetching it.
+        """
+        from kbase_workspace_client.batch import get_object_infos
+        return get_object_infos(
+            self, refs, chunk_size=chunk_size, workers=workers, admin=admin)
+
+    def traverse_refs(
+            self,
+            refs: Sequence[str],
+            max_depth: Optional[int] = None,
+            types: Optional[Sequence[str]] = None,
+            expand_types: Optional[Sequence[str]] = None,
+            chunk_size: int = 1000,
+            workers: int = 4,
+            admin: bool = False) -> Iterator['RefNode']:
+        """
+        Walk the references held by objects breadth-first, from a set of starting references.
+
+        Each level is fetched in concurrent batches of get_objects2 requests (without object
+        data), and reached objects are fetched by reference path from their starting reference.
+        The references of each object version are remembered for the life of the process, so
+        shared subgraphs are only fetched once.
+        Args:
+            refs: starting workspace references or reference paths
+            max_depth: max number of hops to follow. Unlimited by default.
+            types: only yield objects whose type contains one of these strings
+            expand_types: only follow the references of objects whose type contains one of
+                these strings
+            chunk_size: number of references in each request
+            workers: number of requests in flight at once
+            admin: make the requests as a Workspace administrator
+        Yields:
+            A RefNode (ref, path, depth, info, refs, error) for each object, level by level.
+            Objects that can't be fetched have `error` set, and are not followed.
+        """
+        from kbase_workspace_client.traverse import traverse_refs
+        return traverse_refs(
+            self, refs, max_depth=max_depth, types=types, expand_types=expand_types,
+            chunk_size=chunk_size, workers=workers, admin=admin)
+
     def admin_req(self, method: str, params: dict) -> Any:
         """
         Make a special workspace admin command.
@@ -148,12 +612,7 @@ class WorkspaceClient:
         Raises:
             WorkspaceResponseError on an unsuccessful request.
         """
-        payload = {
-            'version': '1.1',
-            'method': 'Workspace.administer',
-            'params': [{'command': method, 'params': params}]
-        }
-        return _post_req(payload, self._ws_url, self._token)
+        return self._post(_admin_payload(method, params))
 
     def req_download(self, method: str, params: dict, dest_path: str) -> None:
         """
@@ -166,10 +625,11 @@ class WorkspaceClient:
             None when the request is complete and the file is written.
         Raises:
             WorkspaceResponseError on an unsuccessful request.
+            IntegrityError if the response is still cut short after retrying.
         """
         _validate_file_for_writing(dest_path)
         payload = {'version': '1.1', 'method': method, 'params': [params]}
-        _post_req(payload, self._ws_url, self._token, dest_path)
+        self._post(payload, dest_path)
 
     def admin_req_download(self, method: str, params: dict, dest_path: str) -> None:
         """
@@ -182,14 +642,10 @@ class WorkspaceClient:
             None when the request is complete and the file is written.
         Raises:
             WorkspaceResponseError on an unsuccessful request.
+            IntegrityError if the response is still cut short after retrying.
         """
         _validate_file_for_writing(dest_path)
-        payload = {
-            'version': '1.1',
-            'method': 'Workspace.administer',
-            'params': [{'command': method, 'params': params}]
-        }
-        _post_req(payload, self._ws_url, self._token, dest_path)
+        self._post(_admin_payload(method, params), dest_path)
 
     def handle_to_shock(self, handle: str) -> str:
         """
@@ -199,87 +655,148 @@ class WorkspaceClient:
         Returns:
             The shock node ID
         """
-        headers = {'Content-Type': 'application/json'}
-        if self._token:
-            headers['Authorization'] = self._token
-        request_data = {
-            'method': 'AbstractHandle.hids_to_handles',
-            'params': [[handle]],
-            'id': "0"
-        }
-        resp = requests.post(
-            self._url + '/handle_service',
-            data=json.dumps(request_data),
-            headers=headers
-        )
-        if not resp.ok:
-            raise RuntimeError(f"Error from handle_service: {resp.text}")
-        return resp.json()['result'][0][0]['id']
+        return self.handles_to_shock([handle])[0]
 
-    def download_shock_file(self, shock_id: str, dest_path: str) -> None:
+    def handles_to_shock(
+            self,
+            handle_ids: Sequence[str],
+            chunk_size: int = DEFAULT_HANDLES_CHUNK_SIZE) -> List[str]:
+        """
+        Convert many handle IDs to shock IDs in as few requests as possible.
+
+        Resolved IDs are remembered for the life of the process, so repeated lookups of the same
+        handle don't make any requests.
+        Args:
+            handle_ids: handle service IDs
+            chunk_size: max number of handle IDs to send in each request
+        Returns:
+            The shock node IDs, in the same order as `handle_ids`
+        Raises:
+            MissingHandle if the handle service has no handle for some of the IDs
+        """
+        return handles_to_shock(
+            self._transport, self._url + '/handle_service', self._token, handle_ids,
+            chunk_size=chunk_size)
+
+    def download_shock_file(
+            self,
+            shock_id: str,
+            dest_path: str,
+            connections: int = 1,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            range_size: int = DEFAULT_RANGE_SIZE,
+            resume: bool = False,
+            on_chunk: Optional[Callable[[int], None]] = None,
+            compress: bool = False,
+            verify: bool = True,
+            preallocate: bool = False,
+            fsync: bool = False) -> None:
         """
         Download a file from shock.
+
+        With more than one connection, the file is fetched as byte ranges in parallel. Ranged
+        downloads record their progress next to `dest_path`, so that a failed download can be
+        picked up again with `resume=True`.
+
+        With `compress=True`, the file is saved gzipped (so give `dest_path` a '.gz' suffix).
+        Shock compresses the file as it sends it, and a file that shock already stores gzipped
+        is saved as it is, without decompressing and compressing it again. Compressed downloads
+        always use one connection.
+
+        With `verify`, the file is checked against the size and md5 checksum that shock reports
+        for it while it downloads, and a range or file that doesn't match is fetched again. The
+        checksum needs the bytes in order, so it is only checked for downloads over one
+        connection that aren't resumed; other ranged downloads log a warning that it isn't
+        checked, and only check that each range has the right size.
+
+        The response is read into large reusable buffers that are written out whole. Set
+        `preallocate` to reserve the file's disk space before writing it, and `fsync` to sync it
+        to disk before returning (or, for a ranged download, before recording each range as
+        finished).
         Args:
             shock_id
             dest_path
+            connections: number of byte ranges to download at once
+            chunk_size: max number of bytes to read at a time
+            range_size: number of bytes in each range of a ranged download
+            resume: continue an unfinished ranged download at `dest_path`, if there is one
+            on_chunk: called with the size of each chunk before it is written (eg. to track
+                progress or limit the byte rate). Ranged downloads call it from several threads.
+            compress: save the file gzipped
+            verify: check the downloaded bytes against the node's size and checksum
+            preallocate: reserve disk space for the whole file before writing it
+            fsync: sync the file to disk as it finishes
         Returns:
             None when the file finishes downloading
         Raises:
             UnauthorizedShockDownload or MissingShockFile on failure
+            IntegrityError if the file still doesn't match after retrying
         """
-        _validate_file_for_writing(dest_path)
+        resuming = resume and can_resume(dest_path)
+        if not resuming:
+            _validate_file_for_writing(dest_path)
         headers = {'Authorization': ('OAuth ' + self._token) if self._token else None}
         # First, fetch some metadata about the file from shock
-        shock_url = self._url + '/shock-api'
-        node_url = shock_url + '/node/' + shock_id
-        response = requests.get(node_url, headers=headers, allow_redirects=True)
-        if not response.ok:
-            raise RuntimeError(f"Error from shock: {response.text}")
-        metadata = response.json()
-        # Make sure the shock file is present and valid
-        if metadata['status'] == 401:
-            raise UnauthorizedShockDownload(shock_id)
-        if metadata['status'] == 404:
-            raise MissingShockFile(shock_id)
-        # Fetch and stream the actual file to dest_path
-        with requests.get(node_url + '?download_raw',
-                          headers=headers, allow_redirects=True, stream=True) as resp:
-            with open(dest_path, 'wb') as fwrite:
-                for block in resp.iter_content(1024):
-                    fwrite.write(block)
-
-    def download_assembly_fasta(self, ref: str, save_dir: str, admin: bool = False) -> str:
+        node_url = self._url + '/shock-api/node/' + shock_id
+        metadata = fetch_node(self._transport, node_url, headers, shock_id)
+        size = node_file_size(metadata)
+        with self._transport.measure('shock_download', 'download') as probe:
+            if size and (connections > 1 or resume) and not compress:
+                ranged_download(
+                    self._transport, node_url, headers, dest_path, size, connections,
+                    chunk_size=chunk_size, range_size=range_size, on_chunk=on_chunk, probe=probe,
+                    preallocate=preallocate, fsync=fsync, resume=resuming,
+                    md5=node_file_md5(metadata) if verify else None)
+            else:
+                # Fetch and stream the actual file to dest_path
+                stream_download(
+                    self._transport, node_url, headers, dest_path, chunk_size, on_chunk=on_chunk,
+                    compress=compress, metadata=metadata, probe=probe, verify=verify,
+                    preallocate=preallocate, fsync=fsync)
+
+    def download_assembly_fasta(
+            self,
+            ref: str,
+            save_dir: str,
+            admin: bool = False,
+            stream: bool = False) -> str:
         """
         Download an Assembly object as fasta.
         Args:
             ref: a workspace reference ID in the form 'workspace_id/object_id/version'
             save_dir: the path of a directory in which to save the fasta file
             admin: whether to make the request as a Workspace administrator
+            stream: write the contigs of a ContigSet to the file as they are parsed out of the
+                response, rather than loading the whole object first. Requires the optional
+                `ijson` package.
         Returns:
             an absolute path of the downloaded fasta file.
         """
-        ws_obj = _download_obj(self, ref, admin=admin)
-        valid_types = ['KBaseGenomeAnnotations.Assembly', 'KBaseGenomes.ContigSet']
-        _validate_obj_type(ws_obj=ws_obj, types=valid_types)
-        (obj_name, obj_type) = (ws_obj['info'][1], ws_obj['info'][2])
-        output_path = os.path.abspath(os.path.join(save_dir, obj_name + '.fasta'))
-        if os.path.exists(output_path):
-            raise FileExists('File already exists at ' + output_path)
-        if 'ContigSet' in obj_type:
+        # Only fetch the fields that link an Assembly to its fasta file. For a ContigSet, this
+        # comes back with just the object info, and the contigs are fetched afterwards.
+        ws_obj = _download_obj(self, ref, admin=admin, included=_ASSEMBLY_FILE_FIELDS)
+        output_path = _assembly_output_path(ws_obj, save_dir)
+        if 'ContigSet' in ws_obj['info'][2]:
             # Write out ContigSet data into a fasta file
-            contigset_to_fasta(ws_obj, output_path)
+            if stream:
+                write_fasta(_stream_contigs(self, ref, admin), output_path)
+            else:
+                contigset_to_fasta(
+                    _download_obj(self, ref, admin=admin, chsum=ws_obj['info'][8]), output_path)
         else:
             # Download a linked fasta file to the save directory
-            data = ws_obj['data']
-            if 'fasta_handle_info' in data and 'shock_id' in data['fasta_handle_info']:
-                shock_id = data['fasta_handle_info']['shock_id']
-            else:
-                handle_id = data['fasta_handle_ref']
-                shock_id = self.handle_to_shock(handle_id)
+            shock_id = _assembly_shock_id(ws_obj)
+            if not shock_id:
+                shock_id = self.handle_to_shock(ws_obj['data']['fasta_handle_ref'])
             self.download_shock_file(shock_id, output_path)
         return output_path
 
-    def download_reads_fastq(self, ref: str, save_dir: str, admin: bool = False) -> List[str]:
+    def download_reads_fastq(
+            self,
+            ref: str,
+            save_dir: str,
+            admin: bool = False,
+            compress: bool = False) -> List[str]:
         """
         Download genome reads data as fastq.
 
@@ -291,49 +808,100 @@ class WorkspaceClient:
         - Paired ends and non-interleaved get the file ending of '.paired.fwd.fastq' and
             '.paired.rev.fastq'
         - Single ends get the file ending of '.single.fastq'
+        With `compress=True`, '.gz' is added to each file ending.
 
         Keyword arguments:
             ref: a workspace reference ID in the form 'workspace_id/object_id/version'
             save_dir: the path of a directory in which to save the fasta file
+            compress: save the files gzipped (see `download_shock_file`)
         Returns:
             a list of paths of the downloaded fastq files.
         """
-        # Fetch the workspace object and check its type
-        ws_obj = _download_obj(self, ref, admin=admin)
-        (obj_name, obj_type) = (ws_obj['info'][1], ws_obj['info'][2])
-        valid_types = {
-            'single': 'SingleEndLibrary',
-            'paired': 'PairedEndLibrary',
-        }
-        if valid_types['single'] in obj_type:
-            # One file to download
-            shock_id = ws_obj['data']['lib']['file']['id']
-            path = os.path.join(save_dir, obj_name + '.single.fastq')
-            to_download = [(shock_id, path)]
-        elif valid_types['paired'] in obj_type:
-            interleaved = ws_obj['data']['interleaved']
-            if interleaved:
-                # One file to download
-                shock_id = ws_obj['data']['lib1']['file']['id']
-                path = os.path.join(save_dir, obj_name + '.paired.interleaved.fastq')
-                to_download = [(shock_id, path)]
-            else:
-                # Two files to download (for left and right reads)
-                shock_id_fwd = ws_obj['data']['lib1']['file']['id']
-                shock_id_rev = ws_obj['data']['lib2']['file']['id']
-                path_fwd = os.path.join(save_dir, obj_name + '.paired.fwd.fastq')
-                path_rev = os.path.join(save_dir, obj_name + '.paired.rev.fastq')
-                to_download = [(shock_id_fwd, path_fwd), (shock_id_rev, path_rev)]
-        else:
-            # Unrecognized type
-            raise InvalidWSType(given=obj_type, valid_types=valid_types.values())
-        # Download each shock id to each path
-        for (shock_id, path) in to_download:
-            self.download_shock_file(shock_id, path)
+        # Fetch the shock IDs of the reads, and check the object type
+        ws_obj = _download_obj(self, ref, admin=admin, included=_READS_FILE_FIELDS)
+        to_download = _reads_download_targets(ws_obj, save_dir, compress)
+        # Download each shock id to each path; both mates of a pair at once
+        with ThreadPoolExecutor(max_workers=len(to_download)) as executor:
+            futures = [
+                executor.submit(self.download_shock_file, shock_id, path, compress=compress)
+                for (shock_id, path) in to_download
+            ]
+            for future in futures:
+                future.result()
         # Return a list of the output paths that we have downloaded
         output_paths = map(lambda pair: pair[1], to_download)
         return list(output_paths)
 
+    def export_assemblies(
+            self,
+            refs: Sequence[str],
+            save_dir: str,
+            workers: int = 8,
+            max_bytes_per_sec: Union[None, float, RateLimiter] = None,
+            max_open_files: Optional[int] = None,
+            progress: Optional[Callable[[str, int], None]] = None,
+            admin: bool = False) -> Iterator['ExportResult']:
+        """
+        Download the fasta files of many Assembly (or legacy ContigSet) objects concurrently.
+
+        Objects are fetched in batches, handles are resolved in bulk, and then every file is
+        downloaded from a shared pool of threads.
+        Args:
+            refs: workspace references to Assembly or ContigSet objects
+            save_dir: the path of a directory in which to save the fasta files
+            workers: number of files downloaded at once
+            max_bytes_per_sec: max download rate across all files, or a RateLimiter of bytes
+                shared with other work. Unlimited by default.
+            max_open_files: max number of files open for writing at once, if fewer than
+                `workers`. By default, one per worker.
+            progress: called with (ref, number of bytes) for each chunk downloaded, and for
+                each file written from object data once it is done
+            admin: whether to make the requests as a Workspace administrator
+        Returns:
+            A generator of ExportResult tuples of (ref, paths, error, bytes), one per reference,
+            in the order they finish. A reference that failed has its exception as `error`.
+        """
+        from kbase_workspace_client.export import export_assemblies
+        return export_assemblies(
+            self, refs, save_dir, workers=workers, max_bytes_per_sec=max_bytes_per_sec,
+            max_open_files=max_open_files, progress=progress, admin=admin)
+
+    def export_reads(
+            self,
+            refs: Sequence[str],
+            save_dir: str,
+            workers: int = 8,
+            max_bytes_per_sec: Union[None, float, RateLimiter] = None,
+            max_open_files: Optional[int] = None,
+            progress: Optional[Callable[[str, int], None]] = None,
+            admin: bool = False,
+            compress: bool = False) -> Iterator['ExportResult']:
+        """
+        Download the fastq files of many reads libraries concurrently.
+
+        Files are named as in `download_reads_fastq`, and both files of a paired-end library
+        download at the same time.
+        Args:
+            refs: workspace references to SingleEndLibrary or PairedEndLibrary objects
+            save_dir: the path of a directory in which to save the fastq files
+            workers: number of files downloaded at once
+            max_bytes_per_sec: max download rate across all files, or a RateLimiter of bytes
+                shared with other work. Unlimited by default.
+            max_open_files: max number of files open for writing at once, if fewer than
+                `workers`. By default, one per worker.
+            progress: called with (ref, number of bytes) for each chunk downloaded, and for
+                each file written from object data once it is done
+            admin: whether to make the requests as a Workspace administrator
+            compress: save the files gzipped, as in `download_reads_fastq`
+        Returns:
+            A generator of ExportResult tuples of (ref, paths, error, bytes), one per reference,
+            in the order they finish. A reference that failed has its exception as `error`.
+        """
+        from kbase_workspace_client.export import export_reads
+        return export_reads(
+            self, refs, save_dir, workers=workers, max_bytes_per_sec=max_bytes_per_sec,
+            max_open_files=max_open_files, progress=progress, admin=admin, compress=compress)
+
     def get_assembly_from_genome(self, ref: str, admin: bool = False) -> str:
         """
         Given a Genome object, fetch the reference to its Assembly object on the workspace.
@@ -342,17 +910,9 @@ class WorkspaceClient:
         Returns:
             workspace reference to an assembly object
         """
-        # Fetch the workspace object and check its type
-        ws_obj = _download_obj(self, ref, admin=admin)
-        _validate_obj_type(ws_obj, ['Genome'])
-        # Extract out the assembly reference from the workspace data
-        ws_data = ws_obj['data']
-        assembly_ref = ws_data.get('contigset_ref') or ws_data.get('assembly_ref')
-        if not assembly_ref:
-            raise InvalidGenome('Genome ' + ref + ' has no assembly or contigset references')
-        # Return a reference path of `genome_ref;assembly_ref`
-        ref_path = ref + ';' + assembly_ref
-        return ref_path
+        # Fetch only the assembly references of the genome, and check its type
+        ws_obj = _download_obj(self, ref, admin=admin, included=_GENOME_ASSEMBLY_FIELDS)
+        return _genome_assembly_path(ref, ws_obj)
 
     def find_narrative(self, wsid: int, admin: bool = False) -> Optional[ObjInfo]:
         """
@@ -365,30 +925,91 @@ class WorkspaceClient:
         """
         req = self.admin_req if admin else self.req
         ws_meth = "getWorkspaceInfo" if admin else "get_workspace_info"
-        ws_info_raw = req(ws_meth, {"id": wsid})
-        ws_info = WSInfo(*ws_info_raw)
-        # Fetch the narrative ID from the workspace metadata
-        try:
-            narr_obj_id = int(ws_info.metadata.get('narrative'))
-        except TypeError:
-            # No narrative ID accessible from the workspace info
+        ref = _narrative_ref(WSInfo(*req(ws_meth, {"id": wsid})))
+        if ref is None:
             return None
-        ref = f"{wsid}/{narr_obj_id}"
         obj_meth = "getObjectInfo" if admin else "get_object_info3"
         narr_info_raw = req(obj_meth, {"objects": [{"ref": ref}]})["infos"][0]
         return ObjInfo(*narr_info_raw)
 
 
-def _download_obj(client, ref: str, data: bool = True, admin: bool = False) -> dict:
-    """Download an object with get_objects2."""
-    params = {'objects': [{'ref': ref}]}  # type: dict
+def _obj_info_pages(
+        client: WorkspaceClient,
+        wsid: int,
+        minid: int = 1,
+        maxid: Optional[int] = None,
+        latest: bool = True,
+        admin: bool = False) -> Generator[list, None, None]:
+    """Generate each page of object infos (up to 10k) from "list_objects" for a workspace."""
+    params = {"ids": [wsid]}  # type: dict
+    if maxid:
+        params['maxObjectID'] = maxid
+    if not latest:
+        params['showAllVersions'] = 1
+    while True:
+        params['minObjectID'] = minid
+        if admin:
+            part = client.admin_req("listObjects", params)
+        else:
+            part = client.req("list_objects", params)
+        if len(part) < 1:
+            break
+        minid = part[-1][0] + 1
+        yield part
+
+
+def _download_obj_params(
+        ref: str,
+        data: bool = True,
+        included: Optional[List[str]] = None) -> dict:
+    """
+    Parameters for fetching a single object with get_objects2, optionally only the data at the
+    `included` subpaths.
+    """
+    spec = {'ref': ref}  # type: dict
+    if included:
+        spec['included'] = included
+    params = {'objects': [spec]}  # type: dict
     if not data:
         params['no_data'] = 1
+    return params
+
+
+def _download_obj(
+        client,
+        ref: str,
+        data: bool = True,
+        admin: bool = False,
+        included: Optional[List[str]] = None,
+        chsum: Optional[str] = None) -> dict:
+    """
+    Download an object (or the `included` subpaths of its data) with get_objects2, going through
+    the client's cache if it has one. Given the object's `chsum`, a cached copy is only used if it
+    matches.
+    """
+    cache = client._cache if data else None
+    scope = credential_scope(client._ws_url, client._token, admin)
+    if cache is not None:
+        cached = cache.get(ref, included, scope, chsum)
+        if cached is not None:
+            return cached
+    params = _download_obj_params(ref, data, included)
     if admin:
         ws_obj = client.admin_req("getObjects", params)
     else:
         ws_obj = client.req("get_objects2", params)
-    return ws_obj['data'][0]
+    ws_obj = ws_obj['data'][0]
+    if cache is not None:
+        cache.put(ref, ws_obj, included, scope)
+    return ws_obj
+
+
+def _stream_contigs(client, ref: str, admin: bool = False) -> Generator[dict, None, None]:
+    """Stream the contigs of a ContigSet object, one at a time."""
+    params = _download_obj_params(ref)
+    if admin:
+        return client.admin_req_stream("getObjects", params, _CONTIGS_PATH)
+    return client.req_stream("get_objects2", params, _CONTIGS_PATH)
 
 
 def _validate_obj_type(ws_obj: dict, types: List[str]) -> None:
@@ -403,3 +1024,89 @@ def _validate_obj_type(ws_obj: dict, types: List[str]) -> None:
     ws_type = ws_obj['info'][2]
     if all(t not in ws_type for t in types):
         raise InvalidWSType(given=ws_type, valid_types=types)
+
+
+def _assembly_output_path(ws_obj: dict, save_dir: str) -> str:
+    """
+    Validate an Assembly or ContigSet object and find the path to save its fasta file to.
+    Raises:
+        InvalidWSType if the object is not an Assembly or ContigSet
+        FileExists if the fasta file is already present
+    """
+    valid_types = ['KBaseGenomeAnnotations.Assembly', 'KBaseGenomes.ContigSet']
+    _validate_obj_type(ws_obj=ws_obj, types=valid_types)
+    obj_name = ws_obj['info'][1]
+    output_path = os.path.abspath(os.path.join(save_dir, obj_name + '.fasta'))
+    if os.path.exists(output_path):
+        raise FileExists('File already exists at ' + output_path)
+    return output_path
+
+
+def _assembly_shock_id(ws_obj: dict) -> Optional[str]:
+    """Shock ID stored directly on an Assembly, or None if it must come from the handle."""
+    handle_info = ws_obj['data'].get('fasta_handle_info', {})
+    return handle_info.get('shock_id')
+
+
+def _reads_download_targets(
+        ws_obj: dict,
+        save_dir: str,
+        compress: bool = False) -> List[Tuple[str, str]]:
+    """
+    Find the shock files to download for a reads library, paired with their file paths.
+    With `compress`, the paths end in '.fastq.gz'.
+    Raises:
+        InvalidWSType if the object is not a SingleEndLibrary or PairedEndLibrary
+    """
+    (obj_name, obj_type) = (ws_obj['info'][1], ws_obj['info'][2])
+    ext = '.gz' if compress else ''
+    valid_types = {
+        'single': 'SingleEndLibrary',
+        'paired': 'PairedEndLibrary',
+    }
+    if valid_types['single'] in obj_type:
+        # One file to download
+        shock_id = ws_obj['data']['lib']['file']['id']
+        path = os.path.join(save_dir, obj_name + '.single.fastq' + ext)
+        return [(shock_id, path)]
+    elif valid_types['paired'] in obj_type:
+        interleaved = ws_obj['data']['interleaved']
+        if interleaved:
+            # One file to download
+            shock_id = ws_obj['data']['lib1']['file']['id']
+            path = os.path.join(save_dir, obj_name + '.paired.interleaved.fastq' + ext)
+            return [(shock_id, path)]
+        # Two files to download (for left and right reads)
+        shock_id_fwd = ws_obj['data']['lib1']['file']['id']
+        shock_id_rev = ws_obj['data']['lib2']['file']['id']
+        path_fwd = os.path.join(save_dir, obj_name + '.paired.fwd.fastq' + ext)
+        path_rev = os.path.join(save_dir, obj_name + '.paired.rev.fastq' + ext)
+        return [(shock_id_fwd, path_fwd), (shock_id_rev, path_rev)]
+    # Unrecognized type
+    raise InvalidWSType(given=obj_type, valid_types=valid_types.values())
+
+
+def _genome_assembly_path(ref: str, ws_obj: dict) -> str:
+    """
+    Build the `genome_ref;assembly_ref` reference path for a Genome object.
+    Raises:
+        InvalidWSType if the object is not a Genome
+        InvalidGenome if the genome has no assembly or contigset reference
+    """
+    _validate_obj_type(ws_obj, ['Genome'])
+    # Extract out the assembly reference from the workspace data
+    ws_data = ws_obj['data']
+    assembly_ref = ws_data.get('contigset_ref') or ws_data.get('assembly_ref')
+    if not assembly_ref:
+        raise InvalidGenome('Genome ' + ref + ' has no assembly or contigset references')
+    return ref + ';' + assembly_ref
+
+
+def _narrative_ref(ws_info: WSInfo) -> Optional[str]:
+    """Reference to the narrative object named in a workspace's metadata, if there is one."""
+    try:
+        narr_obj_id = int(ws_info.metadata.get('narrative'))
+    except TypeError:
+        # No narrative ID accessible from the workspace info
+        return None
+    return f"{ws_info.id}/{narr_obj_id}"
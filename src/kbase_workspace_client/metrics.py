@@ -0,0 +1,418 @@
+"""
+Instrumentation of the requests and downloads a client makes.
+
+A client given `observers` calls each one with a `RequestEvent` once every workspace RPC, handle
+service lookup, shock node fetch, and file download finishes (after any retries), whether it
+succeeded or not. An observer is any callable that takes an event, such as:
+- `MetricsRecorder`, which aggregates counters and latency histograms per request kind, method,
+  admin flag, and outcome, and renders them in the Prometheus text format
+- a function that logs slow requests or forwards events to another metrics system
+
+Observers are called from the thread that made the request and should return quickly. An
+observer that raises is logged and otherwise ignored.
+
+`serve_metrics` exposes a recorder over HTTP for Prometheus to scrape from long-running services.
+"""
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+import threading
+import time
+
+# One finished request or download:
+# - kind: 'rpc' (workspace call), 'rpc_stream' (req_stream), 'rpc_download' (req_download),
+#   'handle' (handle service lookup), 'shock_node' (shock metadata), or 'shock_download'
+# - method: workspace method or admin command name (eg. 'get_objects2'); the handle service
+#   method; or 'node' and 'download' for shock
+# - admin: whether the request was made through the workspace administration interface
+# - bytes_sent and bytes_received: sizes of the request and response bodies, as sent on the
+#   wire and after decompression
+# - ttfb: seconds from the start until the first response headers arrived (None if none did)
+# - latency: seconds from the start until the request finished, including retries and waits
+# - attempts: number of attempts made (1 unless the request was retried)
+# - outcome: 'ok' or 'error'
+# - status: HTTP status of the last response, if any
+# - error: the exception raised, if the outcome is 'error'
+RequestEvent = namedtuple('RequestEvent', [
+    'kind',
+    'method',
+    'admin',
+    'bytes_sent',
+    'bytes_received',
+    'ttfb',
+    'latency',
+    'attempts',
+    'outcome',
+    'status',
+    'error',
+])
+
+Observer = Callable[[RequestEvent], None]
+
+# Upper bounds, in seconds, of the default latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+_log = logging.getLogger(__name__)
+
+
+class Probe:
+    """
+    Measures one request or download while it runs, and reports it to the observers at the end.
+    The methods are thread-safe, for downloads fetched over several connections.
+    """
+
+    def __init__(
+            self,
+            observers: Sequence[Observer],
+            kind: str,
+            method: str,
+            admin: bool = False,
+            bytes_sent: int = 0):
+        self._observers = observers
+        self._kind = kind
+        self._method = method
+        self._admin = admin
+        self._bytes_sent = bytes_sent
+        self._bytes_received = 0
+        self._start = time.monotonic()
+        self._ttfb = None  # type: Optional[float]
+        self._attempts = 0
+        self._status = None  # type: Optional[int]
+        self._lock = threading.Lock()
+
+    def attempt(self) -> None:
+        """Record the start of an attempt."""
+        with self._lock:
+            self._attempts += 1
+
+    def response(self, status: int) -> None:
+        """Record the arrival of response headers."""
+        with self._lock:
+            if self._ttfb is None:
+                self._ttfb = time.monotonic() - self._start
+            self._status = status
+
+    def received(self, nbytes: int) -> None:
+        with self._lock:
+            self._bytes_received += nbytes
+
+    def finish(self, error: Optional[BaseException] = None) -> RequestEvent:
+        """Build the event and send it to every observer."""
+        event = RequestEvent(
+            self._kind,
+            self._method,
+            self._admin,
+            self._bytes_sent,
+            self._bytes_received,
+            self._ttfb,
+            time.monotonic() - self._start,
+            # Requests that never reached an attempt (eg. an open circuit) count as one
+            max(1, self._attempts),
+            'ok' if error is None else 'error',
+            self._status,
+            error,
+        )
+        for observer in self._observers:
+            try:
+                observer(event)
+            except Exception:
+                _log.exception("Request observer %r failed", observer)
+        return event
+
+
+class _NullProbe:
+    """Stands in for a Probe when nothing observes the client, so measuring costs nothing."""
+
+    def attempt(self) -> None:
+        pass
+
+    def response(self, status: int) -> None:
+        pass
+
+    def received(self, nbytes: int) -> None:
+        pass
+
+
+NULL_PROBE = _NullProbe()
+
+
+@contextmanager
+def measure(
+        observers: Sequence[Observer],
+        kind: str,
+        method: str,
+        admin: bool = False,
+        bytes_sent: int = 0) -> Iterator[Any]:
+    """
+    Measure the request or download made inside the block, and report it when the block exits.
+    Yields:
+        A Probe to record attempts, responses, and bytes on; or a no-op probe if there are no
+        observers
+    """
+    if not observers:
+        yield NULL_PROBE
+        return
+    probe = Probe(observers, kind, method, admin, bytes_sent)
+    try:
+        yield probe
+    except GeneratorExit:
+        # A generator making the request was closed early by its consumer
+        probe.finish()
+        raise
+    except BaseException as err:
+        probe.finish(err)
+        raise
+    probe.finish()
+
+
+class Histogram:
+    """
+    Cumulative bucket histogram of observed values, as used by Prometheus.
+
+    Percentiles are estimated by interpolating linearly inside the bucket they fall in, so they
+    are only as precise as the buckets. Not thread-safe on its own.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: increasing upper bounds of the buckets. Values above the last bound go in
+                an extra, unbounded bucket.
+        """
+        self.buckets = tuple(buckets)
+        # Count of values in each bucket (not cumulative), plus the unbounded bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Estimate a percentile of the observed values.
+        Args:
+            q: percentile from 0 to 100
+        Returns:
+            The estimate, or None if nothing was observed
+        """
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for (idx, count) in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                upper = self.buckets[idx] if idx < len(self.buckets) else self.max
+                # Never estimate past the largest value seen
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * max(0.0, rank - seen) / count
+            seen += count
+        return self.max
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, count of values at or below it) for each bucket, ending with +Inf."""
+        (result, total) = ([], 0)
+        for (bound, count) in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class _Series:
+    """Counters and histograms of the events with the same labels."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.requests = 0
+        self.attempts = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram(buckets)
+        self.ttfb = Histogram(buckets)
+
+    def add(self, event: RequestEvent) -> None:
+        self.requests += 1
+        self.attempts += event.attempts
+        self.bytes_sent += event.bytes_sent
+        self.bytes_received += event.bytes_received
+        self.latency.observe(event.latency)
+        if event.ttfb is not None:
+            self.ttfb.observe(event.ttfb)
+
+
+# Labels of a series of a MetricsRecorder
+_SeriesKey = namedtuple('_SeriesKey', ['kind', 'method', 'admin', 'outcome'])
+
+
+class MetricsRecorder:
+    """
+    Observer that aggregates events into counters and latency and time to first byte histograms,
+    one series per (kind, method, admin, outcome). Thread-safe.
+
+    Pass it in a client's `observers`, then read it with `stats`, `percentile`, or `prometheus`.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, namespace: str = 'kbase_ws'):
+        """
+        Args:
+            buckets: upper bounds, in seconds, of the histogram buckets
+            namespace: prefix of the Prometheus metric names
+        """
+        self.buckets = tuple(buckets)
+        self.namespace = namespace
+        self._series = {}  # type: Dict[_SeriesKey, _Series]
+        self._lock = threading.Lock()
+
+    def __call__(self, event: RequestEvent) -> None:
+        key = _SeriesKey(event.kind, event.method, event.admin, event.outcome)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.buckets)
+            series.add(event)
+
+    def stats(self) -> Dict[Tuple[str, str, bool, str], dict]:
+        """
+        Summaries of every series.
+        Returns:
+            A dict of (kind, method, admin, outcome) to a dict of the request, attempt, and byte
+            counts, plus 'p50', 'p90', 'p99', and 'max' latencies and 'ttfb_p50' in seconds
+        """
+        with self._lock:
+            return {
+                tuple(key): {
+                    'requests': series.requests,
+                    'attempts': series.attempts,
+                    'bytes_sent': series.bytes_sent,
+                    'bytes_received': series.bytes_received,
+                    'p50': series.latency.percentile(50),
+                    'p90': series.latency.percentile(90),
+                    'p99': series.latency.percentile(99),
+                    'max': series.latency.max,
+                    'ttfb_p50': series.ttfb.percentile(50),
+                }
+                for (key, series) in sorted(self._series.items())
+            }
+
+    def percentile(
+            self,
+            q: float,
+            kind: Optional[str] = None,
+            method: Optional[str] = None,
+            ttfb: bool = False) -> Optional[float]:
+        """
+        Estimate a latency percentile over every series matching `kind` and `method`.
+        Args:
+            q: percentile from 0 to 100
+            kind: only include events of this kind
+            method: only include events for this method
+            ttfb: estimate the time to first byte rather than the total latency
+        Returns:
+            The estimate in seconds, or None if there were no matching events
+        """
+        merged = Histogram(self.buckets)
+        with self._lock:
+            for (key, series) in self._series.items():
+                if (kind is not None and key.kind != kind) or \
+                        (method is not None and key.method != method):
+                    continue
+                histogram = series.ttfb if ttfb else series.latency
+                merged.counts = [a + b for (a, b) in zip(merged.counts, histogram.counts)]
+                merged.count += histogram.count
+                merged.sum += histogram.sum
+                merged.max = max(merged.max, histogram.max)
+        return merged.percentile(q)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def prometheus(self) -> str:
+        """Render every series in the Prometheus text exposition format."""
+        with self._lock:
+            series = sorted(self._series.items())
+            prefix = self.namespace
+            lines = []  # type: List[str]
+            counters = [
+                ('requests_total', 'Requests made', 'requests'),
+                ('attempts_total', 'Attempts made, including retries', 'attempts'),
+                ('sent_bytes_total', 'Request body bytes sent', 'bytes_sent'),
+                ('received_bytes_total', 'Response body bytes received', 'bytes_received'),
+            ]
+            for (name, help_text, field) in counters:
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for (key, values) in series:
+                    lines.append(f"{prefix}_{name}{{{_labels(key)}}} {getattr(values, field)}")
+            histograms = [
+                ('request_duration_seconds', 'Request latency, including retries', 'latency'),
+                ('time_to_first_byte_seconds', 'Time to the first response headers', 'ttfb'),
+            ]
+            for (name, help_text, field) in histograms:
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                for (key, values) in series:
+                    histogram = getattr(values, field)
+                    labels = _labels(key)
+                    for (bound, count) in histogram.cumulative():
+                        le = '+Inf' if bound == float('inf') else repr(float(bound))
+                        lines.append(f'{prefix}_{name}_bucket{{{labels},le="{le}"}} {count}')
+                    lines.append(f"{prefix}_{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{prefix}_{name}_count{{{labels}}} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(recorder: MetricsRecorder, port: int, host: str = '') -> Any:
+    """
+    Serve a recorder's metrics in the Prometheus text format from a background thread.
+    Args:
+        recorder: the MetricsRecorder to expose
+        port: port to listen on (0 picks a free one)
+        host: address to listen on. Defaults to every interface.
+    Returns:
+        The running http.server server. Call `.shutdown()` on it to stop serving.
+    """
+    # Imported here to keep it out of the package import
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self) -> None:
+            body = recorder.prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = Server((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
+
+
+def _labels(key: _SeriesKey) -> str:
+    """Prometheus label pairs for a series."""
+    admin = 'true' if key.admin else 'false'
+    pairs = [('kind', key.kind), ('method', key.method), ('admin', admin),
+             ('outcome', key.outcome)]
+    return ','.join(f'{name}="{_escape(value)}"' for (name, value) in pairs)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
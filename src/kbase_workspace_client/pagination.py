@@ -0,0 +1,112 @@
+"""
+Overlap "list_objects" round trips with the consumer of generate_obj_infos.
+
+Two strategies are provided:
+- `prefetch_pages` fetches the next pages in a background thread while the caller is still
+  working through the current one, keeping a bounded number of pages buffered.
+- `chunked_pages` splits a known object ID range into chunks and fetches several chunks at
+  once, yielding them back in object ID order.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Generator, Iterator
+import collections
+import queue
+import threading
+
+# Seconds between checks for cancellation while waiting for room for another page
+_POLL_INTERVAL = 0.1
+# Marks the end of the pages from the background thread
+_DONE = object()
+
+
+class _PageError:
+    """Carries an exception from the background thread back to the consumer."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def prefetch_pages(pages: Iterator[list], depth: int) -> Generator[list, None, None]:
+    """
+    Run a page iterator in a background thread, buffering up to `depth` pages ahead.
+
+    The next page is only requested once there is room for it, so no more than `depth` fetched
+    pages are ever held besides the one the consumer is working on.
+    Args:
+        pages: iterator of pages, each making a request when advanced
+        depth: max number of fetched pages waiting to be consumed
+    Yields:
+        Each page from `pages`, in the same order. Errors are re-raised in the consumer.
+    """
+    buffered = queue.Queue()  # type: queue.Queue
+    # One slot per page that is being fetched or waiting to be consumed
+    slots = threading.Semaphore(max(1, depth))
+    stopped = threading.Event()
+
+    def reserve() -> bool:
+        """Wait for room for another page. False if the consumer stopped first."""
+        while not stopped.is_set():
+            if slots.acquire(timeout=_POLL_INTERVAL):
+                return True
+        return False
+
+    def fetch() -> None:
+        try:
+            iterator = iter(pages)
+            while reserve():
+                page = next(iterator, _DONE)
+                buffered.put(page)
+                if page is _DONE:
+                    return
+        except Exception as err:
+            buffered.put(_PageError(err))
+
+    thread = threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffered.get()
+            slots.release()
+            if item is _DONE:
+                return
+            if isinstance(item, _PageError):
+                raise item.error
+            yield item
+    finally:
+        # The consumer stopped early or finished; let the thread exit
+        stopped.set()
+        thread.join()
+
+
+def chunked_pages(
+        fetch_chunk: Any,
+        minid: int,
+        maxid: int,
+        chunk_size: int,
+        workers: int) -> Generator[list, None, None]:
+    """
+    Fetch an object ID range as chunks in parallel, yielding pages in object ID order.
+    Args:
+        fetch_chunk: function of (minid, maxid) that returns every page in that ID range
+        minid: first object ID of the range
+        maxid: last object ID of the range (inclusive)
+        chunk_size: number of object IDs in each chunk
+        workers: max number of chunks being fetched at once
+    Yields:
+        Pages of object infos, in object ID order
+    """
+    bounds = ((lo, min(lo + chunk_size - 1, maxid)) for lo in range(minid, maxid + 1, chunk_size))
+    in_flight = collections.deque()  # type: collections.deque
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for (lo, hi) in bounds:
+                in_flight.append(executor.submit(fetch_chunk, lo, hi))
+                if len(in_flight) < workers:
+                    continue
+                yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            # Don't start chunks that haven't been picked up yet
+            for future in in_flight:
+                future.cancel()
@@ -0,0 +1,48 @@
+"""
+Client-side rate limiting for requests made from many threads.
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket.
+
+    Tokens refill continuously at `rate` per second, up to `burst` tokens. Callers reserve tokens
+    with `acquire`, which sleeps until the reservation is covered, so many threads sharing one
+    limiter are collectively held to the rate.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        """
+        Args:
+            rate: tokens added per second (eg. requests or bytes per second)
+            burst: max tokens that can accumulate while the limiter is idle
+        """
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens from the bucket, blocking until they are available.
+        Args:
+            tokens: number of tokens to take. May be larger than `burst`.
+        Returns:
+            The number of seconds spent waiting.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Go into debt for the tokens; later callers queue up behind the debt
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,282 @@
+"""
+Retries, backoff, and load shedding for workspace, handle service, and shock traffic.
+
+A `Resilience` policy wraps each request (including reading its body, for downloads) and
+combines:
+- retries with exponential backoff and full jitter, honoring `Retry-After` headers
+- an optional client-side token bucket limiting the request rate
+- an optional circuit breaker that fails fast after repeated transient failures
+- an optional AIMD concurrency limit that shrinks parallelism when the server pushes back
+
+Only transient failures are retried: connection errors, timeouts, and responses with one of the
+`retry_statuses`. The workspace reports application errors (such as a missing object) with a
+500 status, so 500 is not retried by default.
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Tuple, TypeVar
+import datetime
+import random
+import threading
+import time
+
+from kbase_workspace_client.exceptions import TransientResponseError, CircuitOpenError
+from kbase_workspace_client.ratelimit import RateLimiter
+
+T = TypeVar('T')
+
+# Statuses where the server is telling us to slow down, rather than that it is broken
+_PUSHBACK_STATUSES = (429, 503)
+
+
+class RetryPolicy:
+    """How many times, and how long to wait between, attempts of a request."""
+
+    def __init__(
+            self,
+            max_attempts: int = 5,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30,
+            max_retry_after: float = 300,
+            retry_statuses: Tuple[int, ...] = (429, 502, 503, 504)):
+        """
+        Args:
+            max_attempts: total attempts of a request, including the first one
+            backoff_base: seconds of backoff before the first retry; doubles on each retry
+            backoff_max: max seconds of backoff between attempts
+            max_retry_after: max seconds to wait when the server sends a Retry-After header
+            retry_statuses: HTTP statuses that are retried
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = retry_statuses
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait after a failed attempt (numbered from 1)."""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Fail fast once a service has failed too many times in a row.
+
+    After `failure_threshold` consecutive transient failures the circuit opens, and requests
+    raise CircuitOpenError without being sent. After `reset_timeout` seconds a single trial
+    request is let through: success closes the circuit, failure opens it again. Any other error
+    from the trial (such as a workspace application error) means the service answered, and also
+    closes the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None  # type: Optional[float]
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if requests should not be sent right now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._trial_running:
+                raise CircuitOpenError(max(remaining, 0))
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def end_trial(self) -> None:
+        """Let another trial request through, however the current one ended."""
+        with self._lock:
+            self._trial_running = False
+
+
+class AIMDLimiter:
+    """
+    Adaptive limit on the number of requests in flight.
+
+    The limit grows additively as requests succeed (by about `increase` per window of `limit`
+    requests) and is cut multiplicatively when the server pushes back with 429 or 503.
+    """
+
+    def __init__(
+            self,
+            initial: float = 8,
+            minimum: float = 1,
+            maximum: float = 64,
+            increase: float = 1,
+            decrease: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self._limit = initial
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> float:
+        return self._limit
+
+    @contextmanager
+    def slot(self) -> Iterator['AIMDLimiter']:
+        """Wait for room under the limit, and hold a place while the request runs."""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+            self._cond.notify_all()
+
+    def on_pushback(self) -> None:
+        with self._cond:
+            self._limit = max(self.minimum, self._limit * self.decrease)
+
+
+class Resilience:
+    """Combined retry, rate limit, circuit breaker, and concurrency policy for a client."""
+
+    def __init__(
+            self,
+            retry: Optional[RetryPolicy] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            breaker: Optional[CircuitBreaker] = None,
+            concurrency: Optional[AIMDLimiter] = None):
+        """
+        Args:
+            retry: retry policy. Defaults to RetryPolicy().
+            rate_limiter: token bucket that every attempt takes a token from
+            breaker: circuit breaker shared by every request
+            concurrency: adaptive limit on requests in flight
+        """
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+        self.concurrency = concurrency
+
+    @classmethod
+    def disabled(cls) -> 'Resilience':
+        """A policy that makes each request exactly once, with no limits."""
+        return cls(retry=RetryPolicy(max_attempts=1))
+
+    def check_response(self, resp: Any) -> None:
+        """
+        Raise TransientResponseError if a response has a status that should be retried.
+        Call this from inside the operation passed to `call`.
+        """
+        if resp.status_code in self.retry.retry_statuses:
+            raise TransientResponseError(resp, _retry_after(resp))
+
+    def call(self, operation: Callable[[], T]) -> T:
+        """
+        Run an operation that makes one request, retrying it on transient failures.
+        Args:
+            operation: function that makes the request and processes its response. It must be
+                safe to run again from the start after a failure.
+        Returns:
+            The result of the first successful run of `operation`
+        Raises:
+            The last transient error once the attempts run out, CircuitOpenError if the circuit
+            breaker is open, or any non-transient error from `operation` straight away.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker is not None:
+                self.breaker.before_call()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                if self.concurrency is not None:
+                    with self.concurrency.slot():
+                        result = operation()
+                else:
+                    result = operation()
+            except TransientResponseError as err:
+                self._on_failure(pushback=err.status_code in _PUSHBACK_STATUSES)
+                if attempt >= self.retry.max_attempts:
+                    raise
+                time.sleep(self.retry.backoff(attempt, err.retry_after))
+                continue
+            except _transient_errors():
+                self._on_failure(pushback=False)
+                if attempt >= self.retry.max_attempts:
+                    raise
+                time.sleep(self.retry.backoff(attempt))
+                continue
+            except Exception:
+                # The service answered, if only with an error (eg. a workspace 500), so as far as
+                # the breaker is concerned, the request went through
+                if self.breaker is not None:
+                    self.breaker.record_success()
+                raise
+            finally:
+                if self.breaker is not None:
+                    # Never leave a trial marked as running, or the circuit stays open for good
+                    self.breaker.end_trial()
+            if self.breaker is not None:
+                self.breaker.record_success()
+            if self.concurrency is not None:
+                self.concurrency.on_success()
+            return result
+
+    def _on_failure(self, pushback: bool) -> None:
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        if pushback and self.concurrency is not None:
+            self.concurrency.on_pushback()
+
+
+def _transient_errors() -> Tuple[type, ...]:
+    """Exceptions from requests that indicate a transient network failure."""
+    # Only evaluated once an exception is raised, so requests is not imported up front
+    import requests
+    return (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
+
+
+def _retry_after(resp: Any) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (when - now).total_seconds())
@@ -0,0 +1,156 @@
+"""
+Scan the objects in many workspaces in parallel.
+
+A pool of worker threads pulls workspace IDs off a shared iterator and pages through
+"list_objects" for each one. Pages of results are passed back through a bounded queue, so a
+slow consumer applies back-pressure to the workers instead of buffering the whole deployment.
+"""
+from collections import namedtuple
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Union
+import queue
+import threading
+
+from kbase_workspace_client.main import ObjInfo, _obj_info_pages
+from kbase_workspace_client.ratelimit import RateLimiter
+
+# A workspace that could not be scanned, and the exception that stopped it
+ScanFailure = namedtuple('ScanFailure', ['wsid', 'error'])
+
+# Placed on the queue by each worker thread when it runs out of workspaces
+_WORKER_DONE = object()
+# Seconds between checks for cancellation while blocked on the queue
+_POLL_INTERVAL = 0.1
+
+
+class WorkspaceScan:
+    """
+    Iterator over the ObjInfo tuples of many workspaces, fetched in parallel.
+
+    Results are yielded in the order pages complete, not in workspace order. Workspaces that fail
+    are recorded in `failures` rather than stopping the scan. Breaking out of the iteration, or
+    calling `close()`, cancels the remaining work; requests already in flight are allowed to
+    finish, but no new requests are made.
+    """
+
+    def __init__(
+            self,
+            client: Any,
+            wsids: Iterable[int],
+            filter: Optional[Callable[[ObjInfo], bool]] = None,
+            workers: int = 8,
+            rate_limit: Union[None, float, RateLimiter] = None,
+            admin: bool = False,
+            latest: bool = True):
+        """
+        Start the scan in the background.
+        Args:
+            client: the WorkspaceClient to make requests with
+            wsids: workspace IDs to scan
+            filter: only yield the object infos for which this returns True
+            workers: number of threads making requests at once
+            rate_limit: max number of requests per second across all workers, or a shared
+                RateLimiter. Unlimited by default.
+            admin: make the "list_objects" requests as a Workspace administrator
+            latest: only yield the latest version of each object
+        """
+        if isinstance(rate_limit, (int, float)):
+            rate_limit = RateLimiter(rate_limit)
+        self.failures = []  # type: List[ScanFailure]
+        self._client = client
+        self._wsids = iter(wsids)
+        self._filter = filter
+        self._limiter = rate_limit
+        self._admin = admin
+        self._latest = latest
+        self._wsids_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._queue = queue.Queue(maxsize=workers * 2)  # type: queue.Queue
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True) for _ in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __iter__(self) -> Iterator[ObjInfo]:
+        running = len(self._threads)
+        try:
+            while running and not self._stopped.is_set():
+                try:
+                    item = self._queue.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if item is _WORKER_DONE:
+                    running -= 1
+                elif isinstance(item, ScanFailure):
+                    self.failures.append(item)
+                else:
+                    yield from item
+        finally:
+            self.close()
+
+    def __enter__(self) -> 'WorkspaceScan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Cancel any remaining work and wait for the worker threads to stop."""
+        self._stopped.set()
+        for thread in self._threads:
+            while thread.is_alive():
+                # Unblock workers waiting to put results on a full queue
+                self._drain()
+                thread.join(_POLL_INTERVAL)
+        self._drain()
+
+    def _drain(self) -> None:
+        """Discard everything waiting in the queue, keeping any failures."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, ScanFailure):
+                self.failures.append(item)
+
+    def _next_wsid(self) -> Optional[int]:
+        with self._wsids_lock:
+            return next(self._wsids, None)
+
+    def _put(self, item: Any) -> None:
+        """Put an item on the queue, giving up if the scan is cancelled while waiting."""
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _work(self) -> None:
+        """Worker thread: scan workspaces until there are none left or the scan is cancelled."""
+        try:
+            while not self._stopped.is_set():
+                wsid = self._next_wsid()
+                if wsid is None:
+                    break
+                try:
+                    self._scan_one(wsid)
+                except Exception as err:
+                    self._put(ScanFailure(wsid, err))
+        finally:
+            self._put(_WORKER_DONE)
+
+    def _scan_one(self, wsid: int) -> None:
+        pages = _obj_info_pages(self._client, wsid, latest=self._latest, admin=self._admin)
+        while not self._stopped.is_set():
+            if self._limiter is not None:
+                self._limiter.acquire()
+            part = next(pages, None)
+            if part is None:
+                return
+            infos = [ObjInfo(*info) for info in part]
+            if self._filter is not None:
+                infos = [info for info in infos if self._filter(info)]
+            if infos:
+                self._put(infos)
@@ -0,0 +1,363 @@
+"""
+Statistics, filtering, and splitting of downloaded FASTA and FASTQ files, in parallel processes.
+
+The file is memory-mapped and cut into chunks of about `chunk_size` bytes at record boundaries.
+Each chunk is parsed by a worker of a process pool, which maps the file itself, so the file is
+never read into memory as a whole: at most one record per worker is copied out at a time. The
+results of the chunks are then combined in file order.
+
+Use these on the files written by `download_assembly_fasta`, `download_reads_fastq`, and the
+export helpers. Gzipped files (from `compress=True`) can't be split, so they are rejected.
+
+FASTQ records are expected to have four lines each (unwrapped sequence and quality lines), as
+written by every current sequencer and by KBase.
+"""
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+
+from kbase_workspace_client.main import _validate_file_for_writing
+
+if TYPE_CHECKING:
+    # typing.Counter needs python 3.6.1
+    from typing import Counter as CounterType  # noqa: F401
+
+# Default bytes of the file in each chunk handed to a worker
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+# Bytes hashed at a time for the whole-file checksum
+_HASH_BLOCK = 8 * 1024 * 1024
+_GZIP_MAGIC = b'\x1f\x8b'
+
+# Combined statistics of a FASTA or FASTQ file:
+# - path, format: the file, and 'fasta' or 'fastq' (None for an empty file)
+# - records, bases: number of records and total sequence length
+# - gc_content: fraction of G and C among the bases that aren't N
+# - n_count: number of N bases
+# - min_length, max_length, n50: record lengths (0 for an empty file)
+# - md5: hex MD5 of the whole file, if requested
+# - record_stats: a RecordStats per record in file order, if requested
+SeqStats = namedtuple('SeqStats', [
+    'path', 'format', 'records', 'bases', 'gc_content', 'n_count', 'min_length', 'max_length',
+    'n50', 'md5', 'record_stats',
+])
+# Statistics of one record: its ID (the header up to the first whitespace), length, GC fraction,
+# number of N bases, and hex MD5 of its sequence (without line breaks)
+RecordStats = namedtuple('RecordStats', ['id', 'length', 'gc_content', 'n_count', 'md5'])
+
+# What a worker returns for a chunk
+_ChunkResult = namedtuple('_ChunkResult', ['records', 'bases', 'gc', 'n_count', 'lengths',
+                                           'record_stats'])
+
+
+def sequence_stats(
+        path: str,
+        workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        records: bool = False,
+        checksum: bool = False) -> SeqStats:
+    """
+    Compute the statistics of a FASTA or FASTQ file.
+    Args:
+        path: FASTA or FASTQ file (detected from its first byte)
+        workers: number of worker processes. Defaults to the number of CPUs.
+        chunk_size: approximate bytes of the file parsed by each task
+        records: also return the statistics of every record. For reads files this holds one
+            tuple per read in memory.
+        checksum: also compute the MD5 of the whole file, while the workers parse it
+    Returns:
+        SeqStats of the file
+    Raises:
+        ValueError if the file is gzipped or is not FASTA or FASTQ
+    """
+    return _run(path, workers, chunk_size, records, checksum, None)
+
+
+def filter_records(
+        path: str,
+        dest_path: str,
+        min_length: int = 0,
+        max_length: Optional[int] = None,
+        workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE) -> SeqStats:
+    """
+    Write the records of a FASTA or FASTQ file whose sequence length is within bounds to a new
+    file. Each worker writes its kept records to a temporary file next to `dest_path`, and the
+    parts are then concatenated in order.
+    Args:
+        path: FASTA or FASTQ file
+        dest_path: path of the filtered file
+        min_length: drop records shorter than this
+        max_length: drop records longer than this. Unlimited by default.
+        workers: number of worker processes. Defaults to the number of CPUs.
+        chunk_size: approximate bytes of the file parsed by each task
+    Returns:
+        SeqStats of the records that were kept
+    Raises:
+        IOError if `dest_path` already exists or can't be written
+        ValueError if the file is gzipped or is not FASTA or FASTQ
+    """
+    _validate_file_for_writing(dest_path)
+    part_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(dest_path)))
+    try:
+        stats = _run(path, workers, chunk_size, False, False, (min_length, max_length, part_dir))
+        with open(dest_path, 'wb') as dest:
+            for name in sorted(os.listdir(part_dir)):
+                with open(os.path.join(part_dir, name), 'rb') as part:
+                    shutil.copyfileobj(part, dest, _HASH_BLOCK)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return stats._replace(path=dest_path)
+
+
+def split_records(path: str, dest_dir: str, max_bytes: int) -> List[str]:
+    """
+    Split a FASTA or FASTQ file into files of about `max_bytes` each, at record boundaries.
+    Files are named after the original, with a part number before the extension (eg.
+    'reads.1.fastq'). A single record larger than `max_bytes` gets a file of its own.
+    Args:
+        path: FASTA or FASTQ file
+        dest_dir: directory to write the parts in
+        max_bytes: approximate max size of each part
+    Returns:
+        The paths of the parts, in order
+    Raises:
+        ValueError if the file is gzipped or is not FASTA or FASTQ
+    """
+    (stem, ext) = os.path.splitext(os.path.basename(path))
+    paths = []  # type: List[str]
+    with _open_map(path) as (mm, fmt):
+        if mm is None:
+            return paths
+        for (idx, (start, end)) in enumerate(_chunk_ranges(mm, fmt, max_bytes)):
+            part_path = os.path.join(dest_dir, f'{stem}.{idx + 1}{ext}')
+            with open(part_path, 'wb') as part:
+                for offset in range(start, end, _HASH_BLOCK):
+                    part.write(mm[offset:min(end, offset + _HASH_BLOCK)])
+            paths.append(part_path)
+    return paths
+
+
+def _run(
+        path: str,
+        workers: Optional[int],
+        chunk_size: int,
+        records: bool,
+        checksum: bool,
+        keep: Optional[Tuple[int, Optional[int], str]]) -> SeqStats:
+    """Parse every chunk of a file, in a process pool if there is more than one."""
+    with _open_map(path) as (mm, fmt):
+        if mm is None:
+            md5 = hashlib.md5().hexdigest() if checksum else None
+            return SeqStats(path, None, 0, 0, 0.0, 0, 0, 0, 0, md5, [] if records else None)
+        tasks = [
+            (path, fmt, start, end, records, keep, idx)
+            for (idx, (start, end)) in enumerate(_chunk_ranges(mm, fmt, chunk_size))
+        ]
+        if len(tasks) == 1 or workers == 1:
+            md5 = _file_md5(mm) if checksum else None
+            results = [_parse_chunk(*task) for task in tasks]
+        else:
+            # Imports multiprocessing, so only when it's used
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_parse_chunk, *task) for task in tasks]
+                # Hash the file in this process while the workers parse it
+                md5 = _file_md5(mm) if checksum else None
+                results = [future.result() for future in futures]
+    return _combine(path, fmt, results, md5, records)
+
+
+@contextmanager
+def _open_map(path: str) -> Iterator[Tuple[Any, Optional[str]]]:
+    """Map a file read-only, yielding the map and the file format, or (None, None) if empty."""
+    with open(path, 'rb') as fd:
+        if os.fstat(fd.fileno()).st_size == 0:
+            yield (None, None)
+            return
+        with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield (mm, _detect_format(mm, path))
+
+
+def _detect_format(mm: Any, path: str) -> str:
+    if mm[:2] == _GZIP_MAGIC:
+        raise ValueError(f"{path} is gzipped; decompress it first")
+    first = mm[:1024].lstrip()[:1]
+    if first == b'>':
+        return 'fasta'
+    if first == b'@':
+        return 'fastq'
+    raise ValueError(f"{path} is not a FASTA or FASTQ file")
+
+
+def _chunk_ranges(mm: Any, fmt: str, chunk_size: int) -> List[Tuple[int, int]]:
+    """Byte ranges of about `chunk_size` covering the file, each starting at a record."""
+    size = len(mm)
+    bounds = [0]
+    while bounds[-1] < size:
+        target = bounds[-1] + max(1, chunk_size)
+        bounds.append(size if target >= size else _record_start(mm, fmt, target))
+    return list(zip(bounds, bounds[1:]))
+
+
+def _record_start(mm: Any, fmt: str, offset: int) -> int:
+    """Offset of the first record starting at or after `offset`, or the file size."""
+    size = len(mm)
+    pos = offset - 1
+    while True:
+        idx = mm.find(b'\n>' if fmt == 'fasta' else b'\n@', pos)
+        if idx == -1:
+            return size
+        start = idx + 1
+        if fmt == 'fasta':
+            return start
+        # Quality lines can start with '@' too: a header is followed by a sequence line and then
+        # a line starting with '+'
+        seq_end = mm.find(b'\n', start)
+        plus_start = mm.find(b'\n', seq_end + 1) + 1 if seq_end != -1 else 0
+        if plus_start > 0 and mm[plus_start:plus_start + 1] == b'+':
+            return start
+        pos = start
+
+
+def _parse_chunk(
+        path: str,
+        fmt: str,
+        start: int,
+        end: int,
+        records: bool,
+        keep: Optional[Tuple[int, Optional[int], str]],
+        idx: int) -> _ChunkResult:
+    """Parse the records in a byte range of a file. Runs in a worker process."""
+    (n_records, bases, gc, n_count) = (0, 0, 0, 0)
+    lengths = Counter()  # type: CounterType[int]
+    record_stats = [] if records else None  # type: Optional[List[RecordStats]]
+    part = None
+    if keep is not None:
+        (min_length, max_length, part_dir) = keep
+        part = open(os.path.join(part_dir, f'{idx:08d}'), 'wb')
+    parse = _fasta_records if fmt == 'fasta' else _fastq_records
+    with open(path, 'rb') as fd, mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        try:
+            for (rec_start, rec_end, header, seq) in parse(mm, start, end):
+                length = len(seq)
+                if part is not None:
+                    if length < min_length or (max_length is not None and length > max_length):
+                        continue
+                    part.write(mm[rec_start:rec_end])
+                    if mm[rec_end - 1:rec_end] != b'\n':
+                        part.write(b'\n')
+                rec_gc = _count(seq, b'GCgc')
+                rec_n = _count(seq, b'Nn')
+                n_records += 1
+                bases += length
+                gc += rec_gc
+                n_count += rec_n
+                lengths[length] += 1
+                if record_stats is not None:
+                    record_stats.append(RecordStats(
+                        header.split(None, 1)[0].decode() if header.strip() else '', length,
+                        _gc_fraction(rec_gc, length - rec_n), rec_n,
+                        hashlib.md5(seq).hexdigest()))
+        finally:
+            if part is not None:
+                part.close()
+    return _ChunkResult(n_records, bases, gc, n_count, lengths, record_stats)
+
+
+def _fasta_records(mm: Any, start: int, end: int) -> Iterator[Tuple[int, int, bytes, bytes]]:
+    """Yield (start, end, header, sequence) for each FASTA record in a byte range."""
+    pos = start
+    while pos < end:
+        if mm[pos:pos + 1] != b'>':
+            # Blank lines between records
+            pos += 1
+            continue
+        header_end = mm.find(b'\n', pos, end)
+        if header_end == -1:
+            header_end = end
+        next_record = mm.find(b'\n>', header_end, end)
+        rec_end = end if next_record == -1 else next_record + 1
+        # Copy out this one record's sequence, without line breaks
+        seq = mm[header_end + 1:rec_end].translate(None, b'\r\n \t')
+        yield (pos, rec_end, mm[pos + 1:header_end].rstrip(b'\r'), seq)
+        pos = rec_end
+
+
+def _fastq_records(mm: Any, start: int, end: int) -> Iterator[Tuple[int, int, bytes, bytes]]:
+    """Yield (start, end, header, sequence) for each four line FASTQ record in a byte range."""
+    pos = start
+    while pos < end:
+        if mm[pos:pos + 1] != b'@':
+            pos += 1
+            continue
+        line_ends = []
+        line_start = pos
+        for _ in range(4):
+            line_end = mm.find(b'\n', line_start, end)
+            if line_end == -1:
+                line_end = end
+            line_ends.append(line_end)
+            line_start = line_end + 1
+        rec_end = min(line_ends[3] + 1, end)
+        header = mm[pos + 1:line_ends[0]].rstrip(b'\r')
+        seq = mm[line_ends[0] + 1:line_ends[1]].rstrip(b'\r')
+        yield (pos, rec_end, header, seq)
+        pos = rec_end
+
+
+def _count(seq: bytes, chars: bytes) -> int:
+    return sum(seq.count(chars[idx:idx + 1]) for idx in range(len(chars)))
+
+
+def _gc_fraction(gc: int, called_bases: int) -> float:
+    return gc / called_bases if called_bases else 0.0
+
+
+def _file_md5(mm: Any) -> str:
+    digest = hashlib.md5()
+    view = memoryview(mm)
+    try:
+        for offset in range(0, len(mm), _HASH_BLOCK):
+            digest.update(view[offset:offset + _HASH_BLOCK])
+    finally:
+        view.release()
+    return digest.hexdigest()
+
+
+def _combine(
+        path: str,
+        fmt: str,
+        results: Sequence[_ChunkResult],
+        md5: Optional[str],
+        records: bool) -> SeqStats:
+    """Combine the results of every chunk, in file order."""
+    lengths = Counter()  # type: CounterType[int]
+    for result in results:
+        lengths.update(result.lengths)
+    n_records = sum(result.records for result in results)
+    bases = sum(result.bases for result in results)
+    n_count = sum(result.n_count for result in results)
+    gc = sum(result.gc for result in results)
+    record_stats = None
+    if records:
+        record_stats = [stats for result in results for stats in result.record_stats]
+    return SeqStats(
+        path, fmt, n_records, bases, _gc_fraction(gc, bases - n_count), n_count,
+        min(lengths) if lengths else 0, max(lengths) if lengths else 0, _n50(lengths), md5,
+        record_stats)
+
+
+def _n50(lengths: 'CounterType[int]') -> int:
+    """Length of the shortest record among the longest records holding half the bases."""
+    total = sum(length * count for (length, count) in lengths.items())
+    covered = 0
+    for length in sorted(lengths, reverse=True):
+        covered += length * lengths[length]
+        if covered * 2 >= total:
+            return length
+    return 0
@@ -0,0 +1,185 @@
+"""
+Pooled HTTP sessions for talking to the workspace, handle service, and shock.
+
+A single `requests.Session` holds a urllib3 connection pool per host, so reusing it across calls
+avoids a new TCP and TLS handshake for every request. The underlying pools are thread-safe, so
+one session can be shared by every thread that uses a WorkspaceClient.
+
+A `Transport` bundles the session with the settings that apply to every request a client makes:
+the timeout, the resilience (retry) policy, the JSON codec, request body compression, the
+observers that are told about every request, and the coalescing of concurrent identical requests.
+
+requests is imported when the first session is made, rather than on package import.
+"""
+from typing import (
+    Any, Callable, ContextManager, Dict, Hashable, Optional, Sequence, Tuple, TypeVar,
+    TYPE_CHECKING,
+)
+
+from kbase_workspace_client.codec import default_codec
+from kbase_workspace_client.coalesce import SingleFlight
+from kbase_workspace_client.compression import (
+    ACCEPT_ENCODING,
+    REQUEST_ENCODINGS,
+    DEFAULT_COMPRESS_MIN_SIZE,
+    compress_body,
+)
+from kbase_workspace_client.metrics import Observer, measure
+from kbase_workspace_client.resilience import Resilience
+
+if TYPE_CHECKING:
+    import requests
+
+T = TypeVar('T')
+
+# Default number of per-host pools to cache, and connections to keep in each pool
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+
+def make_session(
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        pool_block: bool = False,
+        keep_alive: bool = True) -> 'requests.Session':
+    """
+    Create a session with configured connection pools for http and https.
+    Args:
+        pool_connections: number of per-host connection pools to keep around
+        pool_maxsize: max number of connections kept open to a single host
+        pool_block: whether to block (rather than open a throwaway connection) when every
+            connection to a host is in use
+        keep_alive: whether to keep connections open between requests
+    Returns:
+        A new requests.Session. Call `.close()` on it to release its connections.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # Only ask for encodings that can be decoded as a response streams in
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+class Transport:
+    """The pooled session and the request settings shared by a client's requests."""
+
+    def __init__(
+            self,
+            session: 'requests.Session',
+            timeout: Any = None,
+            resilience: Optional[Resilience] = None,
+            codec: Any = None,
+            compress_requests: Optional[str] = None,
+            compress_min_size: int = DEFAULT_COMPRESS_MIN_SIZE,
+            observers: Optional[Sequence[Observer]] = None,
+            coalesce: bool = True):
+        """
+        Args:
+            session: pooled session to send requests with
+            timeout: requests timeout applied to every request
+            resilience: retry and rate limiting policy. Defaults to a single attempt per request.
+            codec: JSON codec for request and response bodies. Defaults to the fastest installed.
+            compress_requests: Content-Encoding ('gzip' or 'deflate') for JSON request bodies.
+                Defaults to sending them uncompressed.
+            compress_min_size: only compress request bodies of at least this many bytes
+            observers: functions called with a RequestEvent as each request finishes
+            coalesce: share concurrent identical read-only requests (see `coalesce`)
+        """
+        if compress_requests is not None and compress_requests not in REQUEST_ENCODINGS:
+            raise ValueError(f"compress_requests must be one of {REQUEST_ENCODINGS}, "
+                             f"not {compress_requests!r}")
+        self.session = session
+        self.timeout = timeout
+        self.resilience = resilience if resilience is not None else Resilience.disabled()
+        self.codec = codec if codec is not None else default_codec()
+        self.compress_requests = compress_requests
+        self.compress_min_size = compress_min_size
+        self.observers = list(observers or [])
+        self.flights = SingleFlight() if coalesce else None
+
+    def coalesce(self, key: Hashable, operation: Callable[[], Any]) -> Any:
+        """Run a read-only operation, sharing it with concurrent callers of the same key."""
+        if self.flights is None:
+            return operation()
+        return self.flights.do(key, operation)
+
+    def encode(self, payload: Any) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Encode a JSON request body, compressing it if it is large enough.
+        Returns:
+            The body, and the headers to send with it
+        """
+        data = self.codec.dumps(payload)
+        if self.compress_requests is None or len(data) < self.compress_min_size:
+            return (data, {})
+        encoding = self.compress_requests
+        return (compress_body(data, encoding), {'Content-Encoding': encoding})
+
+    def measure(
+            self,
+            kind: str,
+            method: str,
+            admin: bool = False,
+            bytes_sent: int = 0) -> ContextManager[Any]:
+        """
+        Measure a request or download made inside a `with` block, for the observers.
+        See `kbase_workspace_client.metrics.measure`.
+        """
+        return measure(self.observers, kind, method, admin, bytes_sent)
+
+    def request(
+            self,
+            method: str,
+            url: str,
+            probe: Any = None,
+            **kwargs: Any) -> 'requests.Response':
+        """
+        Send a request with the client's timeout.
+        Args:
+            probe: a probe from `measure` to record the response on
+        Raises:
+            TransientResponseError if the response status should be retried
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        resp = self.session.request(method, url, **kwargs)
+        if probe is not None:
+            probe.response(resp.status_code)
+        try:
+            self.resilience.check_response(resp)
+        except Exception:
+            resp.close()
+            raise
+        return resp
+
+    def get(self, url: str, **kwargs: Any) -> 'requests.Response':
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> 'requests.Response':
+        return self.request('POST', url, **kwargs)
+
+    def call(self, operation: Callable[[], T], probe: Any = None) -> T:
+        """
+        Run an operation that makes one request, under the resilience policy.
+        Args:
+            probe: a probe from `measure` to count the attempts on
+        """
+        if probe is None:
+            return self.resilience.call(operation)
+
+        def attempt() -> T:
+            probe.attempt()
+            return operation()
+        return self.resilience.call(attempt)
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,375 @@
+"""
+Download engine for shock files.
+
+Small files, or files of unknown size, are streamed over one connection. With several
+connections, or when resuming, the file is split into byte ranges (using shock's `seek` and
+`length` download parameters) that are fetched in parallel and written straight into a
+preallocated destination file at their offsets.
+
+Progress of a ranged download is recorded in a small state file next to the destination, so a
+failed download can be resumed without fetching the finished ranges again.
+
+Files can also be saved gzipped, over one connection. Shock compresses files on the fly when asked
+to, and files it already stores gzipped are saved as they are.
+
+Response bodies are read into large reusable buffers and written out a buffer at a time (see
+`filewriter`). Files can be preallocated on disk before they are written, and synced to disk when
+they are finished.
+
+Downloads are checked against the size and md5 checksum in the node metadata as they are written.
+A single-stream download that doesn't match is fetched again. In a ranged download, each range is
+checked for its length, and a range of the wrong size is fetched again on its own. The checksum
+can only be computed when the ranges arrive in order, over one connection and from the start of
+the file; a mismatch then restarts the whole file. Other ranged downloads log a warning that the
+checksum isn't checked.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import json
+import logging
+import os
+import threading
+
+from kbase_workspace_client.compression import GzipWriter, is_gzip_name
+from kbase_workspace_client.exceptions import (
+    IntegrityError, UnauthorizedShockDownload, MissingShockFile
+)
+from kbase_workspace_client.filewriter import (
+    allocate, copy_response, FileWriter, DEFAULT_BUFFER_SIZE
+)
+from kbase_workspace_client.integrity import Digest, retry_on_mismatch, VERIFY_ATTEMPTS
+from kbase_workspace_client.metrics import NULL_PROBE
+
+# Max bytes read from the network at a time
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Bytes in each range of a ranged download
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+# Suffix of the file that tracks the finished ranges of a download
+STATE_SUFFIX = '.ranges'
+
+_log = logging.getLogger(__name__)
+
+
+def fetch_node(transport: Any, node_url: str, headers: dict, shock_id: str) -> dict:
+    """
+    Fetch the metadata of a shock node.
+    Raises:
+        UnauthorizedShockDownload or MissingShockFile if the node cannot be downloaded
+    """
+    with transport.measure('shock_node', 'node') as probe:
+        response = transport.call(
+            lambda: transport.get(node_url, headers=headers, allow_redirects=True, probe=probe),
+            probe)
+        if not response.ok:
+            raise RuntimeError(f"Error from shock: {response.text}")
+        probe.received(len(response.content))
+        metadata = transport.codec.loads(response.content)
+    # Make sure the shock file is present and valid
+    if metadata['status'] == 401:
+        raise UnauthorizedShockDownload(shock_id)
+    if metadata['status'] == 404:
+        raise MissingShockFile(shock_id)
+    return metadata
+
+
+def node_file_size(metadata: dict) -> Optional[int]:
+    """Size in bytes of the file attached to a node, if shock reports it."""
+    node_file = (metadata.get('data') or {}).get('file') or {}
+    size = node_file.get('size')
+    return int(size) if size is not None else None
+
+
+def node_file_md5(metadata: dict) -> Optional[str]:
+    """md5 checksum of the file attached to a node, if shock reports it."""
+    node_file = (metadata.get('data') or {}).get('file') or {}
+    return (node_file.get('checksum') or {}).get('md5') or None
+
+
+def node_file_name(metadata: dict) -> Optional[str]:
+    """Name of the file attached to a node, if shock reports it."""
+    node_file = (metadata.get('data') or {}).get('file') or {}
+    return node_file.get('name')
+
+
+def download_url(node_url: str, metadata: dict, compress: bool = False) -> str:
+    """
+    URL to download a node's whole file from. With `compress`, shock is asked to gzip the file,
+    unless the node's file name says it is already gzipped.
+    """
+    if compress and not is_gzip_name(node_file_name(metadata)):
+        return node_url + '?download&compression=gzip'
+    return node_url + '?download_raw'
+
+
+def stream_download(
+        transport: Any,
+        node_url: str,
+        headers: dict,
+        dest_path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        on_chunk: Optional[Callable[[int], None]] = None,
+        compress: bool = False,
+        metadata: Optional[dict] = None,
+        probe: Any = NULL_PROBE,
+        verify: bool = True,
+        preallocate: bool = False,
+        fsync: bool = False,
+        buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+    """
+    Download a whole shock file over a single connection.
+
+    `on_chunk`, if given, is called with the size of each chunk before it is written. With
+    `compress`, the file is saved gzipped: shock is asked to compress it, unless the node
+    `metadata` names a file that is already gzipped. A response that still isn't gzipped is
+    compressed as it is written. The download is recorded on `probe`, if given.
+
+    With `verify`, the bytes received are checked against the size and md5 checksum in the node
+    `metadata` (unless shock compresses them on the way), and downloaded again on a mismatch.
+
+    The file is written `buffer_size` bytes at a time. With `preallocate`, its full size (from
+    the node `metadata`) is reserved on disk first; with `fsync`, it is synced to disk at the end.
+    Raises:
+        IntegrityError if the file still doesn't match after VERIFY_ATTEMPTS attempts
+    """
+    metadata = metadata or {}
+    url = download_url(node_url, metadata, compress)
+    # Files that shock compresses for us can't be compared with what it stores
+    raw = verify and url.endswith('?download_raw')
+    (size, md5) = (node_file_size(metadata), node_file_md5(metadata)) if raw else (None, None)
+    # The size of a gzipped copy isn't known up front
+    reserve = node_file_size(metadata) if preallocate and not compress else None
+
+    def attempt() -> None:
+        with transport.get(url, headers=headers, allow_redirects=True, stream=True,
+                           probe=probe) as resp:
+            if not resp.ok:
+                raise RuntimeError(f"Error from shock: {resp.text}")
+            digest = Digest(md5=md5 is not None)
+
+            def on_block(block: Any) -> None:
+                if on_chunk is not None:
+                    on_chunk(len(block))
+                probe.received(len(block))
+                digest.update(block)
+            with FileWriter(dest_path, size=reserve, buffer_size=buffer_size,
+                            fsync=fsync) as writer:
+                if compress:
+                    gzip_writer = GzipWriter(writer.write)
+                    copy_response(resp, gzip_writer, chunk_size, on_block)
+                    gzip_writer.close()
+                else:
+                    copy_response(resp, writer, chunk_size, on_block)
+            digest.check(dest_path, size, md5)
+    retry_on_mismatch(lambda: transport.call(attempt, probe))
+
+
+def ranged_download(
+        transport: Any,
+        node_url: str,
+        headers: dict,
+        dest_path: str,
+        size: int,
+        connections: int,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        range_size: int = DEFAULT_RANGE_SIZE,
+        on_chunk: Optional[Callable[[int], None]] = None,
+        probe: Any = NULL_PROBE,
+        preallocate: bool = False,
+        fsync: bool = False,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        resume: bool = False,
+        md5: Optional[str] = None) -> None:
+    """
+    Download a shock file as byte ranges over several connections, resuming if asked to.
+
+    With `resume`, if a state file from an earlier attempt at the same file exists, only the
+    unfinished ranges are fetched. Otherwise any state file is ignored and the whole file is
+    fetched. The state file is removed once the download completes.
+
+    Each range must have the requested length, and is fetched again if it doesn't. Given the file's
+    `md5` checksum, a download over one connection that starts from the beginning of the file
+    hashes the ranges as they arrive, in order, and a file that doesn't match is downloaded again.
+    Otherwise the ranges arrive out of order, or partly came from an earlier attempt, and checking
+    the checksum would mean reading the file back from disk; a warning is logged instead.
+    Args:
+        transport: the client Transport to download with
+        node_url: URL of the shock node
+        headers: request headers, including authorization
+        dest_path: file to write
+        size: total size of the file in bytes
+        connections: number of ranges to fetch at once
+        chunk_size: max bytes read at a time
+        range_size: bytes in each range
+        on_chunk: called with the size of each chunk before it is written, from any thread
+        probe: a probe from `Transport.measure` to record the attempts of every range and the
+            bytes received on
+        preallocate: reserve disk space for the whole file up front, rather than creating it
+            sparse
+        fsync: sync each range to disk before recording it as finished
+        buffer_size: bytes written at a time. Each connection reuses one buffer of this size.
+        resume: continue from the state file of an earlier attempt, if there is one
+        md5: expected md5 checksum of the file, to verify it with where possible
+    Raises:
+        IntegrityError if a range, or the file, still doesn't match after VERIFY_ATTEMPTS attempts
+    """
+    for attempt in range(1, VERIFY_ATTEMPTS + 1):
+        try:
+            _ranged_download(
+                transport, node_url, headers, dest_path, size, connections, chunk_size,
+                range_size, on_chunk, probe, preallocate, fsync, buffer_size, resume, md5)
+            return
+        except IntegrityError as err:
+            # Ranges of the wrong size were already retried on their own
+            if err.check != 'md5' or attempt >= VERIFY_ATTEMPTS:
+                raise
+            _log.warning("%s; retrying (attempt %d of %d)", err, attempt + 1, VERIFY_ATTEMPTS)
+
+
+def _ranged_download(
+        transport: Any,
+        node_url: str,
+        headers: dict,
+        dest_path: str,
+        size: int,
+        connections: int,
+        chunk_size: int,
+        range_size: int,
+        on_chunk: Optional[Callable[[int], None]],
+        probe: Any,
+        preallocate: bool,
+        fsync: bool,
+        buffer_size: int,
+        resume: bool,
+        md5: Optional[str]) -> None:
+    """One attempt at a ranged download, checked against the `md5` checksum where possible."""
+    ranges = _split_ranges(size, range_size)
+    state_path = dest_path + STATE_SUFFIX
+    # Only resume an earlier attempt at the same node, split into the same ranges
+    layout = {'node': node_url, 'size': size, 'range_size': range_size}
+    # A state file left next to a new download says nothing about what's in the file
+    done = _load_state(state_path, layout) if resume else set()
+    if not done or not os.path.exists(dest_path):
+        done = set()
+        # Preallocate the full file so each range can be written at its offset
+        allocate(dest_path, size, reserve=preallocate)
+        _save_state(state_path, layout, done)
+    state_lock = threading.Lock()
+    # Buffers are reused by the ranges that a thread fetches
+    buffers = threading.local()
+    # One connection fetches the ranges in file order, so they can be hashed as they arrive
+    in_order = connections <= 1 and not done
+    if md5 is not None and not in_order:
+        _log.warning("Not checking the md5 checksum of %s: its ranges are %s", dest_path,
+                     "partly from an earlier attempt" if done else "fetched out of order")
+    # Digest of the ranges finished so far, in order
+    digests = [Digest()] if md5 is not None and in_order else []
+
+    def fetch(idx: int) -> None:
+        (start, length) = ranges[idx]
+        if getattr(buffers, 'buffer', None) is None:
+            buffers.buffer = bytearray(min(buffer_size, range_size))
+
+        def attempt() -> None:
+            # Each attempt at a range continues from the digest of the ranges before it
+            digest = digests[-1].copy() if digests else None
+            _download_range(
+                transport, node_url, headers, dest_path, start, length, chunk_size, on_chunk,
+                probe, fsync, buffers.buffer, digest)
+            if digest is not None:
+                digests[-1] = digest
+        # Each range is retried on its own under the transport's resilience policy, and again
+        # if it comes back the wrong size
+        retry_on_mismatch(lambda: transport.call(attempt, probe))
+        with state_lock:
+            done.add(idx)
+            _save_state(state_path, layout, done)
+
+    todo = [idx for idx in range(len(ranges)) if idx not in done]
+    with ThreadPoolExecutor(max_workers=max(1, connections)) as executor:
+        futures = [executor.submit(fetch, idx) for idx in todo]
+        (finished, pending) = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+        for future in finished:
+            # Re-raise the first failure; the state file keeps the finished ranges for resuming
+            future.result()
+    os.remove(state_path)
+    if digests:
+        # There is no telling which range is corrupt, so the next attempt starts over
+        digests[-1].check(dest_path, md5=md5)
+
+
+def can_resume(dest_path: str) -> bool:
+    """Whether there is an unfinished ranged download at a path."""
+    return os.path.exists(dest_path) and os.path.exists(dest_path + STATE_SUFFIX)
+
+
+def _split_ranges(size: int, range_size: int) -> List[Tuple[int, int]]:
+    """Split a file size into (offset, length) ranges."""
+    return [(start, min(range_size, size - start)) for start in range(0, size, range_size)]
+
+
+def _download_range(
+        transport: Any,
+        node_url: str,
+        headers: dict,
+        dest_path: str,
+        start: int,
+        length: int,
+        chunk_size: int,
+        on_chunk: Optional[Callable[[int], None]] = None,
+        probe: Any = NULL_PROBE,
+        fsync: bool = False,
+        buffer: Optional[bytearray] = None,
+        digest: Optional[Digest] = None) -> None:
+    """
+    Fetch one byte range and write it into the destination file at its offset, through `buffer`
+    if given. With `fsync`, the range is synced to disk before returning. The bytes of the range
+    are added to `digest`, if given.
+    """
+    url = f"{node_url}?download_raw&seek={start}&length={length}"
+    # Byte offsets only line up with an uncompressed response
+    headers = dict(headers, **{'Accept-Encoding': 'identity'})
+    with transport.get(url, headers=headers, allow_redirects=True, stream=True,
+                       probe=probe) as resp:
+        if not resp.ok:
+            raise RuntimeError(f"Error from shock: {resp.text}")
+        range_name = f"{dest_path} at offset {start}"
+        received = 0
+
+        def on_block(block: Any) -> None:
+            nonlocal received
+            if on_chunk is not None:
+                on_chunk(len(block))
+            probe.received(len(block))
+            if digest is not None:
+                digest.update(block)
+            received += len(block)
+            if received > length:
+                # Don't overwrite the start of the next range
+                raise IntegrityError(range_name, 'size', length, received)
+        with FileWriter(dest_path, offset=start, truncate=False, fsync=fsync,
+                        buffer=buffer) as writer:
+            copy_response(resp, writer, chunk_size, on_block)
+    if received != length:
+        raise IntegrityError(range_name, 'size', length, received)
+
+
+def _load_state(state_path: str, layout: dict) -> Set[int]:
+    """Load the finished ranges of an earlier attempt, if it had the same layout."""
+    try:
+        with open(state_path) as fd:
+            state = json.load(fd)  # type: Dict[str, Any]
+    except (OSError, ValueError):
+        return set()
+    if any(state.get(key) != value for (key, value) in layout.items()):
+        return set()
+    return set(state.get('done', []))
+
+
+def _save_state(state_path: str, layout: dict, done: Set[int]) -> None:
+    """Atomically record the finished ranges."""
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as fd:
+        json.dump(dict(layout, done=sorted(done)), fd)
+    os.replace(tmp_path, state_path)
@@ -0,0 +1,354 @@
+"""
+A compact, columnar store for large numbers of object infos.
+
+A list of millions of object info lists (or ObjInfo tuples) is mostly repeated strings: the same
+type, workspace name, and username appear on row after row. An ObjInfoTable keeps each field in a
+column instead:
+- Integer fields (object ID, version, workspace ID, size) in typed arrays
+- Save dates, which are nearly all distinct, as an array of epoch seconds
+- Repetitive string fields (type, saved by, workspace name) dictionary-encoded, as an array of
+  codes into a list of distinct values
+- Mostly unique strings (object names and checksums) packed end to end into one UTF-8 buffer,
+  with an array of offsets, to avoid the overhead of a python string per row
+- Metadata as a plain list
+
+Filters work on whole columns, matching against the distinct values of a dictionary-encoded
+column once rather than comparing strings on every row, and comparing dates as integers. ObjInfo
+tuples are only built for the rows that are read.
+"""
+from array import array
+from datetime import date
+from functools import lru_cache
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Union
+import re
+import time
+
+from kbase_workspace_client.main import ObjInfo
+
+# Typecodes of the integer, dictionary code, and string offset columns
+_INT_TYPECODE = 'q'
+_CODE_TYPECODE = 'L'
+_OFFSET_TYPECODE = 'Q'
+# Format of the save dates the workspace returns
+_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S+0000'
+# Seconds of a row whose save date isn't a timestamp
+_NO_DATE = -2 ** 63
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# An ISO 8601 date, or timestamp with an optional fraction and UTC offset
+_TIMESTAMP = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?)?'
+    r'(Z|[+-]\d{2}:?\d{2})?$')
+# A timestamp in `_DATE_FORMAT`, which formats back the same way from its seconds
+_CANONICAL = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\+0000$')
+
+
+class _PackedColumn:
+    """A column of strings packed into one UTF-8 buffer."""
+
+    def __init__(self):
+        self.data = bytearray()
+        # End offset of each string in `data`
+        self.ends = array(_OFFSET_TYPECODE)
+
+    def append(self, value: str) -> None:
+        self.data += value.encode()
+        self.ends.append(len(self.data))
+
+    def __getitem__(self, row: int) -> str:
+        start = self.ends[row - 1] if row > 0 else 0
+        return self.data[start:self.ends[row]].decode()
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(len(self.ends)):
+            yield self[row]
+
+    def take(self, rows: Iterable[int]) -> '_PackedColumn':
+        column = _PackedColumn()
+        (data, ends) = (self.data, self.ends)
+        pieces = []
+        total = 0
+        for row in rows:
+            start = ends[row - 1] if row > 0 else 0
+            pieces.append(data[start:ends[row]])
+            total += ends[row] - start
+            column.ends.append(total)
+        column.data = bytearray().join(pieces)
+        return column
+
+
+class _DictColumn:
+    """A dictionary-encoded column of strings."""
+
+    def __init__(self, values: Optional[List[Any]] = None):
+        # Distinct values, shared between a table and the tables filtered from it
+        self.values = values if values is not None else []  # type: List[Any]
+        self.index = {value: code for (code, value) in enumerate(self.values)}
+        self.codes = array(_CODE_TYPECODE)
+
+    def append(self, value: Any) -> None:
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.index[value] = code
+        self.codes.append(code)
+
+    def __getitem__(self, row: int) -> Any:
+        return self.values[self.codes[row]]
+
+    def matching_codes(self, predicate: Any) -> set:
+        """Codes of the distinct values for which `predicate` is true."""
+        return {code for (code, value) in enumerate(self.values) if predicate(value)}
+
+    def take(self, rows: Iterable[int]) -> '_DictColumn':
+        column = _DictColumn.__new__(_DictColumn)
+        (column.values, column.index) = (self.values, self.index)
+        codes = self.codes
+        column.codes = array(_CODE_TYPECODE, [codes[row] for row in rows])
+        return column
+
+
+class _DateColumn:
+    """A column of timestamps, stored as epoch seconds."""
+
+    def __init__(self):
+        self.seconds = array(_INT_TYPECODE)
+        # Row to original value, for the rare values that don't format back the same way
+        self.odd = {}  # type: Dict[int, Any]
+
+    def append(self, value: Any) -> None:
+        if isinstance(value, str) and _CANONICAL.match(value):
+            seconds = _canonical_seconds(value)
+        else:
+            seconds = None
+        if seconds is None:
+            # Kept as it is, though it may still be a timestamp that filters can compare
+            self.odd[len(self.seconds)] = value
+            seconds = _timestamp(value) if isinstance(value, str) else None
+        self.seconds.append(_NO_DATE if seconds is None else seconds)
+
+    def __getitem__(self, row: int) -> Any:
+        if row in self.odd:
+            return self.odd[row]
+        return _format_date(self.seconds[row])
+
+    def __iter__(self) -> Iterator[Any]:
+        for row in range(len(self.seconds)):
+            yield self[row]
+
+    def take(self, rows: Iterable[int]) -> '_DateColumn':
+        column = _DateColumn()
+        (seconds, odd) = (self.seconds, self.odd)
+        for (new_row, row) in enumerate(rows):
+            column.seconds.append(seconds[row])
+            if row in odd:
+                column.odd[new_row] = odd[row]
+        return column
+
+
+class ObjInfoTable:
+    """
+    Columnar table of object infos.
+
+    Build one with `ObjInfoTable.from_infos(...)` (or `append`/`extend`), from object info lists
+    or ObjInfo tuples. Indexing and iterating produce ObjInfo tuples on demand. The table is not
+    thread-safe for writing.
+    """
+
+    def __init__(self):
+        self._objid = array(_INT_TYPECODE)
+        self._name = _PackedColumn()
+        self._type = _DictColumn()
+        self._save_date = _DateColumn()
+        self._version = array(_INT_TYPECODE)
+        self._saved_by = _DictColumn()
+        self._wsid = array(_INT_TYPECODE)
+        self._workspace = _DictColumn()
+        self._chsum = _PackedColumn()
+        self._size = array(_INT_TYPECODE)
+        self._meta = []  # type: List[Optional[Dict[str, str]]]
+
+    @classmethod
+    def from_infos(cls, infos: Iterable[Union[list, ObjInfo]]) -> 'ObjInfoTable':
+        """Build a table from object info lists (as from "list_objects") or ObjInfo tuples."""
+        table = cls()
+        table.extend(infos)
+        return table
+
+    def append(self, info: Union[list, ObjInfo]) -> None:
+        """Add a row from an object info list or ObjInfo tuple."""
+        (objid, name, obj_type, save_date, version, saved_by, wsid, workspace, chsum, size,
+         meta) = info
+        self._objid.append(objid)
+        self._name.append(name)
+        self._type.append(obj_type)
+        self._save_date.append(save_date)
+        self._version.append(version)
+        self._saved_by.append(saved_by)
+        self._wsid.append(wsid)
+        self._workspace.append(workspace)
+        self._chsum.append(chsum)
+        self._size.append(size)
+        self._meta.append(meta)
+
+    def extend(self, infos: Iterable[Union[list, ObjInfo]]) -> None:
+        for info in infos:
+            self.append(info)
+
+    def __len__(self) -> int:
+        return len(self._objid)
+
+    def __getitem__(self, row: Union[int, slice]) -> Any:
+        """An ObjInfo for an integer index, or a new table for a slice."""
+        if isinstance(row, slice):
+            return self._take(range(*row.indices(len(self))))
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('ObjInfoTable index out of range')
+        return ObjInfo(
+            self._objid[row],
+            self._name[row],
+            self._type[row],
+            self._save_date[row],
+            self._version[row],
+            self._saved_by[row],
+            self._wsid[row],
+            self._workspace[row],
+            self._chsum[row],
+            self._size[row],
+            self._meta[row],
+        )
+
+    def __iter__(self) -> Iterator[ObjInfo]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def column(self, field: str) -> List[Any]:
+        """All values of one ObjInfo field (eg. 'type' or 'wsid'), in row order."""
+        if field not in ObjInfo._fields:
+            raise KeyError(f"Unknown ObjInfo field {field}")
+        column = getattr(self, '_' + field)
+        if isinstance(column, _DictColumn):
+            values = column.values
+            return [values[code] for code in column.codes]
+        return list(column)
+
+    def filter(
+            self,
+            type_prefix: Optional[str] = None,
+            wsid: Union[None, int, Collection[int]] = None,
+            saved_by: Optional[str] = None,
+            saved_after: Optional[str] = None,
+            saved_before: Optional[str] = None) -> 'ObjInfoTable':
+        """
+        Select the rows matching every given filter.
+        Args:
+            type_prefix: start of the type string (eg. 'KBaseNarrative.Narrative-' for every
+                version of the narrative type)
+            wsid: a workspace ID, or a collection of them
+            saved_by: username of the user that saved the object
+            saved_after: only objects saved at or after this ISO date or timestamp (UTC unless
+                it has an offset)
+            saved_before: only objects saved before this ISO date or timestamp
+        Returns:
+            A new table with the matching rows, in their original order
+        Raises:
+            ValueError if `saved_after` or `saved_before` isn't an ISO date or timestamp
+        """
+        rows = range(len(self))  # type: Iterable[int]
+        if type_prefix is not None:
+            rows = _select(self._type, rows, lambda value: value.startswith(type_prefix))
+        if saved_by is not None:
+            rows = _select(self._saved_by, rows, lambda value: value == saved_by)
+        if saved_after is not None or saved_before is not None:
+            # Rows without a valid save date never match
+            low = _parse_bound(saved_after) if saved_after is not None else _NO_DATE + 1
+            high = _parse_bound(saved_before) if saved_before is not None else 2 ** 63 - 1
+            seconds = self._save_date.seconds
+            rows = [row for row in rows if low <= seconds[row] < high]
+        if wsid is not None:
+            wsids = {wsid} if isinstance(wsid, int) else set(wsid)
+            column = self._wsid
+            rows = [row for row in rows if column[row] in wsids]
+        return self._take(rows)
+
+    def _take(self, rows: Iterable[int]) -> 'ObjInfoTable':
+        """A new table made of the given rows, sharing this table's string dictionaries."""
+        rows = list(rows)
+        table = ObjInfoTable.__new__(ObjInfoTable)
+        for (attr, column) in vars(self).items():
+            if isinstance(column, (_DictColumn, _PackedColumn, _DateColumn)):
+                setattr(table, attr, column.take(rows))
+            elif isinstance(column, array):
+                setattr(table, attr, array(column.typecode, [column[row] for row in rows]))
+            else:
+                setattr(table, attr, [column[row] for row in rows])
+        return table
+
+
+def _select(column: _DictColumn, rows: Iterable[int], predicate: Any) -> List[int]:
+    """Narrow down rows to those whose value in a dictionary-encoded column matches."""
+    matching = column.matching_codes(predicate)
+    codes = column.codes
+    return [row for row in rows if codes[row] in matching]
+
+
+def _timestamp(text: str) -> Optional[int]:
+    """
+    Epoch seconds of an ISO 8601 date or timestamp, which is taken as UTC if it has no offset.
+    Fractions of a second are dropped. None if the text isn't a timestamp.
+    """
+    if _CANONICAL.match(text):
+        return _canonical_seconds(text)
+    match = _TIMESTAMP.match(text)
+    if match is None:
+        return None
+    (year, month, day, hour, minute, second, offset) = match.groups()
+    return _seconds(f'{year}-{month}-{day}', hour, minute, second, offset)
+
+
+def _canonical_seconds(text: str) -> Optional[int]:
+    """Epoch seconds of a timestamp that matches `_CANONICAL`."""
+    return _seconds(text[:10], text[11:13], text[14:16], text[17:19], None)
+
+
+def _seconds(
+        day_text: str,
+        hour: Optional[str],
+        minute: Optional[str],
+        second: Optional[str],
+        offset: Optional[str]) -> Optional[int]:
+    """Epoch seconds of the parts of a timestamp, or None if they are out of range."""
+    (hour, minute, second) = (int(hour or 0), int(minute or 0), int(second or 0))
+    days = _days(day_text)
+    if days is None or hour > 23 or minute > 59 or second > 59:
+        return None
+    seconds = days * 86400 + hour * 3600 + minute * 60 + second
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '-' else 1
+        digits = offset[1:].replace(':', '')
+        seconds -= sign * (int(digits[:2]) * 3600 + int(digits[2:]) * 60)
+    return seconds
+
+
+@lru_cache(maxsize=4096)
+def _days(day_text: str) -> Optional[int]:
+    """Days since the epoch of a 'YYYY-MM-DD' date. Save dates share days, so this is cached."""
+    try:
+        return date(int(day_text[:4]), int(day_text[5:7]), int(day_text[8:10])).toordinal() - \
+            _EPOCH_ORDINAL
+    except ValueError:
+        return None
+
+
+def _parse_bound(text: str) -> int:
+    seconds = _timestamp(text)
+    if seconds is None:
+        raise ValueError(f"Invalid ISO date or timestamp: {text}")
+    return seconds
+
+
+def _format_date(seconds: int) -> str:
+    """Format epoch seconds the way the workspace formats save dates."""
+    return time.strftime(_DATE_FORMAT, time.gmtime(seconds))
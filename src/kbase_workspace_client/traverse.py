@@ -0,0 +1,148 @@
+"""
+Breadth-first traversal of the references between workspace objects.
+
+Starting from a set of references, each level (frontier) of the graph is fetched with batched,
+concurrent get_objects2 requests with `no_data`, which return every object's info and the
+references it holds. Objects found through other objects are fetched by reference path
+(`start;child;grandchild`), so the traversal works through objects that are only readable via
+the objects that reference them.
+
+The edges of an object version never change, so they are kept in a process-wide memo keyed by the
+object's absolute reference. Subgraphs shared between starting points, or between traversals, are
+only fetched once.
+"""
+from collections import namedtuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from kbase_workspace_client.batch import get_objects, DEFAULT_NO_DATA_CHUNK_SIZE, DEFAULT_WORKERS
+from kbase_workspace_client.cache import is_immutable_ref
+from kbase_workspace_client.main import ObjInfo
+from kbase_workspace_client.memo import TTLMemo
+
+# An object reached by a traversal:
+# - ref: absolute 'wsid/objid/version' reference of the object (or the unresolved starting
+#   reference, if it could not be fetched)
+# - path: reference path to the object from a starting reference, such as '1/2/3;4/5/6'
+# - depth: number of hops from the starting reference (0 for starting references)
+# - info: ObjInfo of the object, or None if it could not be fetched
+# - refs: absolute references held by the object
+# - error: exception that prevented fetching the object, or None
+RefNode = namedtuple('RefNode', ['ref', 'path', 'depth', 'info', 'refs', 'error'])
+
+# Memo of (workspace URL, token, admin, absolute reference) to (object info, references)
+EDGE_MEMO = TTLMemo(maxsize=100000, ttl=24 * 60 * 60)
+
+
+def traverse_refs(
+        client: Any,
+        refs: Sequence[str],
+        max_depth: Optional[int] = None,
+        types: Optional[Sequence[str]] = None,
+        expand_types: Optional[Sequence[str]] = None,
+        chunk_size: int = DEFAULT_NO_DATA_CHUNK_SIZE,
+        workers: int = DEFAULT_WORKERS,
+        admin: bool = False) -> Iterator[RefNode]:
+    """
+    Walk the references held by objects, breadth-first.
+
+    Every object is visited once, by the shortest path found to it. Objects that can't be fetched
+    are yielded with their `error` set, whatever their type, and are not expanded.
+    Args:
+        client: the WorkspaceClient to make requests with
+        refs: starting workspace references or reference paths
+        max_depth: max number of hops to follow from the starting references. Unlimited by
+            default.
+        types: only yield objects whose type contains one of these strings (eg. 'Assembly' or
+            'KBaseGenomes.Genome'). All objects are yielded by default.
+        expand_types: only follow the references of objects whose type contains one of these
+            strings. References of all objects are followed by default.
+        chunk_size: number of references in each get_objects2 request
+        workers: number of requests in flight at once
+        admin: make the requests as a Workspace administrator
+    Yields:
+        A RefNode for each object, level by level. Pass the `chsum` of each node's info along
+        when fetching the objects' data (see `get_objects`), so stale cached copies are skipped.
+    """
+    # Absolute references already visited or queued
+    seen = set()  # type: Set[str]
+    # (reference, reference path) of each object in the current level
+    frontier = [(ref, ref) for ref in dict.fromkeys(refs)]
+    depth = 0
+    while frontier:
+        next_frontier = []  # type: List[Tuple[str, str]]
+        nodes = _fetch_level(client, frontier, depth, chunk_size, workers, admin)
+        if depth == 0:
+            # Mark every starting object as seen before expanding any of them, so that a starting
+            # object referenced by another one is still visited at depth 0
+            nodes = _unique_starts(nodes)
+            seen.update(node.ref for node in nodes if node.error is None)
+        for node in nodes:
+            if node.error is not None:
+                yield node
+                continue
+            if _type_matches(node.info, types):
+                yield node
+            if (max_depth is not None and depth >= max_depth) or \
+                    not _type_matches(node.info, expand_types):
+                continue
+            for child in node.refs:
+                if child not in seen:
+                    seen.add(child)
+                    next_frontier.append((child, node.path + ';' + child))
+        frontier = next_frontier
+        depth += 1
+
+
+def _unique_starts(nodes: List[RefNode]) -> List[RefNode]:
+    """Drop starting nodes for an object already reached by an earlier starting reference."""
+    starts = set()  # type: Set[str]
+    unique = []
+    for node in nodes:
+        if node.error is None:
+            if node.ref in starts:
+                continue
+            starts.add(node.ref)
+        unique.append(node)
+    return unique
+
+
+def _fetch_level(
+        client: Any,
+        frontier: List[Tuple[str, str]],
+        depth: int,
+        chunk_size: int,
+        workers: int,
+        admin: bool) -> List[RefNode]:
+    """Fetch the info and references of every object in a level, using the memo where possible."""
+    def memo_key(ref: str) -> Tuple[str, Optional[str], bool, str]:
+        return (client._ws_url, client._token, admin, ref)
+
+    nodes = {}  # type: Dict[int, RefNode]
+    todo = []  # type: List[int]
+    for (idx, (ref, path)) in enumerate(frontier):
+        # The object at the end of a reference path is known by its last reference
+        abs_ref = ref.split(';')[-1]
+        edges = EDGE_MEMO.get(memo_key(abs_ref)) if is_immutable_ref(ref) else None
+        if edges is not None:
+            # A copy, so that callers can't change the memo through the node
+            nodes[idx] = RefNode(abs_ref, path, depth, edges[0], list(edges[1]), None)
+        else:
+            todo.append(idx)
+    paths = [frontier[idx][1] for idx in todo]
+    results = get_objects(
+        client, paths, no_data=True, chunk_size=chunk_size, workers=workers, admin=admin)
+    for (idx, result) in zip(todo, results):
+        (ref, path) = frontier[idx]
+        if isinstance(result, Exception):
+            nodes[idx] = RefNode(ref, path, depth, None, [], result)
+            continue
+        info = ObjInfo(*result['info'])
+        abs_ref = f"{info.wsid}/{info.objid}/{info.version}"
+        child_refs = list(result.get('refs') or [])
+        EDGE_MEMO.put(memo_key(abs_ref), (info, tuple(child_refs)))
+        nodes[idx] = RefNode(abs_ref, path, depth, info, child_refs, None)
+    return [nodes[idx] for idx in range(len(frontier))]
+
+
+def _type_matches(info: ObjInfo, types: Optional[Sequence[str]]) -> bool:
+    return types is None or any(type_name in info.type for type_name in types)
@@ -0,0 +1,579 @@
+"""
+A local stand-in for the KBase Workspace, Handle Service, and Shock APIs, for offline tests and
+benchmarks.
+
+The server implements the calls the client makes:
+- Workspace: list_objects, get_objects2, get_object_info3, get_workspace_info,
+  list_workspace_info, and administer (listObjects, getObjects, getObjectInfo, getWorkspaceInfo,
+  listWorkspaces)
+- Handle service: hids_to_handles
+- Shock: node metadata, and whole (download_raw, download with compression=gzip) or byte range
+  (seek and length) file downloads
+
+It can add latency to every response, limit the bandwidth of each download, gzip responses, and
+fail requests on demand or at random. Start it in a test with:
+
+    with MockKBase(latency=0.01) as server:
+        server.populate(workspaces=2, objects=500)
+        client = WorkspaceClient(server.url)
+
+Run it on its own (eg. to point a benchmark or a notebook at it) with:
+
+    PYTHONPATH=src python -m test.mock_server --port 8000 --workspaces 4 --objects 20000
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+import bisect
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+
+# Max number of object infos list_objects returns at once
+LIST_OBJECTS_LIMIT = 10000
+SAVE_DATE = '2020-01-01T00:00:00+0000'
+DEFAULT_TYPE = 'KBaseGenomes.Genome-17.0'
+
+# Admin commands and the workspace methods they stand for
+_ADMIN_COMMANDS = {
+    'listObjects': 'list_objects',
+    'getObjects': 'get_objects2',
+    'getObjectInfo': 'get_object_info3',
+    'getWorkspaceInfo': 'get_workspace_info',
+    'listWorkspaces': 'list_workspace_info',
+}
+# Bytes written at a time, and throttled, in downloads
+_WRITE_CHUNK = 64 * 1024
+
+
+class RequestFailure(Exception):
+    """Makes the workspace respond with a JSON-RPC error."""
+
+
+class _Fault:
+    """An injected failure for the next `count` requests whose path contains `match`."""
+
+    def __init__(self, status: Optional[int], count: int, match: str, retry_after: Any):
+        self.status = status
+        self.count = count
+        self.match = match
+        self.retry_after = retry_after
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # Benchmarks open many connections at once
+    request_queue_size = 128
+
+
+class MockKBase:
+    """
+    In-memory Workspace, Handle Service, and Shock server running in a background thread.
+    Thread-safe: data can be added and faults injected while it serves requests.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            bandwidth: Optional[float] = None,
+            error_rate: float = 0.0,
+            error_status: int = 503,
+            rpc_error_status: int = 500,
+            gzip_responses: bool = False,
+            seed: int = 0,
+            host: str = '127.0.0.1',
+            port: int = 0):
+        """
+        Args:
+            latency: seconds to wait before every response
+            bandwidth: max bytes per second of each shock download. Unlimited by default.
+            error_rate: fraction of requests that randomly fail with `error_status`
+            error_status: HTTP status of random failures
+            rpc_error_status: HTTP status of JSON-RPC error responses
+            gzip_responses: gzip response bodies for clients that accept it
+            seed: seed of the random failures, so runs are repeatable
+            host: address to listen on
+            port: port to listen on. Defaults to a free port.
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rpc_error_status = rpc_error_status
+        self.gzip_responses = gzip_responses
+        self._random = random.Random(seed)
+        self._address = (host, port)
+        # wsid to workspace info
+        self.workspaces = {}  # type: Dict[int, list]
+        # wsid to objid to the versions of the object, oldest first
+        self.objects = {}  # type: Dict[int, Dict[int, List[dict]]]
+        # wsid to sorted object IDs, for paging through list_objects
+        self._objids = {}  # type: Dict[int, List[int]]
+        # shock node ID to (file name, contents)
+        self.files = {}  # type: Dict[str, Tuple[str, bytes]]
+        # handle ID to shock node ID
+        self.handles = {}  # type: Dict[str, str]
+        # (service, method) of every request, in order
+        self.calls = []  # type: List[Tuple[str, str]]
+        self._faults = []  # type: List[_Fault]
+        # (remaining count, path match, truncate) of injected download corruptions
+        self._corruptions = []  # type: List[List[Any]]
+        self._lock = threading.RLock()
+        self._server = None  # type: Optional[_Server]
+
+    @property
+    def url(self) -> str:
+        """Root URL of the services, to pass to a client."""
+        if self._server is None:
+            raise RuntimeError("The server is not running")
+        (host, port) = self._server.server_address[:2]
+        return f"http://{host}:{port}/services"
+
+    def start(self) -> 'MockKBase':
+        mock = self
+
+        class Handler(_Handler):
+            server_mock = mock
+        self._server = _Server(self._address, Handler)
+        thread = threading.Thread(target=self._server.serve_forever, name='mock-kbase')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'MockKBase':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    # Data
+
+    def add_workspace(
+            self,
+            wsid: int,
+            name: Optional[str] = None,
+            owner: str = 'owner',
+            moddate: str = SAVE_DATE,
+            metadata: Optional[dict] = None) -> list:
+        """Add (or replace the info of) a workspace, and return its info."""
+        with self._lock:
+            max_objid = max(self.objects.get(wsid, {0: None}))
+            info = [wsid, name or f'ws_{wsid}', owner, moddate, max_objid, 'a', 'n', 'unlocked',
+                    metadata or {}]
+            self.workspaces[wsid] = info
+            self.objects.setdefault(wsid, {})
+            self._objids.setdefault(wsid, [])
+            return info
+
+    def add_object(
+            self,
+            wsid: int,
+            objid: int,
+            obj_type: str = DEFAULT_TYPE,
+            data: Any = None,
+            name: Optional[str] = None,
+            saved_by: str = 'user',
+            meta: Optional[dict] = None,
+            refs: Optional[List[str]] = None) -> list:
+        """
+        Save a new version of an object, creating the workspace if needed.
+        Returns:
+            The object info of the new version
+        """
+        data = {} if data is None else data
+        with self._lock:
+            if wsid not in self.workspaces:
+                self.add_workspace(wsid)
+            versions = self.objects[wsid].setdefault(objid, [])
+            if not versions:
+                bisect.insort(self._objids[wsid], objid)
+            encoded = json.dumps(data, sort_keys=True).encode()
+            info = [objid, name or f'object_{objid}', obj_type, SAVE_DATE, len(versions) + 1,
+                    saved_by, wsid, self.workspaces[wsid][1], hashlib.md5(encoded).hexdigest(),
+                    len(encoded), meta or {}]
+            versions.append({'info': info, 'data': data, 'refs': list(refs or [])})
+            ws_info = self.workspaces[wsid]
+            ws_info[4] = max(ws_info[4], objid)
+            return info
+
+    def populate(
+            self,
+            workspaces: int = 1,
+            objects: int = 100,
+            versions: int = 1,
+            obj_type: str = DEFAULT_TYPE,
+            meta_keys: int = 4,
+            data_bytes: int = 0,
+            first_wsid: int = 1) -> None:
+        """
+        Fill workspaces with synthetic objects.
+        Args:
+            workspaces: number of workspaces, with IDs from `first_wsid`
+            objects: number of objects in each workspace
+            versions: number of versions of each object
+            obj_type: type of every object
+            meta_keys: number of metadata keys in each object info
+            data_bytes: approximate size of each object's data
+            first_wsid: ID of the first workspace
+        """
+        meta = {f'key_{idx}': f'value_{idx}' for idx in range(meta_keys)}
+        for wsid in range(first_wsid, first_wsid + workspaces):
+            for objid in range(1, objects + 1):
+                for _ in range(versions):
+                    data = {'id': f'object_{objid}', 'payload': 'x' * data_bytes}
+                    self.add_object(wsid, objid, obj_type, data, meta=dict(meta))
+
+    def add_shock_file(
+            self,
+            contents: bytes,
+            node_id: Optional[str] = None,
+            name: str = 'file') -> str:
+        """Store a shock file, and return its node ID."""
+        with self._lock:
+            node_id = node_id or f'node_{len(self.files) + 1}'
+            self.files[node_id] = (name, contents)
+            return node_id
+
+    def add_handle(self, node_id: str, hid: Optional[str] = None) -> str:
+        """Point a handle ID at a shock node, and return the handle ID."""
+        with self._lock:
+            hid = hid or f'KBH_{len(self.handles) + 1}'
+            self.handles[hid] = node_id
+            return hid
+
+    # Faults and call records
+
+    def fail(
+            self,
+            status: Optional[int] = 503,
+            count: int = 1,
+            match: str = '',
+            retry_after: Any = None) -> None:
+        """
+        Fail the next requests.
+        Args:
+            status: HTTP status to respond with, or None to drop the connection without a
+                response
+            count: number of requests to fail
+            match: only fail requests whose path contains this (eg. 'shock-api', or '/ws')
+            retry_after: value of a Retry-After header to send with the failures
+        """
+        with self._lock:
+            self._faults.append(_Fault(status, count, match, retry_after))
+
+    def corrupt(self, count: int = 1, match: str = '', truncate: bool = False) -> None:
+        """
+        Send wrong bytes, with a matching Content-Length, in the next shock downloads.
+        Args:
+            count: number of downloads to corrupt
+            match: only corrupt downloads whose path contains this (eg. 'seek=0')
+            truncate: leave out the last byte, rather than changing the first one
+        """
+        with self._lock:
+            self._corruptions.append([count, match, truncate])
+
+    def calls_to(self, method: str) -> int:
+        """Number of requests made for a workspace method, handle method, or 'shock'."""
+        with self._lock:
+            return sum(1 for (_, called) in self.calls if called == method)
+
+    def reset_calls(self) -> None:
+        with self._lock:
+            self.calls = []
+
+    def _take_fault(self, path: str) -> Optional[_Fault]:
+        with self._lock:
+            for fault in self._faults:
+                if fault.match in path:
+                    fault.count -= 1
+                    if fault.count <= 0:
+                        self._faults.remove(fault)
+                    return fault
+            if self.error_rate and self._random.random() < self.error_rate:
+                return _Fault(self.error_status, 1, '', None)
+        return None
+
+    def _corrupt(self, path: str, body: bytes) -> bytes:
+        with self._lock:
+            for corruption in self._corruptions:
+                (count, match, truncate) = corruption
+                if match in path and body:
+                    corruption[0] -= 1
+                    if corruption[0] <= 0:
+                        self._corruptions.remove(corruption)
+                    return body[:-1] if truncate else bytes([body[0] ^ 0xff]) + body[1:]
+        return body
+
+    # Workspace methods
+
+    def call_workspace(self, method: str, params: dict) -> Any:
+        """Run a workspace method, raising RequestFailure for a JSON-RPC error."""
+        if method == 'administer':
+            command = params.get('command')
+            if command not in _ADMIN_COMMANDS:
+                raise RequestFailure(f"Unknown admin command {command}")
+            (method, params) = (_ADMIN_COMMANDS[command], params.get('params', {}))
+        handler = getattr(self, '_ws_' + method, None)
+        if handler is None:
+            raise RequestFailure(f"Unknown method {method}")
+        with self._lock:
+            return handler(params)
+
+    def _ws_list_objects(self, params: dict) -> list:
+        minid = params.get('minObjectID', 1)
+        maxid = params.get('maxObjectID')
+        limit = min(params.get('limit', LIST_OBJECTS_LIMIT), LIST_OBJECTS_LIMIT)
+        all_versions = params.get('showAllVersions')
+        infos = []  # type: list
+        for wsid in params.get('ids', []):
+            if wsid not in self.workspaces:
+                raise RequestFailure(f"No workspace with id {wsid} exists")
+            objids = self._objids[wsid]
+            for objid in objids[bisect.bisect_left(objids, minid):]:
+                if (maxid is not None and objid > maxid) or len(infos) >= limit:
+                    break
+                versions = self.objects[wsid][objid]
+                chosen = reversed(versions) if all_versions else versions[-1:]
+                infos.extend(version['info'] for version in chosen)
+        return infos[:limit]
+
+    def _ws_get_objects2(self, params: dict) -> dict:
+        data = []
+        for spec in params.get('objects', []):
+            try:
+                version = self._resolve(spec['ref'])
+            except RequestFailure:
+                if params.get('ignoreErrors'):
+                    data.append(None)
+                    continue
+                raise
+            obj = {'info': version['info'], 'refs': version['refs'], 'provenance': [],
+                   'created': SAVE_DATE, 'extracted_ids': {}}
+            if not params.get('no_data'):
+                included = spec.get('included')
+                obj['data'] = (_include(version['data'], included) if included
+                               else version['data'])
+            data.append(obj)
+        return {'data': data}
+
+    def _ws_get_object_info3(self, params: dict) -> dict:
+        infos = []
+        for spec in params.get('objects', []):
+            try:
+                infos.append(self._resolve(spec['ref'])['info'])
+            except RequestFailure:
+                if not params.get('ignoreErrors'):
+                    raise
+                infos.append(None)
+        return {'infos': infos, 'paths': [[spec['ref']] for spec in params.get('objects', [])]}
+
+    def _ws_get_workspace_info(self, params: dict) -> list:
+        wsid = params.get('id')
+        if wsid not in self.workspaces:
+            raise RequestFailure(f"No workspace with id {wsid} exists")
+        return self.workspaces[wsid]
+
+    def _ws_list_workspace_info(self, params: dict) -> list:
+        return [self.workspaces[wsid] for wsid in sorted(self.workspaces)]
+
+    def _resolve(self, ref: str) -> dict:
+        """The object version at the end of a reference or reference path."""
+        parts = ref.split(';')[-1].split('/')
+        try:
+            (wsid, objid) = (int(parts[0]), int(parts[1]))
+            versions = self.objects[wsid][objid]
+            return versions[int(parts[2]) - 1] if len(parts) > 2 else versions[-1]
+        except (KeyError, IndexError, ValueError):
+            raise RequestFailure(f"No object with reference {ref} exists")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_mock = None  # type: MockKBase
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self._fault():
+            return
+        encoding = self.headers.get('Content-Encoding')
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'deflate':
+            body = zlib.decompress(body)
+        request = json.loads(body)
+        mock = self.server_mock
+        if self.path.rstrip('/').endswith('/handle_service'):
+            method = request['method'].split('.')[-1]
+            mock.calls.append(('handle', method))
+            with mock._lock:
+                handles = [{'hid': hid, 'id': mock.handles[hid]}
+                           for hid in request['params'][0] if hid in mock.handles]
+            return self._send_json(200, {'version': '1.1', 'result': [handles]})
+        method = request['method'].split('.')[-1]
+        params = request['params'][0] if request.get('params') else {}
+        mock.calls.append(('ws', method))
+        try:
+            result = mock.call_workspace(method, params)
+        except RequestFailure as err:
+            error = {'name': 'JSONRPCError', 'code': -32500, 'message': str(err), 'error': ''}
+            return self._send_json(mock.rpc_error_status, {'version': '1.1', 'error': error})
+        self._send_json(200, {'version': '1.1', 'id': request.get('id'), 'result': [result]})
+
+    def do_GET(self) -> None:
+        if self._fault():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        node_id = url.path.rstrip('/').split('/')[-1]
+        mock = self.server_mock
+        mock.calls.append(('shock', 'shock'))
+        with mock._lock:
+            node = mock.files.get(node_id)
+        if node is None:
+            # The client reads the status from the body
+            error = {'status': 404, 'data': None, 'error': ['Node not found']}
+            return self._send_json(200, error)
+        (name, contents) = node
+        if 'download_raw' not in query and 'download' not in query:
+            node_file = {'name': name, 'size': len(contents),
+                         'checksum': {'md5': hashlib.md5(contents).hexdigest()}}
+            return self._send_json(200, {'status': 200, 'data': {'id': node_id, 'file': node_file}})
+        seek = int(query.get('seek', ['0'])[0])
+        length = int(query.get('length', [str(len(contents))])[0])
+        body = contents[seek:seek + length]
+        if query.get('compression') == ['gzip']:
+            body = gzip.compress(body, compresslevel=1)
+        body = mock._corrupt(self.path, body)
+        self._send(200, body, 'application/octet-stream', throttle=True)
+
+    def _fault(self) -> bool:
+        """Fail the request if a fault applies to it."""
+        mock = self.server_mock
+        fault = mock._take_fault(self.path)
+        if mock.latency:
+            time.sleep(mock.latency)
+        if fault is None:
+            return False
+        if fault.status is None:
+            # Drop the connection without responding
+            self.close_connection = True
+            return True
+        headers = [('Retry-After', str(fault.retry_after))] if fault.retry_after else []
+        self._send(fault.status, b'Injected failure', 'text/plain', headers)
+        return True
+
+    def _send_json(self, status: int, data: Any) -> None:
+        self._send(status, json.dumps(data).encode(), 'application/json')
+
+    def _send(
+            self,
+            status: int,
+            body: bytes,
+            content_type: str,
+            headers: List[Tuple[str, str]] = None,
+            throttle: bool = False) -> None:
+        mock = self.server_mock
+        headers = list(headers or [])
+        if mock.gzip_responses and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            headers.append(('Content-Encoding', 'gzip'))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if not (throttle and mock.bandwidth):
+            self.wfile.write(body)
+            return
+        start = time.monotonic()
+        for offset in range(0, len(body), _WRITE_CHUNK):
+            self.wfile.write(body[offset:offset + _WRITE_CHUNK])
+            # Sleep until the bytes written so far fit in the bandwidth
+            ahead = (offset + _WRITE_CHUNK) / mock.bandwidth - (time.monotonic() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def _include(data: Any, paths: List[str]) -> Any:
+    """The parts of object data selected by workspace `included` paths (eg. '/features/*/id')."""
+    result = {}  # type: Any
+    for path in paths:
+        keys = [key for key in path.split('/') if key]
+        result = _merge(result, _select(data, keys))
+    return result
+
+
+def _select(data: Any, keys: List[str]) -> Any:
+    if not keys:
+        return data
+    (key, rest) = (keys[0], keys[1:])
+    if isinstance(data, list):
+        if key == '*':
+            return [_select(item, rest) for item in data]
+        return _MISSING
+    if not isinstance(data, dict):
+        return _MISSING
+    if key == '*':
+        selected = {name: _select(value, rest) for (name, value) in data.items()}
+        return {name: value for (name, value) in selected.items() if value is not _MISSING}
+    if key not in data:
+        return {}
+    value = _select(data[key], rest)
+    return {} if value is _MISSING else {key: value}
+
+
+def _merge(left: Any, right: Any) -> Any:
+    """Merge two selections of the same data."""
+    if isinstance(left, dict) and isinstance(right, dict):
+        merged = dict(left)
+        for (key, value) in right.items():
+            merged[key] = _merge(merged[key], value) if key in merged else value
+        return merged
+    if isinstance(left, list) and isinstance(right, list) and len(left) == len(right):
+        return [_merge(a, b) for (a, b) in zip(left, right)]
+    return right
+
+
+_MISSING = object()
+
+
+def main() -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth', type=float, default=None)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--workspaces', type=int, default=1)
+    parser.add_argument('--objects', type=int, default=1000)
+    args = parser.parse_args()
+    mock = MockKBase(latency=args.latency, bandwidth=args.bandwidth, error_rate=args.error_rate,
+                     host=args.host, port=args.port)
+    mock.populate(workspaces=args.workspaces, objects=args.objects)
+    mock.start()
+    print(f"Serving {mock.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from kbase_workspace_client import AsyncWorkspaceClient, WorkspaceResponseError
+
+if not os.environ.get('TEST_TOKEN'):
+    raise RuntimeError("TEST_TOKEN environment variable is required.")
+
+_URL = "https://ci.kbase.us/services/"
+
+
+def _run(coro_fn):
+    """Run a coroutine function with a fresh client in a new event loop."""
+    async def wrapper():
+        async with AsyncWorkspaceClient(url=_URL, token=os.environ['TEST_TOKEN']) as client:
+            return await coro_fn(client)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(wrapper())
+    finally:
+        loop.close()
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def test_req(self):
+        objs = _run(lambda client: client.req('get_objects2', {
+            'objects': [{'ref': '15/38/4'}],
+            'no_data': 1
+        }))
+        self.assertTrue(objs['data'])
+
+    def test_concurrent_reqs(self):
+        async def fetch(client):
+            return await asyncio.gather(*[
+                client.req('get_workspace_info', {'id': 15}) for _ in range(20)
+            ])
+        infos = _run(fetch)
+        self.assertEqual(len(infos), 20)
+        self.assertTrue(all(info[0] == 15 for info in infos))
+
+    def test_err(self):
+        with self.assertRaises(WorkspaceResponseError):
+            _run(lambda client: client.req('get_objects2', {
+                'objects': [{'ref': '0/0/0'}],
+                'no_data': 1
+            }))
+
+    def test_generate_obj_infos(self):
+        async def collect(client):
+            return [info async for info in client.generate_obj_infos(33192)]
+        infos = _run(collect)
+        self.assertTrue(len(infos) > 0)
+        for info in infos:
+            self.assertTrue(len(info) == 11)
+
+    def test_reads_download_valid(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            paths = _run(lambda client: client.download_reads_fastq('15/45/1', tmp_dir))
+            self.assertEqual(len(paths), 2)
+            self.assertEqual(os.path.getsize(paths[0]), 36056522)
+            self.assertEqual(os.path.getsize(paths[1]), 37522557)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_get_assembly_from_genome(self):
+        assembly_ref = _run(lambda client: client.get_assembly_from_genome('34819/14/1'))
+        self.assertEqual(assembly_ref, '34819/14/1;16/7/1')
+
+    def test_find_narrative_ok(self):
+        narr_info = _run(lambda client: client.find_narrative(34819, admin=True))
+        self.assertEqual(narr_info.type, "KBaseNarrative.Narrative-4.0")
+        self.assertEqual(narr_info.wsid, 34819)
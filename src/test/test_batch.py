@@ -0,0 +1,44 @@
+import unittest
+
+from kbase_workspace_client.batch import get_object_infos
+from kbase_workspace_client.exceptions import InvalidWSResponse, WorkspaceResponseError
+
+
+class _Response:
+    status_code = 500
+    text = 'Server error'
+
+    def json(self):
+        return {'error': {'message': 'Server error'}}
+
+
+class _Client:
+    """Answers get_object_info3 with one info too few for batches of more than one reference."""
+
+    def req(self, method, params):
+        refs = [obj['ref'] for obj in params['objects']]
+        infos = [[int(ref.split('/')[1])] + [None] * 10 for ref in refs]
+        return {'infos': infos[:-1] if len(refs) > 1 else infos}
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_short_response(self):
+        refs = ['1/1/1', '1/2/1', '1/3/1']
+        infos = get_object_infos(_Client(), refs, chunk_size=2, workers=2)
+        # The short batch fails for each of its references, rather than shifting results
+        self.assertTrue(all(isinstance(info, InvalidWSResponse) for info in infos[:2]))
+        self.assertEqual(infos[2].objid, 3)
+        # Every reference gets its own exception
+        self.assertIsNot(infos[0], infos[1])
+        self.assertEqual(str(infos[0]), str(infos[1]))
+
+    def test_failed_batch(self):
+        class Failing:
+            def req(self, method, params):
+                raise WorkspaceResponseError(_Response())
+        infos = get_object_infos(Failing(), ['1/1/1', '1/2/1', '1/3/1'])
+        self.assertEqual(len({id(info) for info in infos}), 3)
+        for info in infos:
+            self.assertIsInstance(info, WorkspaceResponseError)
+            self.assertEqual(info.status_code, 500)
@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+import unittest
+
+from kbase_workspace_client.cache import ObjectCache, credential_scope, is_immutable_ref
+
+
+def _obj(chsum='abc', size=10):
+    info = [1, 'name', 'Module.Type-1.0', 'date', 1, 'user', 2, 'ws', chsum, size, {}]
+    return {'info': info, 'data': {'seq': 'A' * size}}
+
+
+class TestObjectCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_immutable_refs(self):
+        self.assertTrue(is_immutable_ref('1/2/3'))
+        self.assertTrue(is_immutable_ref('1/2/3;4/5/6'))
+        self.assertFalse(is_immutable_ref('1/2'))
+        self.assertFalse(is_immutable_ref('ws_name/obj/3'))
+        self.assertFalse(is_immutable_ref('1/2/3;4/5'))
+
+    def test_memory_hit_returns_copy(self):
+        cache = ObjectCache()
+        cache.put('1/2/3', _obj())
+        first = cache.get('1/2/3')
+        first['data']['seq'] = 'changed'
+        self.assertEqual(cache.get('1/2/3'), _obj())
+        self.assertEqual(cache.stats().memory_hits, 2)
+
+    def test_bypass_unversioned(self):
+        cache = ObjectCache()
+        cache.put('1/2', _obj())
+        self.assertIsNone(cache.get('1/2'))
+        self.assertEqual(cache.stats().bypassed, 1)
+        self.assertEqual(cache.stats().misses, 0)
+
+    def test_included_is_part_of_key(self):
+        cache = ObjectCache()
+        cache.put('1/2/3', _obj(), included=['/a', '/b'])
+        self.assertIsNone(cache.get('1/2/3'))
+        self.assertEqual(cache.get('1/2/3', included=['/b', '/a']), _obj())
+
+    def test_chsum_mismatch(self):
+        cache = ObjectCache(directory=self.tmp_dir)
+        cache.put('1/2/3', _obj(chsum='abc'))
+        self.assertEqual(cache.get('1/2/3', chsum='abc'), _obj(chsum='abc'))
+        self.assertIsNone(cache.get('1/2/3', chsum='xyz'))
+        # The bad entry was dropped from both tiers
+        self.assertIsNone(cache.get('1/2/3'))
+        self.assertEqual(cache.stats().misses, 2)
+
+    def test_scopes(self):
+        cache = ObjectCache(directory=self.tmp_dir)
+        alice = credential_scope('url', 'alice_token')
+        cache.put('1/2/3', _obj(), scope=alice)
+        self.assertEqual(cache.get('1/2/3', scope=alice), _obj())
+        # Another user, the same user as admin, or another process with a different token
+        self.assertIsNone(cache.get('1/2/3', scope=credential_scope('url', 'bob_token')))
+        self.assertIsNone(cache.get('1/2/3', scope=credential_scope('url', 'alice_token', True)))
+        reader = ObjectCache(directory=self.tmp_dir)
+        self.assertIsNone(reader.get('1/2/3'))
+        self.assertEqual(reader.get('1/2/3', scope=alice), _obj())
+        # Tokens never reach the disk
+        for (path, _, _) in cache._disk_entries():
+            with open(path) as fd:
+                self.assertNotIn('alice_token', fd.read())
+
+    def test_disk_overwrite(self):
+        cache = ObjectCache(directory=self.tmp_dir)
+        for _ in range(3):
+            cache.put('1/2/3', _obj(size=100))
+        total = sum(size for (_, size, _) in cache._disk_entries())
+        self.assertEqual(cache._disk_bytes, total)
+
+    def test_memory_eviction(self):
+        cache = ObjectCache(max_memory_bytes=500)
+        for objid in range(10):
+            cache.put(f'1/{objid}/1', _obj(size=100))
+        self.assertIsNone(cache.get('1/0/1'))
+        self.assertEqual(cache.get('1/9/1'), _obj(size=100))
+        self.assertTrue(cache.stats().evictions > 0)
+
+    def test_disk_shared_between_caches(self):
+        writer = ObjectCache(directory=self.tmp_dir)
+        writer.put('1/2/3', _obj())
+        reader = ObjectCache(directory=self.tmp_dir)
+        self.assertEqual(reader.get('1/2/3'), _obj())
+        self.assertEqual(reader.get('1/2/3'), _obj())
+        self.assertEqual(reader.stats().disk_hits, 1)
+        self.assertEqual(reader.stats().memory_hits, 1)
+
+    def test_disk_eviction(self):
+        cache = ObjectCache(max_memory_bytes=0, directory=self.tmp_dir, max_disk_bytes=2000)
+        for objid in range(20):
+            cache.put(f'1/{objid}/1', _obj(size=200))
+        total = sum(size for (_, size, _) in cache._disk_entries())
+        self.assertLessEqual(total, 2000)
+        self.assertEqual(cache.get('1/19/1'), _obj(size=200))
+
+    def test_clear(self):
+        cache = ObjectCache(directory=self.tmp_dir)
+        cache.put('1/2/3', _obj())
+        cache.clear()
+        self.assertIsNone(cache.get('1/2/3'))
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import unittest
+
+from kbase_workspace_client import WorkspaceClient
+from kbase_workspace_client.coalesce import SingleFlight, is_read_only, rpc_key
+from test.mock_server import MockKBase
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def _run_concurrently(self, flights, key, operation, release, callers=4):
+        """
+        Call `flights.do` from several threads, all joining while the first is in flight, then
+        let the first finish by setting `release`.
+        """
+        with ThreadPoolExecutor(callers) as executor:
+            futures = [executor.submit(flights.do, key, operation)]
+            while flights.in_flight() == 0:
+                time.sleep(0.001)
+            futures += [executor.submit(flights.do, key, operation) for _ in range(callers - 1)]
+            while flights.coalesced < callers - 1:
+                time.sleep(0.001)
+            release.set()
+        return futures
+
+    def test_shares_result(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def operation():
+            calls.append(1)
+            release.wait()
+            return {'result': len(calls)}
+        futures = self._run_concurrently(flights, 'key', operation, release)
+        results = [future.result() for future in futures]
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flights.in_flight(), 0)
+        # Nothing is remembered once the call finishes
+        self.assertEqual(flights.do('key', operation), {'result': 2})
+
+    def test_shares_error(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def operation():
+            release.wait()
+            raise ValueError('failed')
+        futures = self._run_concurrently(flights, 'key', operation, release, callers=3)
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result()
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_distinct_keys(self):
+        flights = SingleFlight()
+        self.assertEqual(flights.do('a', lambda: 1), 1)
+        self.assertEqual(flights.do('b', lambda: 2), 2)
+        self.assertEqual(flights.coalesced, 0)
+
+
+class TestAllowlist(unittest.TestCase):
+
+    def test_read_only(self):
+        self.assertTrue(is_read_only('get_objects2', False))
+        self.assertTrue(is_read_only('getObjects', True))
+        self.assertFalse(is_read_only('save_objects', False))
+        self.assertFalse(is_read_only('deleteWorkspace', True))
+        # Admin commands are checked against the admin allowlist only
+        self.assertFalse(is_read_only('get_objects2', True))
+
+    def test_key(self):
+        key = rpc_key('url', 'get_objects2', False, {'objects': [{'ref': '1/2'}], 'no_data': 1})
+        same = rpc_key('url', 'get_objects2', False, {'no_data': 1, 'objects': [{'ref': '1/2'}]})
+        self.assertEqual(key, same)
+        self.assertNotEqual(key, rpc_key('url', 'get_objects2', True, {'objects': []}))
+
+
+class TestClientCoalescing(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockKBase(latency=0.2).start()
+        cls.server.populate(objects=3)
+        node_id = cls.server.add_shock_file(b'contents')
+        cls.hid = cls.server.add_handle(node_id)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_calls()
+
+    def _concurrently(self, func, callers=8):
+        with ThreadPoolExecutor(callers) as executor:
+            return list(executor.map(lambda _: func(), range(callers)))
+
+    def test_req(self):
+        with WorkspaceClient(self.server.url) as client:
+            infos = self._concurrently(lambda: client.req('get_workspace_info', {'id': 1}))
+            admin_infos = self._concurrently(
+                lambda: client.admin_req('getWorkspaceInfo', {'id': 1}))
+        self.assertEqual(infos, admin_infos)
+        self.assertEqual(self.server.calls_to('get_workspace_info'), 1)
+        self.assertEqual(self.server.calls_to('administer'), 1)
+
+    def test_separate_results(self):
+        with WorkspaceClient(self.server.url) as client:
+            infos = self._concurrently(lambda: client.req('get_workspace_info', {'id': 1}))
+        self.assertEqual(self.server.calls_to('get_workspace_info'), 1)
+        # Changing one caller's result leaves the others as they were
+        expected = list(infos[1])
+        infos[0].append('changed')
+        infos[0][0] = None
+        for info in infos[1:]:
+            self.assertEqual(info, expected)
+
+    def test_handle_to_shock(self):
+        with WorkspaceClient(self.server.url) as client:
+            shock_ids = self._concurrently(lambda: client.handle_to_shock(self.hid))
+        self.assertEqual(len(set(shock_ids)), 1)
+        self.assertEqual(self.server.calls_to('hids_to_handles'), 1)
+
+    def test_disabled(self):
+        with WorkspaceClient(self.server.url, coalesce=False) as client:
+            self._concurrently(lambda: client.req('get_workspace_info', {'id': 1}), callers=4)
+        self.assertEqual(self.server.calls_to('get_workspace_info'), 4)
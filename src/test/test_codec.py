@@ -0,0 +1,54 @@
+import unittest
+
+from kbase_workspace_client.codec import StdlibCodec, OrjsonCodec, default_codec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_PAYLOAD = {
+    'version': '1.1',
+    'result': [[[1, 'name', 'KBaseGenomes.Genome-17.0', '2020-01-01T00:00:00+0000', 1, 'user',
+                 2, 'ws', 'chsum', 10, {'Name': 'é'}]]],
+}
+
+
+class TestStdlibCodec(unittest.TestCase):
+
+    def test_round_trip(self):
+        codec = StdlibCodec()
+        encoded = codec.dumps(_PAYLOAD)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(codec.loads(encoded), _PAYLOAD)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            StdlibCodec().loads(b'{"result":')
+
+
+@unittest.skipUnless(orjson, 'orjson is not installed')
+class TestOrjsonCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = OrjsonCodec()
+        self.stdlib = StdlibCodec()
+
+    def test_default(self):
+        self.assertIsInstance(default_codec(), OrjsonCodec)
+
+    def test_round_trip(self):
+        self.assertEqual(self.codec.loads(self.codec.dumps(_PAYLOAD)), _PAYLOAD)
+        self.assertEqual(self.codec.loads(self.stdlib.dumps(_PAYLOAD)), _PAYLOAD)
+
+    def test_non_str_keys(self):
+        self.assertEqual(self.codec.loads(self.codec.dumps({1: 'a'})), {'1': 'a'})
+
+    def test_big_integers(self):
+        big = {'size': 2 ** 70}
+        self.assertEqual(self.codec.dumps(big), self.stdlib.dumps(big))
+        self.assertEqual(self.codec.loads(b'{"size": 1180591620717411303424}'), big)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.codec.loads(b'{"result":')
@@ -0,0 +1,90 @@
+import gzip
+import io
+import unittest
+import zlib
+
+from kbase_workspace_client.codec import StdlibCodec
+from kbase_workspace_client.compression import GzipWriter, compress_body, is_gzip_name
+from kbase_workspace_client.session import Transport
+from kbase_workspace_client.shock import download_url
+
+_DATA = b'@read\nACGTACGT\n+\nIIIIIIII\n' * 1000
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_compress_body(self):
+        self.assertEqual(gzip.decompress(compress_body(_DATA, 'gzip')), _DATA)
+        self.assertEqual(zlib.decompress(compress_body(_DATA, 'deflate')), _DATA)
+
+    def test_gzip_writer_compresses(self):
+        out = io.BytesIO()
+        writer = GzipWriter(out.write)
+        for idx in range(0, len(_DATA), 1000):
+            writer.write(_DATA[idx:idx + 1000])
+        writer.close()
+        self.assertLess(len(out.getvalue()), len(_DATA))
+        self.assertEqual(gzip.decompress(out.getvalue()), _DATA)
+
+    def test_gzip_writer_keeps_gzip(self):
+        compressed = gzip.compress(_DATA)
+        out = io.BytesIO()
+        writer = GzipWriter(out.write)
+        writer.write(compressed[:10])
+        writer.write(compressed[10:])
+        writer.close()
+        self.assertEqual(out.getvalue(), compressed)
+
+    def test_gzip_writer_short_blocks(self):
+        # The magic bytes are checked across blocks
+        compressed = gzip.compress(_DATA)
+        out = io.BytesIO()
+        writer = GzipWriter(out.write)
+        for block in (compressed[:1], b'', compressed[1:2], compressed[2:]):
+            writer.write(block)
+        writer.close()
+        self.assertEqual(out.getvalue(), compressed)
+        # A stream shorter than the magic bytes is compressed
+        out = io.BytesIO()
+        writer = GzipWriter(out.write)
+        writer.write(b'\x1f')
+        writer.close()
+        self.assertEqual(gzip.decompress(out.getvalue()), b'\x1f')
+
+    def test_gzip_writer_empty(self):
+        out = io.BytesIO()
+        GzipWriter(out.write).close()
+        self.assertEqual(gzip.decompress(out.getvalue()), b'')
+
+    def test_is_gzip_name(self):
+        self.assertTrue(is_gzip_name('reads.fastq.gz'))
+        self.assertTrue(is_gzip_name('READS.FQ.GZ'))
+        self.assertFalse(is_gzip_name('reads.fastq'))
+        self.assertFalse(is_gzip_name(None))
+
+    def test_download_url(self):
+        url = 'http://x/node/1'
+        gz_node = {'data': {'file': {'name': 'reads.fastq.gz'}}}
+        self.assertEqual(download_url(url, {}), url + '?download_raw')
+        self.assertEqual(download_url(url, {}, compress=True), url + '?download&compression=gzip')
+        self.assertEqual(download_url(url, gz_node, compress=True), url + '?download_raw')
+
+
+class TestTransportEncode(unittest.TestCase):
+
+    def test_uncompressed_by_default(self):
+        transport = Transport(None, codec=StdlibCodec())
+        self.assertEqual(transport.encode({'a': 1}), (b'{"a": 1}', {}))
+
+    def test_compresses_large_bodies(self):
+        transport = Transport(
+            None, codec=StdlibCodec(), compress_requests='gzip', compress_min_size=100)
+        payload = {'objects': [{'ref': f'1/{idx}/1'} for idx in range(100)]}
+        (data, headers) = transport.encode(payload)
+        self.assertEqual(headers, {'Content-Encoding': 'gzip'})
+        self.assertEqual(gzip.decompress(data), StdlibCodec().dumps(payload))
+        self.assertEqual(transport.encode({'a': 1}), (b'{"a": 1}', {}))
+
+    def test_invalid_encoding(self):
+        with self.assertRaises(ValueError):
+            Transport(None, compress_requests='br')
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from kbase_workspace_client.contigset_to_fasta import (
+    contigset_to_fasta,
+    fasta_record,
+    write_fasta,
+)
+
+try:
+    import Bio  # noqa: F401
+    _HAS_BIOPYTHON = True
+except ImportError:
+    _HAS_BIOPYTHON = False
+
+_CONTIGS = [
+    {'id': 'c1', 'sequence': 'ACGT' * 40, 'description': 'first contig'},
+    {'id': 'c2', 'sequence': 'A' * 60},
+    {'id': 'c3', 'sequence': '', 'description': ''},
+    {'id': 'c4', 'sequence': 'G' * 61, 'description': 'c4 already has the id'},
+    {'id': 'c5', 'sequence': 'T', 'description': 'multi\nline   description'},
+]
+
+
+class TestContigsetToFasta(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_fasta_record(self):
+        self.assertEqual(fasta_record({'id': 'x', 'sequence': 'ACGTA'}, 2), '>x\nAC\nGT\nA\n')
+        self.assertEqual(fasta_record({'id': 'x', 'sequence': ''}), '>x\n')
+        record = fasta_record({'id': 'x', 'sequence': 'A', 'description': 'x y'})
+        self.assertEqual(record, '>x y\nA\n')
+
+    def test_write_fasta_from_generator(self):
+        path = self._path('out.fasta')
+        count = write_fasta((contig for contig in _CONTIGS), path)
+        self.assertEqual(count, len(_CONTIGS))
+        with open(path) as fd:
+            lines = fd.read().splitlines()
+        self.assertEqual(lines[0], '>c1 first contig')
+        self.assertTrue(all(len(line) <= 60 for line in lines))
+        self.assertIn('>c5 multi line   description', lines)
+
+    def test_failure_removes_partial_file(self):
+        path = self._path('partial.fasta')
+
+        def contigs():
+            yield _CONTIGS[0]
+            raise IOError('connection lost')
+        with self.assertRaises(IOError):
+            write_fasta(contigs(), path)
+        self.assertFalse(os.path.exists(path))
+
+    @unittest.skipUnless(_HAS_BIOPYTHON, 'biopython is not installed')
+    def test_matches_biopython(self):
+        ws_obj = {'data': {'contigs': _CONTIGS}}
+        native_path = self._path('native.fasta')
+        bio_path = self._path('bio.fasta')
+        contigset_to_fasta(ws_obj, native_path)
+        contigset_to_fasta(ws_obj, bio_path, biopython=True)
+        with open(native_path) as native, open(bio_path) as bio:
+            self.assertEqual(native.read(), bio.read())
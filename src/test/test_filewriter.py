@@ -0,0 +1,192 @@
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from kbase_workspace_client import WorkspaceClient
+from kbase_workspace_client.filewriter import allocate, copy_response, FileWriter
+from test.mock_server import MockKBase
+
+
+class _Response:
+    """A streamed response with an identity-encoded or gzipped body."""
+
+    def __init__(self, body, encoding=None):
+        self.raw = io.BytesIO(body)
+        self.headers = {'Content-Encoding': encoding} if encoding else {}
+        self.reads = 0
+
+    def iter_content(self, chunk_size):
+        while True:
+            self.reads += 1
+            block = self.raw.read(chunk_size)
+            if not block:
+                return
+            yield block
+
+
+class TestFileWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'file')
+        self.contents = os.urandom(100000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _read(self):
+        with open(self.path, 'rb') as fd:
+            return fd.read()
+
+    def test_write(self):
+        with FileWriter(self.path, buffer_size=4096, fsync=True) as writer:
+            for start in range(0, len(self.contents), 1000):
+                writer.write(self.contents[start:start + 1000])
+        self.assertEqual(writer.written, len(self.contents))
+        self.assertEqual(self._read(), self.contents)
+
+    def test_preallocate(self):
+        # A short write doesn't leave the rest of the preallocated size behind
+        with FileWriter(self.path, size=len(self.contents)) as writer:
+            writer.write(self.contents[:10])
+        self.assertEqual(self._read(), self.contents[:10])
+
+    def test_regions(self):
+        allocate(self.path, len(self.contents), reserve=True)
+        self.assertEqual(os.path.getsize(self.path), len(self.contents))
+        buffer = bytearray(4096)
+        # Write the second half first, reusing one buffer
+        for start in (50000, 0):
+            with FileWriter(self.path, offset=start, truncate=False, buffer=buffer) as writer:
+                writer.write(self.contents[start:start + 50000])
+        self.assertEqual(self._read(), self.contents)
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            with FileWriter(self.path) as writer:
+                writer.write(b'unfinished')
+                raise ValueError()
+        self.assertEqual(self._read(), b'')
+
+    def test_copy_response(self):
+        blocks = []
+        resp = _Response(self.contents)
+        with FileWriter(self.path, buffer_size=65536) as writer:
+            copy_response(resp, writer, 16384, lambda block: blocks.append(bytes(block)))
+        self.assertEqual(self._read(), self.contents)
+        self.assertEqual(b''.join(blocks), self.contents)
+        # Read straight into the buffer rather than through iter_content
+        self.assertEqual(resp.reads, 0)
+        self.assertEqual(max(map(len, blocks)), 16384)
+        # Encoded responses are decoded by iter_content
+        resp = _Response(self.contents, encoding='gzip')
+        with FileWriter(self.path) as writer:
+            copy_response(resp, writer, 16384)
+        self.assertGreater(resp.reads, 0)
+        self.assertEqual(self._read(), self.contents)
+
+    def test_cut_off(self):
+        import requests
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+
+        def respond():
+            (conn, _) = server.accept()
+            conn.recv(65536)
+            conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n' + b'x' * 40)
+            conn.close()
+        thread = threading.Thread(target=respond)
+        thread.start()
+        url = 'http://%s:%d/' % server.getsockname()
+        with requests.get(url, stream=True, headers={'Accept-Encoding': 'identity'}) as resp:
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                with FileWriter(self.path) as writer:
+                    copy_response(resp, writer, 16384)
+        thread.join()
+        server.close()
+
+
+class TestDownloadWrites(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockKBase(gzip_responses=True).start()
+        cls.server.populate(objects=20)
+        cls.contents = os.urandom(300 * 1024)
+        cls.node_id = cls.server.add_shock_file(cls.contents)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = WorkspaceClient(self.server.url)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_shock_download(self):
+        for connections in (1, 3):
+            path = os.path.join(self.tmp_dir, str(connections))
+            self.client.download_shock_file(
+                self.node_id, path, connections=connections, range_size=64 * 1024,
+                chunk_size=4096, preallocate=True, fsync=True)
+            with open(path, 'rb') as fd:
+                self.assertEqual(fd.read(), self.contents)
+
+    def test_partly_read(self):
+        # A body urllib3 has started reading is finished through urllib3, not the socket
+        import requests
+        url = f"{self.server.url}/shock-api/node/{self.node_id}?download_raw"
+        path = os.path.join(self.tmp_dir, 'rest')
+        with requests.get(url, stream=True, headers={'Accept-Encoding': 'identity'}) as resp:
+            head = resp.raw.read(1000)
+            with FileWriter(path) as writer:
+                received = copy_response(resp, writer, 4096)
+        self.assertEqual(received, len(self.contents))
+        with open(path, 'rb') as fd:
+            self.assertEqual(head + fd.read(), self.contents)
+
+    def test_keep_alive(self):
+        # Bodies read into the buffer still leave their connection in the pool
+        from urllib3.connection import HTTPConnection
+        connect = HTTPConnection.connect
+        connects = []
+
+        def counting_connect(conn):
+            connects.append(1)
+            return connect(conn)
+        # Uncompressed responses, so every download is read into the buffer
+        server = MockKBase().start()
+        server.populate(objects=20)
+        node_id = server.add_shock_file(self.contents)
+        client = WorkspaceClient(server.url)
+        HTTPConnection.connect = counting_connect
+        try:
+            for idx in range(5):
+                client.req('get_workspace_info', {'id': 1})
+                path = os.path.join(self.tmp_dir, str(idx))
+                client.download_shock_file(node_id, path + '.shock')
+                client.download_shock_file(
+                    node_id, path + '.ranges', range_size=64 * 1024, resume=True)
+                client.req_download('list_objects', {'ids': [1]}, path + '.json')
+        finally:
+            HTTPConnection.connect = connect
+            client.close()
+            server.stop()
+        self.assertEqual(len(connects), 1)
+
+    def test_req_download(self):
+        # The response is gzipped, so it is decoded as it is written
+        path = os.path.join(self.tmp_dir, 'objects.json')
+        self.client.req_download('list_objects', {'ids': [1]}, path)
+        with open(path) as fd:
+            self.assertEqual(len(json.load(fd)['result'][0]), 20)
@@ -0,0 +1,65 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import unittest
+
+# Directory containing the kbase_workspace_client package
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Dependencies that must only be imported once a feature needs them
+_DEFERRED = ['requests', 'urllib3', 'Bio', 'aiohttp', 'ijson', 'asyncio']
+# Submodules that must only be imported once one of their names is used
+_LAZY_SUBMODULES = ['async_client', 'export', 'index', 'scan', 'seqstats', 'table', 'traverse']
+# Max time for a fresh interpreter to import the package, as a multiple of the time it takes to
+# start and do nothing (measured at about 2x). Generous, so that only a heavy new import fails it.
+_IMPORT_RATIO = 4
+# Interpreter runs to take the median of
+_RUNS = 5
+
+_SCRIPT = """
+import json, sys
+import kbase_workspace_client
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def _run(script):
+    """Run a script in a fresh interpreter, returning its output and wall-clock time."""
+    env = dict(os.environ, PYTHONPATH=_SRC_DIR)
+    start = time.perf_counter()
+    out = subprocess.check_output([sys.executable, '-c', script], env=env)
+    return (out, time.perf_counter() - start)
+
+
+def _median_time(script):
+    return statistics.median(_run(script)[1] for _ in range(_RUNS))
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_heavy_dependencies_deferred(self):
+        modules = json.loads(_run(_SCRIPT)[0].decode())
+        loaded = [name for name in _DEFERRED if name in modules]
+        self.assertEqual(loaded, [])
+        if sys.version_info >= (3, 7):
+            loaded = [name for name in _LAZY_SUBMODULES
+                      if 'kbase_workspace_client.' + name in modules]
+            self.assertEqual(loaded, [])
+
+    def test_import_budget(self):
+        baseline = _median_time('pass')
+        elapsed = _median_time('import kbase_workspace_client')
+        self.assertLess(elapsed, baseline * _IMPORT_RATIO,
+                        f"Import took {elapsed:.3f}s, against {baseline:.3f}s to start python")
+
+    def test_lazy_names(self):
+        import kbase_workspace_client
+        from kbase_workspace_client.table import ObjInfoTable
+        self.assertIs(kbase_workspace_client.ObjInfoTable, ObjInfoTable)
+        self.assertIn('ObjInfoTable', dir(kbase_workspace_client))
+        for name in kbase_workspace_client.__all__:
+            self.assertTrue(hasattr(kbase_workspace_client, name), name)
+        with self.assertRaises(AttributeError):
+            kbase_workspace_client.Missing
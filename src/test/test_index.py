@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+
+from kbase_workspace_client.index import ObjInfoIndex
+from kbase_workspace_client.main import ObjInfo
+from kbase_workspace_client.scan import ScanFailure
+
+_NARRATIVE = 'KBaseNarrative.Narrative-4.0'
+_GENOME = 'KBaseGenomes.Genome-17.0'
+
+
+class _Scan(list):
+    """Stands in for a WorkspaceScan: a list of infos plus failures."""
+
+    def __init__(self, infos, failures):
+        super().__init__(infos)
+        self.failures = failures
+
+
+class _FakeClient:
+    """Serves workspace infos and object infos from dicts, and records the workspaces scanned."""
+
+    def __init__(self):
+        self.workspaces = {}
+        self.objects = {}
+        self.broken = set()
+        self.scanned = []
+
+    def add_workspace(self, wsid, moddate, objects):
+        self.workspaces[wsid] = [wsid, f'ws{wsid}', 'owner', moddate, len(objects), 'a', 'n',
+                                 'unlocked', {}]
+        self.objects[wsid] = [
+            ObjInfo(objid, f'obj{objid}', obj_type, f'2020-01-0{objid}T00:00:00+0000', 1,
+                    saved_by, wsid, f'ws{wsid}', 'chsum', 10, {'key': 'value'})
+            for (objid, (obj_type, saved_by)) in enumerate(objects, 1)
+        ]
+
+    def req(self, method, params):
+        if method == 'list_workspace_info':
+            return list(self.workspaces.values())
+        if method == 'get_workspace_info':
+            return self.workspaces[params['id']]
+        raise ValueError(method)
+
+    def scan_workspaces(self, wsids, workers=8, admin=False, latest=True):
+        wsids = list(wsids)
+        self.scanned.extend(wsids)
+        infos = [info for wsid in wsids if wsid not in self.broken for info in self.objects[wsid]]
+        failures = [ScanFailure(wsid, RuntimeError('down')) for wsid in wsids
+                    if wsid in self.broken]
+        return _Scan(infos, failures)
+
+
+class TestObjInfoIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.client = _FakeClient()
+        self.client.add_workspace(1, '2020-01-01', [(_NARRATIVE, 'alice'), (_GENOME, 'alice')])
+        self.client.add_workspace(2, '2020-01-01', [(_GENOME, 'bob'), (_GENOME, 'alice')])
+        self.index = ObjInfoIndex()
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_sync_and_query(self):
+        result = self.index.sync(self.client)
+        self.assertEqual(result[:3], (2, 2, 0))
+        self.assertEqual(self.index.count(), 4)
+        narratives = self.index.objects(type=_NARRATIVE)
+        self.assertEqual(narratives, [self.client.objects[1][0]])
+        self.assertEqual(self.index.count(type='KBaseGenomes.Genome'), 3)
+        self.assertEqual(self.index.count(type='KBaseGenomes.Genom'), 0)
+        self.assertEqual(self.index.count(saved_by='alice'), 3)
+        self.assertEqual(self.index.count(wsid=2, saved_by='alice'), 1)
+        self.assertEqual(self.index.count(saved_after='2020-01-02'), 2)
+        self.assertEqual(self.index.count(saved_before='2020-01-02'), 2)
+        self.assertEqual([info.id for info in self.index.workspaces()], [1, 2])
+
+    def test_incremental_sync(self):
+        self.index.sync(self.client)
+        self.client.scanned = []
+        # Nothing changed
+        self.assertEqual(self.index.sync(self.client)[:3], (2, 0, 0))
+        self.assertEqual(self.client.scanned, [])
+        # One workspace changed, one was deleted
+        self.client.add_workspace(1, '2020-02-01', [(_NARRATIVE, 'carol')])
+        del self.client.workspaces[2]
+        self.assertEqual(self.index.sync(self.client)[:3], (1, 1, 1))
+        self.assertEqual(self.client.scanned, [1])
+        self.assertEqual(self.index.objects(), self.client.objects[1])
+
+    def test_failed_workspace_keeps_contents(self):
+        self.index.sync(self.client)
+        self.client.add_workspace(1, '2020-02-01', [])
+        self.client.broken.add(1)
+        result = self.index.sync(self.client)
+        self.assertEqual(result.updated, 0)
+        self.assertEqual([failure.wsid for failure in result.failures], [1])
+        self.assertEqual(self.index.count(wsid=1), 2)
+        # Retried on the next sync
+        self.client.broken.clear()
+        self.assertEqual(self.index.sync(self.client).updated, 1)
+        self.assertEqual(self.index.count(wsid=1), 0)
+
+    def test_sync_given_workspaces(self):
+        result = self.index.sync(self.client, wsids=[2, 99])
+        self.assertEqual(result[:3], (1, 1, 0))
+        self.assertEqual([failure.wsid for failure in result.failures], [99])
+        self.assertEqual(self.index.count(), 2)
+
+    def test_persists_to_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'index.db')
+            with ObjInfoIndex(path) as index:
+                index.sync(self.client)
+            with ObjInfoIndex(path) as index:
+                self.assertEqual(index.count(), 4)
+                self.assertEqual(index.sync(self.client).updated, 0)
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from kbase_workspace_client import WorkspaceClient
+from kbase_workspace_client.exceptions import IntegrityError
+from kbase_workspace_client.integrity import Digest, VERIFY_ATTEMPTS
+from kbase_workspace_client.main import _check_length
+from kbase_workspace_client.shock import STATE_SUFFIX
+from test.mock_server import MockKBase
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class TestDigests(unittest.TestCase):
+
+    def test_digest(self):
+        digest = Digest()
+        for block in (b'abc', b'def'):
+            digest.update(block)
+        digest.check('path', 6, hashlib.md5(b'abcdef').hexdigest().upper())
+        with self.assertRaises(IntegrityError) as ctx:
+            digest.check('path', 7)
+        self.assertEqual((ctx.exception.check, ctx.exception.actual), ('size', 6))
+        with self.assertRaises(IntegrityError) as ctx:
+            digest.check('path', md5=hashlib.md5(b'abc').hexdigest())
+        self.assertEqual(ctx.exception.check, 'md5')
+        # Without hashing, only the size is checked
+        Digest(md5=False).check('path', md5='ignored')
+
+    def test_check_length(self):
+        class Response:
+            headers = {'Content-Length': '12'}
+        with self.assertRaises(IntegrityError):
+            _check_length(Response(), 'path', 10)
+        _check_length(Response(), 'path', 12)
+        Response.headers = {}
+        _check_length(Response(), 'path', 10)
+
+
+class TestVerifiedDownloads(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockKBase().start()
+        cls.contents = os.urandom(300 * 1024)
+        cls.node_id = cls.server.add_shock_file(cls.contents, name='reads.fastq')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_calls()
+        self.client = WorkspaceClient(self.server.url)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'reads.fastq')
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _assert_downloaded(self, shock_calls):
+        with open(self.path, 'rb') as fd:
+            self.assertEqual(fd.read(), self.contents)
+        # Including the node metadata request
+        self.assertEqual(self.server.calls_to('shock'), shock_calls)
+
+    def test_stream_retry(self):
+        self.server.corrupt()
+        self.client.download_shock_file(self.node_id, self.path)
+        self._assert_downloaded(1 + 2)
+
+    def test_stream_mismatch(self):
+        for (truncate, check) in ((False, 'md5'), (True, 'size')):
+            self.server.corrupt(count=VERIFY_ATTEMPTS, truncate=truncate)
+            with self.assertRaises(IntegrityError) as ctx:
+                self.client.download_shock_file(self.node_id, self.path)
+            self.assertEqual(ctx.exception.check, check)
+            os.remove(self.path)
+
+    def test_unverified(self):
+        self.server.corrupt()
+        self.client.download_shock_file(self.node_id, self.path, verify=False)
+        with open(self.path, 'rb') as fd:
+            self.assertNotEqual(fd.read(), self.contents)
+
+    def test_range_retry(self):
+        # Only the short range is fetched again
+        self.server.corrupt(match='seek=65536&', truncate=True)
+        self.client.download_shock_file(
+            self.node_id, self.path, connections=2, range_size=64 * 1024)
+        self._assert_downloaded(1 + 5 + 1)
+
+    def test_ranged_checksum(self):
+        # Over one connection the ranges arrive in order, so a corrupt range restarts the file
+        self.server.corrupt(match='seek=65536&')
+        self.client.download_shock_file(
+            self.node_id, self.path, range_size=64 * 1024, resume=True)
+        self._assert_downloaded(1 + 5 + 5)
+        self.assertFalse(os.path.exists(self.path + STATE_SUFFIX))
+        self.server.reset_calls()
+        os.remove(self.path)
+        self.server.corrupt(count=VERIFY_ATTEMPTS, match='seek=0&')
+        with self.assertRaises(IntegrityError) as ctx:
+            self.client.download_shock_file(
+                self.node_id, self.path, range_size=64 * 1024, resume=True)
+        self.assertEqual(ctx.exception.check, 'md5')
+
+    def test_ranged_sizes_only(self):
+        # Ranges are only checked for their size; the checksum needs them in order
+        self.server.corrupt(match='seek=0&')
+        with self.assertLogs('kbase_workspace_client.shock', 'WARNING') as logs:
+            self.client.download_shock_file(
+                self.node_id, self.path, connections=2, range_size=64 * 1024)
+        self.assertIn('out of order', logs.output[0])
+        with open(self.path, 'rb') as fd:
+            self.assertNotEqual(fd.read(), self.contents)
+        self.assertEqual(self.server.calls_to('shock'), 1 + 5)
+        self.assertFalse(os.path.exists(self.path + STATE_SUFFIX))
+
+    def test_resumed(self):
+        # Fail a range, then resume without fetching the finished ranges again
+        self.server.fail(404, match='seek=131072&')
+        with self.assertRaises(RuntimeError):
+            self.client.download_shock_file(
+                self.node_id, self.path, range_size=64 * 1024, resume=True)
+        self.server.reset_calls()
+        with self.assertLogs('kbase_workspace_client.shock', 'WARNING') as logs:
+            self.client.download_shock_file(
+                self.node_id, self.path, range_size=64 * 1024, resume=True)
+        self.assertIn('earlier attempt', logs.output[0])
+        with open(self.path, 'rb') as fd:
+            self.assertEqual(fd.read(), self.contents)
+        # The two ranges before the failure aren't fetched again
+        self.assertLessEqual(self.server.calls_to('shock'), 1 + 3)
+
+    @unittest.skipUnless(aiohttp, 'aiohttp is not installed')
+    def test_async_retry(self):
+        import asyncio
+        from kbase_workspace_client.async_client import AsyncWorkspaceClient
+
+        async def download():
+            async with AsyncWorkspaceClient(self.server.url) as client:
+                await client.download_shock_file(self.node_id, self.path)
+        self.server.corrupt()
+        asyncio.get_event_loop().run_until_complete(download())
+        self._assert_downloaded(1 + 2)
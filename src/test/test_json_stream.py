@@ -0,0 +1,55 @@
+import io
+import json
+import unittest
+
+from kbase_workspace_client.json_stream import ErrorMember, iter_json_items, result_prefix
+
+try:
+    import ijson  # noqa: F401
+    _HAS_IJSON = True
+except ImportError:
+    _HAS_IJSON = False
+
+
+def _response(result):
+    body = {'version': '1.1', 'id': 1, 'result': [result]}
+    return io.BytesIO(json.dumps(body).encode())
+
+
+@unittest.skipUnless(_HAS_IJSON, "ijson is not installed")
+class TestJSONStream(unittest.TestCase):
+
+    def test_objects(self):
+        result = {'data': [{'info': [1]}, {'info': [2]}]}
+        items = list(iter_json_items(_response(result), result_prefix('data.item')))
+        self.assertEqual(items, result['data'])
+
+    def test_nested_array(self):
+        contigs = [{'id': 'a', 'sequence': 'ACGT', 'gc': 0.5}, {'id': 'b', 'sequence': 'TT'}]
+        result = {'data': [{'info': [1], 'data': {'contigs': contigs}}]}
+        prefix = result_prefix('data.item.data.contigs.item')
+        items = list(iter_json_items(_response(result), prefix))
+        self.assertEqual(items, contigs)
+        # Floats come back as floats, not Decimals
+        self.assertIsInstance(items[0]['gc'], float)
+
+    def test_whole_result(self):
+        result = [[1, 'ws', 'user']]
+        items = list(iter_json_items(_response(result), result_prefix('')))
+        self.assertEqual(items, [result])
+
+    def test_missing_path(self):
+        items = list(iter_json_items(_response({'data': []}), result_prefix('data.item')))
+        self.assertEqual(items, [])
+
+    def test_error_member(self):
+        error = {'name': 'JSONRPCError', 'code': -32500, 'message': 'No such object'}
+        for body in ({'version': '1.1', 'error': error},
+                     {'version': '1.1', 'result': [{'data': [1]}], 'error': error}):
+            fileobj = io.BytesIO(json.dumps(body).encode())
+            with self.assertRaises(ErrorMember) as ctx:
+                list(iter_json_items(fileobj, result_prefix('data.item'), error_key='error'))
+            self.assertEqual(ctx.exception.error, error)
+        # Other objects parse as usual
+        items = iter_json_items(_response({'data': [1]}), result_prefix('data.item'), 'error')
+        self.assertEqual(list(items), [1])
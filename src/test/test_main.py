@@ -3,7 +3,7 @@ import unittest
 import tempfile
 import shutil
 from kbase_workspace_client import WorkspaceClient, WorkspaceResponseError, WSInfo, ObjInfo
-from kbase_workspace_client.exceptions import InvalidWSType, InvalidGenome
+from kbase_workspace_client.exceptions import InvalidWSType, InvalidGenome, MissingHandle
 
 if not os.environ.get('TEST_TOKEN'):
     raise RuntimeError("TEST_TOKEN environment variable is required.")
@@ -24,6 +24,15 @@ class TestMain(unittest.TestCase):
         })
         self.assertTrue(objs['data'])
 
+    def test_req_stream(self):
+        objs = _ws_client.req_stream(
+            'get_objects2',
+            {'objects': [{'ref': '15/38/4'}, {'ref': '34819/10/1'}], 'no_data': 1},
+            'data.item'
+        )
+        infos = [ObjInfo(*obj['info']) for obj in objs]
+        self.assertEqual([(info.wsid, info.objid) for info in infos], [(15, 38), (34819, 10)])
+
     def test_admin_req(self):
         valid_ws_id = '15/38/4'
         objs = _ws_client.admin_req('getObjects', {
@@ -53,8 +62,41 @@ class TestMain(unittest.TestCase):
         shock_id = _ws_client.handle_to_shock(handle_id)
         self.assertEqual(shock_id, 'd2d2ba03-b4f1-4ec9-91f0-99ea70991607')
 
+    def test_handles_to_shock(self):
+        valid_ws_id = '34819/10/1'
+        data = _ws_client.req('get_objects2', {
+            'objects': [{'ref': valid_ws_id}],
+            'no_data': 1
+        })['data'][0]
+        handle_id = data['extracted_ids']['handle'][0]
+        shock_ids = _ws_client.handles_to_shock([handle_id, handle_id])
+        expected = 'd2d2ba03-b4f1-4ec9-91f0-99ea70991607'
+        self.assertEqual(shock_ids, [expected, expected])
+        with self.assertRaises(MissingHandle):
+            _ws_client.handles_to_shock(['KBH_nonexistent'])
+
     def test_download_shock_file(self):
-        pass
+        try:
+            tmp_dir = tempfile.mkdtemp()
+            shock_id = 'd2d2ba03-b4f1-4ec9-91f0-99ea70991607'
+            single = os.path.join(tmp_dir, 'single.fasta')
+            ranged = os.path.join(tmp_dir, 'ranged.fasta')
+            _ws_client.download_shock_file(shock_id, single)
+            _ws_client.download_shock_file(
+                shock_id, ranged, connections=4, range_size=1024 * 1024)
+            with open(single, 'rb') as fd1, open(ranged, 'rb') as fd2:
+                self.assertEqual(fd1.read(), fd2.read())
+            self.assertEqual(os.path.getsize(ranged), 3849120)
+            self.assertFalse(os.path.exists(ranged + '.ranges'))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_context_manager(self):
+        """The client is usable as a context manager and reuses one session for every call."""
+        with WorkspaceClient(url=_URL, token=os.environ['TEST_TOKEN'], pool_maxsize=2) as client:
+            for _ in range(3):
+                info = client.req('get_workspace_info', {'id': 15})
+                self.assertEqual(info[0], 15)
 
     def test_generate_obj_infos(self):
         infos = []
@@ -64,6 +106,46 @@ class TestMain(unittest.TestCase):
         for info in infos:
             self.assertTrue(len(info) == 11)
 
+    def test_scan_workspaces(self):
+        scan = _ws_client.scan_workspaces(
+            [33192, 34819, 99999999],
+            filter=lambda info: info.wsid == 33192,
+            workers=2,
+            rate_limit=10,
+            admin=True,
+        )
+        infos = list(scan)
+        self.assertTrue(len(infos) > 0)
+        self.assertTrue(all(isinstance(info, ObjInfo) and info.wsid == 33192 for info in infos))
+        self.assertEqual([failure.wsid for failure in scan.failures], [99999999])
+
+    def test_scan_workspaces_stop_early(self):
+        with _ws_client.scan_workspaces(range(1, 100), workers=4, admin=True) as scan:
+            for _ in scan:
+                break
+
+    def test_generate_obj_infos_prefetch(self):
+        expected = list(_ws_client.generate_obj_infos(33192))
+        ws_info = WSInfo(*_ws_client.req('get_workspace_info', {'id': 33192}))
+        prefetched = list(_ws_client.generate_obj_infos(33192, prefetch=2))
+        chunked = list(_ws_client.generate_obj_infos(
+            33192, maxid=ws_info.max_objid, workers=4, chunk_size=100))
+        self.assertEqual(prefetched, expected)
+        self.assertEqual(chunked, expected)
+
+    def test_get_objects(self):
+        refs = ['15/38/4', '0/0/0', '34819/10/1']
+        results = _ws_client.get_objects(refs, no_data=True, chunk_size=2, workers=2)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['info'][0], 38)
+        self.assertIsInstance(results[1], Exception)
+        self.assertEqual(results[2]['info'][0], 10)
+
+    def test_get_object_infos(self):
+        refs = ['15/38/4', '34819/10/1']
+        infos = _ws_client.get_object_infos(refs, chunk_size=1)
+        self.assertEqual([(info.wsid, info.objid) for info in infos], [(15, 38), (34819, 10)])
+
     def test_err(self):
         _id = '0/0/0'
         with self.assertRaises(WorkspaceResponseError):
@@ -137,6 +219,42 @@ class TestMain(unittest.TestCase):
         finally:
             shutil.rmtree(tmp_dir)
 
+    def test_export_assemblies(self):
+        try:
+            tmp_dir = tempfile.mkdtemp()
+            progress = []
+            results = list(_ws_client.export_assemblies(
+                ['34819/10/1', '15/45/1'], tmp_dir, workers=2,
+                progress=lambda ref, nbytes: progress.append(nbytes)))
+            by_ref = {result.ref: result for result in results}
+            self.assertEqual(len(results), 2)
+            ok = by_ref['34819/10/1']
+            self.assertIsNone(ok.error)
+            self.assertEqual(os.path.basename(ok.paths[0]), "MEGAHIT.contigs.fasta")
+            self.assertEqual(os.path.getsize(ok.paths[0]), 3849120)
+            self.assertEqual(ok.bytes, 3849120)
+            self.assertEqual(sum(progress), 3849120)
+            self.assertIsInstance(by_ref['15/45/1'].error, InvalidWSType)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_export_reads(self):
+        try:
+            tmp_dir = tempfile.mkdtemp()
+            results = list(_ws_client.export_reads(
+                ['15/45/1', '15/43/1'], tmp_dir, max_bytes_per_sec=100 * 1024 * 1024,
+                max_open_files=2))
+            by_ref = {result.ref: result for result in results}
+            paired = by_ref['15/45/1']
+            self.assertIsNone(paired.error)
+            self.assertEqual([os.path.getsize(path) for path in paired.paths], [36056522, 37522557])
+            self.assertEqual(paired.bytes, 36056522 + 37522557)
+            single = by_ref['15/43/1']
+            self.assertIsNone(single.error)
+            self.assertEqual(os.path.getsize(single.paths[0]), 53949468)
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_get_assembly_from_genome(self):
         """Test the valid/successful case."""
         ref = '34819/14/1'
@@ -0,0 +1,38 @@
+import time
+import unittest
+
+from kbase_workspace_client.memo import TTLMemo
+
+
+class TestTTLMemo(unittest.TestCase):
+
+    def test_get_put(self):
+        memo = TTLMemo(maxsize=10, ttl=60)
+        self.assertIsNone(memo.get('a'))
+        memo.put('a', 1)
+        self.assertEqual(memo.get('a'), 1)
+        self.assertEqual(len(memo), 1)
+
+    def test_expiry(self):
+        memo = TTLMemo(maxsize=10, ttl=0.05)
+        memo.put('a', 1)
+        time.sleep(0.1)
+        self.assertIsNone(memo.get('a'))
+        self.assertEqual(len(memo), 0)
+
+    def test_lru_eviction(self):
+        memo = TTLMemo(maxsize=2, ttl=60)
+        memo.put('a', 1)
+        memo.put('b', 2)
+        # Touch 'a' so that 'b' is the least recently used
+        memo.get('a')
+        memo.put('c', 3)
+        self.assertEqual(memo.get('a'), 1)
+        self.assertIsNone(memo.get('b'))
+        self.assertEqual(memo.get('c'), 3)
+
+    def test_clear(self):
+        memo = TTLMemo(maxsize=2, ttl=60)
+        memo.put('a', 1)
+        memo.clear()
+        self.assertIsNone(memo.get('a'))
@@ -0,0 +1,102 @@
+import unittest
+
+from kbase_workspace_client.metrics import (
+    Histogram, MetricsRecorder, RequestEvent, NULL_PROBE, measure
+)
+
+
+def _event(latency, kind='rpc', method='get_objects2', outcome='ok', ttfb=0.01, attempts=1):
+    return RequestEvent(kind, method, False, 100, 1000, ttfb, latency, attempts, outcome,
+                        200, None)
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = Histogram(buckets=(1, 2, 3, 4))
+        for value in (0.5, 1.5, 2.5, 3.5):
+            histogram.observe(value)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 8)
+        self.assertEqual(histogram.percentile(50), 2)
+        self.assertEqual(histogram.percentile(100), 3.5)
+        self.assertEqual(histogram.cumulative()[-2:], [(4, 4), (float('inf'), 4)])
+
+    def test_overflow_bucket(self):
+        histogram = Histogram(buckets=(1,))
+        histogram.observe(10)
+        self.assertEqual(histogram.percentile(99), 9.91)
+        self.assertEqual(histogram.cumulative(), [(1, 0), (float('inf'), 1)])
+
+    def test_empty(self):
+        self.assertIsNone(Histogram().percentile(50))
+
+
+class TestMetricsRecorder(unittest.TestCase):
+
+    def test_stats(self):
+        recorder = MetricsRecorder()
+        for latency in (0.02, 0.04, 0.2):
+            recorder(_event(latency))
+        recorder(_event(1, outcome='error', attempts=3))
+        recorder(_event(2, kind='shock_download', method='download'))
+        stats = recorder.stats()
+        ok = stats[('rpc', 'get_objects2', False, 'ok')]
+        self.assertEqual((ok['requests'], ok['attempts'], ok['bytes_received']), (3, 3, 3000))
+        self.assertEqual(ok['max'], 0.2)
+        self.assertEqual(stats[('rpc', 'get_objects2', False, 'error')]['attempts'], 3)
+        self.assertLessEqual(recorder.percentile(50, kind='rpc'), 0.05)
+        self.assertEqual(recorder.percentile(100, method='download'), 2)
+        self.assertIsNone(recorder.percentile(50, kind='handle'))
+        recorder.reset()
+        self.assertEqual(recorder.stats(), {})
+
+    def test_prometheus(self):
+        recorder = MetricsRecorder(buckets=(0.1, 1), namespace='test')
+        recorder(_event(0.5, method='get_"x"'))
+        lines = recorder.prometheus().splitlines()
+        labels = 'kind="rpc",method="get_\\"x\\"",admin="false",outcome="ok"'
+        self.assertIn('# TYPE test_requests_total counter', lines)
+        self.assertIn('test_requests_total{' + labels + '} 1', lines)
+        self.assertIn('test_received_bytes_total{' + labels + '} 1000', lines)
+        self.assertIn('# TYPE test_request_duration_seconds histogram', lines)
+        self.assertIn('test_request_duration_seconds_bucket{' + labels + ',le="0.1"} 0', lines)
+        self.assertIn('test_request_duration_seconds_bucket{' + labels + ',le="1.0"} 1', lines)
+        self.assertIn('test_request_duration_seconds_bucket{' + labels + ',le="+Inf"} 1', lines)
+        self.assertIn('test_request_duration_seconds_count{' + labels + '} 1', lines)
+
+
+class TestMeasure(unittest.TestCase):
+
+    def test_no_observers(self):
+        with measure([], 'rpc', 'get_objects2') as probe:
+            self.assertIs(probe, NULL_PROBE)
+
+    def test_events(self):
+        events = []
+        with measure([events.append], 'rpc', 'list_objects', admin=True, bytes_sent=10) as probe:
+            probe.attempt()
+            probe.attempt()
+            probe.response(200)
+            probe.received(5)
+            probe.received(7)
+        with self.assertRaises(ValueError):
+            with measure([events.append], 'handle', 'hids_to_handles'):
+                raise ValueError('nope')
+        (ok, error) = events
+        self.assertEqual(ok[:4], ('rpc', 'list_objects', True, 10))
+        self.assertEqual(ok.bytes_received, 12)
+        self.assertEqual((ok.attempts, ok.outcome, ok.status, ok.error), (2, 'ok', 200, None))
+        self.assertLessEqual(ok.ttfb, ok.latency)
+        self.assertEqual((error.outcome, error.attempts, error.ttfb), ('error', 1, None))
+        self.assertIsInstance(error.error, ValueError)
+
+    def test_failing_observer(self):
+        events = []
+
+        def broken(event):
+            raise RuntimeError('broken observer')
+        with self.assertLogs('kbase_workspace_client.metrics', 'ERROR'):
+            with measure([broken, events.append], 'rpc', 'get_objects2'):
+                pass
+        self.assertEqual(len(events), 1)
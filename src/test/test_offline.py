@@ -0,0 +1,278 @@
+"""
+Tests of the client against the local mock KBase server, which run without a network or token.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from kbase_workspace_client import WorkspaceClient
+from kbase_workspace_client.exceptions import (
+    FileExists, MissingShockFile, WorkspaceResponseError
+)
+from kbase_workspace_client.metrics import MetricsRecorder
+from kbase_workspace_client.resilience import Resilience, RetryPolicy
+from test.mock_server import MockKBase
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class TestOffline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockKBase().start()
+        cls.server.populate(workspaces=2, objects=25, versions=2)
+        cls.server.add_object(3, 1, 'KBaseGenomes.Genome-17.0', {
+            'id': 'genome', 'features': [{'id': 'a', 'seq': 'ACGT'}, {'id': 'b', 'seq': 'GG'}]})
+        cls.contents = os.urandom(300 * 1024)
+        cls.node_id = cls.server.add_shock_file(cls.contents, name='reads.fastq')
+        cls.hid = cls.server.add_handle(cls.node_id)
+        # A genome with a large body, its assembly, a legacy ContigSet, and paired-end reads
+        fasta_hid = cls.server.add_handle(cls.server.add_shock_file(b'>contig\nACGT\n'))
+        features = [{'id': f'gene_{idx}', 'sequence': 'ACGT' * 100} for idx in range(100)]
+        cls.server.add_object(4, 1, 'KBaseGenomes.Genome-17.0', {
+            'assembly_ref': '4/2/1', 'features': features}, name='genome')
+        cls.server.add_object(4, 2, 'KBaseGenomeAnnotations.Assembly-6.0', {
+            'fasta_handle_ref': fasta_hid, 'contigs': {}}, name='assembly')
+        cls.server.add_object(4, 3, 'KBaseGenomes.ContigSet-3.0', {
+            'contigs': [{'id': 'c1', 'sequence': 'GGCC', 'description': ''}]}, name='contigset')
+        cls.server.add_object(4, 4, 'KBaseFile.PairedEndLibrary-2.0', {
+            'interleaved': 0, 'lib1': {'file': {'id': cls.node_id}},
+            'lib2': {'file': {'id': cls.node_id}}, 'read_count': 10}, name='reads')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_calls()
+        self.recorder = MetricsRecorder()
+        self.client = WorkspaceClient(self.server.url, observers=[self.recorder])
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_req(self):
+        info = self.client.req('get_workspace_info', {'id': 1})
+        self.assertEqual(info[:2], [1, 'ws_1'])
+        with self.assertRaises(WorkspaceResponseError) as ctx:
+            self.client.req('get_workspace_info', {'id': 99})
+        self.assertIn('No workspace with id 99', ctx.exception.resp_text)
+
+    def test_admin_req(self):
+        result = self.client.admin_req('getObjects', {'objects': [{'ref': '1/2/1'}]})
+        self.assertEqual(result['data'][0]['info'][:5][::4], [2, 1])
+        self.assertEqual(self.server.calls, [('ws', 'administer')])
+
+    def test_cached_objects(self):
+        from kbase_workspace_client.cache import ObjectCache
+        client = WorkspaceClient(self.server.url, cache=ObjectCache())
+        refs = ['1/1/1', '1/2/1', '1/3']
+        objs = client.get_objects(refs)
+        self.assertEqual(client.get_objects(refs), objs)
+        # Only the unversioned reference is requested again
+        self.assertEqual(self.server.calls_to('get_objects2'), 2)
+        chsums = [obj['info'][8] for obj in objs]
+        self.assertEqual(client.get_object('1/1/1', chsum=chsums[0]), objs[0])
+        self.assertEqual(self.server.calls_to('get_objects2'), 2)
+        # A cached copy with another checksum than the caller knows of is fetched again
+        client.get_objects(refs[:2], chsums=['stale', chsums[1]])
+        client.get_object('1/2/1', chsum='stale')
+        self.assertEqual(self.server.calls_to('get_objects2'), 4)
+        client.close()
+
+    def test_included(self):
+        result = self.client.req('get_objects2', {
+            'objects': [{'ref': '3/1', 'included': ['/features/*/id']}]})
+        self.assertEqual(result['data'][0]['data'], {'features': [{'id': 'a'}, {'id': 'b'}]})
+
+    def test_get_object_fields(self):
+        ws_obj = self.client.get_object('4/1/1', fields=['/assembly_ref', '/features/*/id'])
+        self.assertEqual(ws_obj['data']['features'][0], {'id': 'gene_0'})
+        self.assertEqual(ws_obj['info'][1], 'genome')
+
+    def test_get_assembly_from_genome(self):
+        self.assertEqual(self.client.get_assembly_from_genome('4/1/1'), '4/1/1;4/2/1')
+        # Only the assembly references are transferred, not the features
+        received = self.recorder.stats()[('rpc', 'get_objects2', False, 'ok')]['bytes_received']
+        self.assertLess(received, 1000)
+
+    def test_download_assembly_fasta(self):
+        path = self.client.download_assembly_fasta('4/2/1', self.tmp_dir)
+        with open(path) as fd:
+            self.assertEqual(fd.read(), '>contig\nACGT\n')
+        # A ContigSet is fetched in two steps: the info, then the contigs
+        path = self.client.download_assembly_fasta('4/3/1', self.tmp_dir)
+        with open(path) as fd:
+            self.assertEqual(fd.read(), '>c1\nGGCC\n')
+        self.assertEqual(self.server.calls_to('get_objects2'), 3)
+
+    def test_download_reads_fastq(self):
+        paths = self.client.download_reads_fastq('4/4/1', self.tmp_dir)
+        self.assertEqual([os.path.basename(path) for path in paths],
+                         ['reads.paired.fwd.fastq', 'reads.paired.rev.fastq'])
+        for path in paths:
+            self.assertEqual(os.path.getsize(path), len(self.contents))
+
+    def test_export_assemblies(self):
+        results = {result.ref: result for result in
+                   self.client.export_assemblies(['4/2/1', '4/3/1', '4/1/1'], self.tmp_dir)}
+        self.assertIsNone(results['4/2/1'].error)
+        self.assertIsNone(results['4/3/1'].error)
+        self.assertIsNotNone(results['4/1/1'].error)
+        contigset_path = os.path.join(self.tmp_dir, 'contigset.fasta')
+        self.assertTrue(os.path.exists(contigset_path))
+        # Files written from object data count towards the bytes too
+        self.assertEqual(results['4/3/1'].bytes, os.path.getsize(contigset_path))
+        self.assertGreater(results['4/2/1'].bytes, 0)
+
+    def test_export_same_names(self):
+        # An assembly with the same name as 4/2/1, in another workspace
+        fasta_hid = self.server.add_handle(self.server.add_shock_file(b'>other\nGG\n'))
+        self.server.add_object(6, 1, 'KBaseGenomeAnnotations.Assembly-6.0', {
+            'fasta_handle_ref': fasta_hid, 'contigs': {}}, name='assembly')
+        results = list(self.client.export_assemblies(
+            ['4/2/1', '6/1/1'], self.tmp_dir, max_open_files=1))
+        errors = {result.ref: result.error for result in results}
+        self.assertIsNone(errors['4/2/1'])
+        self.assertIsInstance(errors['6/1/1'], FileExists)
+        with open(os.path.join(self.tmp_dir, 'assembly.fasta')) as fd:
+            self.assertEqual(fd.read(), '>contig\nACGT\n')
+
+    @unittest.skipUnless(aiohttp, 'aiohttp is not installed')
+    def test_async_projections(self):
+        import asyncio
+        from kbase_workspace_client import AsyncWorkspaceClient
+
+        async def run():
+            async with AsyncWorkspaceClient(self.server.url) as client:
+                assembly_ref = await client.get_assembly_from_genome('4/1/1')
+                paths = await client.download_reads_fastq('4/4/1', self.tmp_dir)
+                path = await client.download_assembly_fasta('4/3/1', self.tmp_dir)
+            return (assembly_ref, paths, path)
+        (assembly_ref, paths, path) = asyncio.get_event_loop().run_until_complete(run())
+        self.assertEqual(assembly_ref, '4/1/1;4/2/1')
+        self.assertEqual(len(paths), 2)
+        with open(path) as fd:
+            self.assertEqual(fd.read(), '>c1\nGGCC\n')
+
+    @unittest.skipUnless(aiohttp, 'aiohttp is not installed')
+    def test_async_shock_download(self):
+        import asyncio
+        from kbase_workspace_client import AsyncWorkspaceClient
+        paths = [os.path.join(self.tmp_dir, f'{idx}.fastq') for idx in range(3)]
+
+        async def run():
+            async with AsyncWorkspaceClient(self.server.url, max_concurrency=1) as client:
+                # Downloads queue for the one slot
+                await asyncio.gather(*[
+                    client.download_shock_file(self.node_id, path) for path in paths[:2]])
+                self.server.fail(500, match='download_raw')
+                await client.download_shock_file(self.node_id, paths[2])
+        with self.assertRaises(RuntimeError) as ctx:
+            asyncio.get_event_loop().run_until_complete(run())
+        self.assertIn('Error from shock', str(ctx.exception))
+        for path in paths[:2]:
+            with open(path, 'rb') as fd:
+                self.assertEqual(fd.read(), self.contents)
+
+    def test_generate_obj_infos(self):
+        infos = list(self.client.generate_obj_infos(1, latest=False))
+        self.assertEqual(len(infos), 50)
+        self.assertEqual([info[0] for info in infos[:4]], [1, 1, 2, 2])
+        infos = list(self.client.generate_obj_infos(1, maxid=25, workers=3, chunk_size=10))
+        self.assertEqual([info[0] for info in infos], list(range(1, 26)))
+
+    def test_scan_workspaces(self):
+        infos = list(self.client.scan_workspaces([1, 2], workers=2))
+        self.assertEqual(len(infos), 50)
+        self.assertEqual({info[6] for info in infos}, {1, 2})
+
+    @unittest.skipUnless(ijson, 'ijson is not installed')
+    def test_req_stream(self):
+        params = {'ids': [1], 'maxObjectID': 5}
+        infos = list(self.client.req_stream('list_objects', params, 'item'))
+        self.assertEqual([info[0] for info in infos], [1, 2, 3, 4, 5])
+
+    @unittest.skipUnless(ijson, 'ijson is not installed')
+    def test_req_stream_error(self):
+        # A JSON-RPC error sent with a 200 status still raises
+        self.server.rpc_error_status = 200
+        try:
+            with self.assertRaises(WorkspaceResponseError) as ctx:
+                list(self.client.req_stream('list_objects', {'ids': [999]}, 'item'))
+        finally:
+            self.server.rpc_error_status = 500
+        self.assertEqual(ctx.exception.status_code, 200)
+        self.assertIn('No workspace with id 999', ctx.exception.resp_data['error']['message'])
+
+    def test_shock_download(self):
+        self.assertEqual(self.client.handles_to_shock([self.hid]), [self.node_id])
+        for connections in (1, 4):
+            path = os.path.join(self.tmp_dir, f'{connections}.fastq')
+            self.client.download_shock_file(
+                self.node_id, path, connections=connections, range_size=64 * 1024)
+            with open(path, 'rb') as fd:
+                self.assertEqual(fd.read(), self.contents)
+        # One download request, then five ranges of 64KiB
+        self.assertEqual(self.server.calls_to('shock'), 2 + 1 + 5)
+        downloads = self.recorder.stats()[('shock_download', 'download', False, 'ok')]
+        self.assertEqual(downloads['bytes_received'], 2 * len(self.contents))
+
+    def test_stale_range_state(self):
+        from kbase_workspace_client.shock import _save_state, STATE_SUFFIX
+        path = os.path.join(self.tmp_dir, 'reads.fastq')
+        # Left over from an earlier download of the same node, whose file is gone
+        layout = {'node': self.server.url + '/shock-api/node/' + self.node_id,
+                  'size': len(self.contents), 'range_size': 64 * 1024}
+        _save_state(path + STATE_SUFFIX, layout, {0, 1, 2})
+        self.client.download_shock_file(
+            self.node_id, path, connections=2, range_size=64 * 1024)
+        with open(path, 'rb') as fd:
+            self.assertEqual(fd.read(), self.contents)
+        self.assertFalse(os.path.exists(path + STATE_SUFFIX))
+
+    def test_handle_memo(self):
+        from kbase_workspace_client.handles import HANDLE_MEMO
+        HANDLE_MEMO.clear()
+        self.assertEqual(self.client.handle_to_shock(self.hid), self.node_id)
+        self.assertEqual(self.client.handle_to_shock(self.hid), self.node_id)
+        self.assertEqual(self.server.calls_to('hids_to_handles'), 1)
+        # A client with another token looks the handle up itself
+        with WorkspaceClient(self.server.url, token='other') as client:
+            self.assertEqual(client.handle_to_shock(self.hid), self.node_id)
+        self.assertEqual(self.server.calls_to('hids_to_handles'), 2)
+
+    def test_missing_shock_file(self):
+        with self.assertRaises(MissingShockFile):
+            self.client.download_shock_file('nope', os.path.join(self.tmp_dir, 'nope'))
+
+    def test_retries(self):
+        client = WorkspaceClient(
+            self.server.url, resilience=Resilience(RetryPolicy(max_attempts=3, backoff_base=0)))
+        self.server.fail(503, count=2, match='/ws')
+        self.assertEqual(client.req('get_workspace_info', {'id': 1})[0], 1)
+        self.assertEqual(self.server.calls_to('get_workspace_info'), 1)
+        self.server.fail(None, count=1, match='/ws')
+        self.assertEqual(client.req('get_workspace_info', {'id': 2})[0], 2)
+        client.close()
+
+    def test_compression(self):
+        server = MockKBase(gzip_responses=True).start()
+        server.populate(objects=5)
+        client = WorkspaceClient(server.url, compress_requests='gzip', compress_min_size=0)
+        infos = client.req('list_objects', {'ids': [1]})
+        self.assertEqual(len(infos), 5)
+        client.close()
+        server.stop()
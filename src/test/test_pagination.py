@@ -0,0 +1,57 @@
+import threading
+import time
+import unittest
+
+from kbase_workspace_client.pagination import prefetch_pages, chunked_pages
+
+
+class TestPrefetchPages(unittest.TestCase):
+
+    def test_order(self):
+        pages = iter([[1, 2], [3], [4, 5]])
+        self.assertEqual(list(prefetch_pages(pages, 2)), [[1, 2], [3], [4, 5]])
+
+    def test_error_is_raised_in_consumer(self):
+        def pages():
+            yield [1]
+            raise ValueError("bad page")
+        gen = prefetch_pages(pages(), 2)
+        self.assertEqual(next(gen), [1])
+        with self.assertRaises(ValueError):
+            next(gen)
+
+    def test_bounded_and_stops_early(self):
+        fetched = []
+
+        def pages():
+            for idx in range(100):
+                fetched.append(idx)
+                yield [idx]
+        before = threading.active_count()
+        gen = prefetch_pages(pages(), 2)
+        next(gen)
+        time.sleep(0.2)
+        # One consumed and two buffered; the next isn't fetched until there is room for it
+        self.assertEqual(len(fetched), 3)
+        next(gen)
+        time.sleep(0.2)
+        self.assertEqual(len(fetched), 4)
+        gen.close()
+        self.assertEqual(threading.active_count(), before)
+
+
+class TestChunkedPages(unittest.TestCase):
+
+    def test_order_and_bounds(self):
+        ranges = []
+        lock = threading.Lock()
+
+        def fetch_chunk(lo, hi):
+            with lock:
+                ranges.append((lo, hi))
+            # Finish later chunks sooner, to check that ordering is kept
+            time.sleep(0.05 / lo)
+            return [list(range(lo, hi + 1))]
+        pages = list(chunked_pages(fetch_chunk, 1, 25, chunk_size=10, workers=3))
+        self.assertEqual(pages, [list(range(1, 11)), list(range(11, 21)), list(range(21, 26))])
+        self.assertEqual(sorted(ranges), [(1, 10), (11, 20), (21, 25)])
@@ -0,0 +1,40 @@
+import threading
+import time
+import unittest
+
+from kbase_workspace_client.ratelimit import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_burst_is_free(self):
+        limiter = RateLimiter(rate=10, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+    def test_rate_across_threads(self):
+        """Many threads sharing a limiter are collectively held to its rate."""
+        limiter = RateLimiter(rate=100)
+        start = time.monotonic()
+
+        def work():
+            for _ in range(10):
+                limiter.acquire()
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 40 tokens at 100/sec, less the one-token burst
+        self.assertGreaterEqual(time.monotonic() - start, 0.38)
+
+    def test_acquire_more_than_burst(self):
+        limiter = RateLimiter(rate=1000, burst=10)
+        waited = limiter.acquire(100)
+        self.assertAlmostEqual(waited, 0.09, delta=0.02)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(rate=0)
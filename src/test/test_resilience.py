@@ -0,0 +1,186 @@
+import threading
+import time
+import unittest
+
+import requests
+
+from kbase_workspace_client.exceptions import TransientResponseError, CircuitOpenError
+from kbase_workspace_client.resilience import (
+    AIMDLimiter,
+    CircuitBreaker,
+    Resilience,
+    RetryPolicy,
+)
+
+
+class _Response:
+    """Just enough of a requests.Response for status checks."""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = ''
+
+    def json(self):
+        raise ValueError('No JSON')
+
+
+def _flaky(failures, error):
+    """An operation that raises `error()` for its first `failures` calls."""
+    calls = []
+
+    def operation():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error()
+        return len(calls)
+    return (operation, calls)
+
+
+def _fast_retries(max_attempts=3):
+    return RetryPolicy(max_attempts=max_attempts, backoff_base=0.001, backoff_max=0.001)
+
+
+class TestResilience(unittest.TestCase):
+
+    def test_retries_transient_status(self):
+        policy = Resilience(retry=_fast_retries())
+        (operation, calls) = _flaky(2, lambda: TransientResponseError(_Response(503)))
+        self.assertEqual(policy.call(operation), 3)
+
+    def test_retries_connection_errors(self):
+        policy = Resilience(retry=_fast_retries())
+        (operation, calls) = _flaky(1, requests.ConnectionError)
+        self.assertEqual(policy.call(operation), 2)
+
+    def test_gives_up_after_max_attempts(self):
+        policy = Resilience(retry=_fast_retries(max_attempts=2))
+        (operation, calls) = _flaky(5, lambda: TransientResponseError(_Response(502)))
+        with self.assertRaises(TransientResponseError):
+            policy.call(operation)
+        self.assertEqual(len(calls), 2)
+
+    def test_other_errors_not_retried(self):
+        policy = Resilience(retry=_fast_retries())
+        (operation, calls) = _flaky(5, lambda: RuntimeError('application error'))
+        with self.assertRaises(RuntimeError):
+            policy.call(operation)
+        self.assertEqual(len(calls), 1)
+
+    def test_disabled_makes_one_attempt(self):
+        (operation, calls) = _flaky(5, requests.Timeout)
+        with self.assertRaises(requests.Timeout):
+            Resilience.disabled().call(operation)
+        self.assertEqual(len(calls), 1)
+
+    def test_check_response(self):
+        policy = Resilience()
+        policy.check_response(_Response(200))
+        # The workspace uses 500 for application errors
+        policy.check_response(_Response(500))
+        with self.assertRaises(TransientResponseError) as ctx:
+            policy.check_response(_Response(429, {'Retry-After': '7'}))
+        self.assertEqual(ctx.exception.retry_after, 7)
+        with self.assertRaises(TransientResponseError) as ctx:
+            policy.check_response(_Response(503, {'Retry-After': 'Mon, 01 Jan 2001 00:00:00 GMT'}))
+        self.assertEqual(ctx.exception.retry_after, 0)
+
+    def test_backoff(self):
+        retry = RetryPolicy(backoff_base=1, backoff_max=4, max_retry_after=10)
+        for attempt in range(1, 10):
+            self.assertLessEqual(retry.backoff(attempt), min(4, 2 ** (attempt - 1)))
+        self.assertEqual(retry.backoff(1, retry_after=3), 3)
+        self.assertEqual(retry.backoff(1, retry_after=60), 10)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_and_recovers(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        policy = Resilience(retry=_fast_retries(max_attempts=1), breaker=breaker)
+        (failing, calls) = _flaky(100, requests.ConnectionError)
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                policy.call(failing)
+        # The circuit is open, so the request is not attempted
+        with self.assertRaises(CircuitOpenError):
+            policy.call(failing)
+        self.assertEqual(len(calls), 2)
+        time.sleep(0.06)
+        # The trial request succeeds and closes the circuit
+        self.assertEqual(policy.call(lambda: 'ok'), 'ok')
+        self.assertEqual(policy.call(lambda: 'ok'), 'ok')
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.before_call()
+        # Only one trial at a time
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_trial_with_other_error(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        policy = Resilience(retry=_fast_retries(max_attempts=1), breaker=breaker)
+        with self.assertRaises(TransientResponseError):
+            policy.call(lambda: policy.check_response(_Response(503)))
+        time.sleep(0.06)
+        # The trial reaches the service but fails for another reason, which closes the circuit
+        (failing, calls) = _flaky(1, ValueError)
+        with self.assertRaises(ValueError):
+            policy.call(failing)
+        self.assertEqual(policy.call(failing), 2)
+        # Interrupted trials don't leave the circuit stuck open either
+        with self.assertRaises(TransientResponseError):
+            policy.call(lambda: policy.check_response(_Response(503)))
+        time.sleep(0.06)
+        (interrupted, _) = _flaky(1, KeyboardInterrupt)
+        with self.assertRaises(KeyboardInterrupt):
+            policy.call(interrupted)
+        time.sleep(0.06)
+        self.assertEqual(policy.call(lambda: 'ok'), 'ok')
+
+
+class TestAIMDLimiter(unittest.TestCase):
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AIMDLimiter(initial=4, minimum=1, maximum=5)
+        for _ in range(4):
+            limiter.on_success()
+        self.assertAlmostEqual(limiter.limit, 5, delta=0.1)
+        limiter.on_pushback()
+        self.assertAlmostEqual(limiter.limit, 2.5, delta=0.05)
+        for _ in range(5):
+            limiter.on_pushback()
+        self.assertEqual(limiter.limit, 1)
+
+    def test_bounds_in_flight(self):
+        limiter = AIMDLimiter(initial=2)
+        lock = threading.Lock()
+        counts = {'now': 0, 'max': 0}
+
+        def work():
+            with limiter.slot():
+                with lock:
+                    counts['now'] += 1
+                    counts['max'] = max(counts['max'], counts['now'])
+                time.sleep(0.01)
+                with lock:
+                    counts['now'] -= 1
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counts['max'], 2)
+
+    def test_pushback_shrinks_limit(self):
+        limiter = AIMDLimiter(initial=8)
+        policy = Resilience(retry=_fast_retries(), concurrency=limiter)
+        (operation, calls) = _flaky(1, lambda: TransientResponseError(_Response(429)))
+        policy.call(operation)
+        self.assertLess(limiter.limit, 8)
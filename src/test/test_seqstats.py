@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from kbase_workspace_client.seqstats import (
+    filter_records, sequence_stats, split_records, RecordStats
+)
+
+
+def _sequence(rand, length):
+    return ''.join(rand.choice('ACGTN') for _ in range(length))
+
+
+class TestSeqStats(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        rand = random.Random(0)
+        self.seqs = [_sequence(rand, rand.randint(1, 300)) for _ in range(200)]
+        self.fasta = os.path.join(self.tmp_dir, 'contigs.fasta')
+        with open(self.fasta, 'w') as fd:
+            for (idx, seq) in enumerate(self.seqs):
+                fd.write(f'>contig_{idx} description\n')
+                for start in range(0, len(seq), 60):
+                    fd.write(seq[start:start + 60] + '\n')
+        self.fastq = os.path.join(self.tmp_dir, 'reads.fastq')
+        with open(self.fastq, 'w') as fd:
+            for (idx, seq) in enumerate(self.seqs):
+                # Quality lines that start with '@' look like headers
+                fd.write(f'@read_{idx}\n{seq}\n+\n@{"I" * (len(seq) - 1)}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _expected(self, seqs):
+        called = sum(len(seq) - seq.count('N') for seq in seqs)
+        gc = sum(seq.count('G') + seq.count('C') for seq in seqs)
+        return (len(seqs), sum(map(len, seqs)), gc / called)
+
+    def test_stats(self):
+        for (path, record_id) in ((self.fasta, 'contig_7'), (self.fastq, 'read_7')):
+            whole = sequence_stats(path, records=True, checksum=True)
+            # Chunks of 1KiB, parsed in two processes
+            parallel = sequence_stats(path, workers=2, chunk_size=1024, records=True,
+                                      checksum=True)
+            self.assertEqual(whole, parallel)
+            (records, bases, gc_content) = self._expected(self.seqs)
+            self.assertEqual((parallel.records, parallel.bases), (records, bases))
+            self.assertAlmostEqual(parallel.gc_content, gc_content)
+            self.assertEqual(parallel.max_length, max(map(len, self.seqs)))
+            with open(path, 'rb') as fd:
+                self.assertEqual(parallel.md5, hashlib.md5(fd.read()).hexdigest())
+            seq = self.seqs[7]
+            self.assertEqual(parallel.record_stats[7][:2], (record_id, len(seq)))
+            self.assertEqual(parallel.record_stats[7].md5, hashlib.md5(seq.encode()).hexdigest())
+        self.assertEqual(whole.format, 'fastq')
+
+    def test_n50(self):
+        path = os.path.join(self.tmp_dir, 'n50.fasta')
+        with open(path, 'w') as fd:
+            for (idx, length) in enumerate([2, 3, 4, 5, 6, 7, 8, 9, 10]):
+                fd.write(f'>{idx}\n{"A" * length}\n')
+        stats = sequence_stats(path)
+        self.assertEqual((stats.n50, stats.min_length, stats.gc_content), (8, 2, 0.0))
+        self.assertIsNone(stats.record_stats)
+
+    def test_filter_records(self):
+        dest = os.path.join(self.tmp_dir, 'long.fastq')
+        stats = filter_records(self.fastq, dest, min_length=100, workers=2, chunk_size=2048)
+        kept = [seq for seq in self.seqs if len(seq) >= 100]
+        self.assertEqual(stats.records, len(kept))
+        self.assertEqual(stats.path, dest)
+        self.assertEqual(sequence_stats(dest).bases, sum(map(len, kept)))
+        with open(dest) as fd:
+            self.assertEqual(fd.read().splitlines()[1], kept[0])
+        self.assertEqual(os.listdir(self.tmp_dir).count('long.fastq'), 1)
+        # An existing file isn't overwritten, as with the other writers
+        with self.assertRaises(IOError):
+            filter_records(self.fastq, dest, min_length=100)
+
+    def test_split_records(self):
+        parts = split_records(self.fasta, self.tmp_dir, max_bytes=4096)
+        self.assertGreater(len(parts), 2)
+        self.assertEqual(os.path.basename(parts[0]), 'contigs.1.fasta')
+        combined = b''
+        for part in parts:
+            with open(part, 'rb') as fd:
+                data = fd.read()
+            self.assertTrue(data.startswith(b'>'))
+            combined += data
+        with open(self.fasta, 'rb') as fd:
+            self.assertEqual(combined, fd.read())
+
+    def test_invalid(self):
+        gzipped = os.path.join(self.tmp_dir, 'reads.fastq.gz')
+        with gzip.open(gzipped, 'wb') as fd:
+            fd.write(b'@read\nACGT\n+\nIIII\n')
+        with self.assertRaises(ValueError):
+            sequence_stats(gzipped)
+        empty = os.path.join(self.tmp_dir, 'empty.fasta')
+        open(empty, 'w').close()
+        stats = sequence_stats(empty, records=True)
+        self.assertEqual((stats.records, stats.format, stats.record_stats), (0, None, []))
+
+    def test_record_stats(self):
+        path = os.path.join(self.tmp_dir, 'one.fasta')
+        with open(path, 'w') as fd:
+            fd.write('>one\nGGNA\nT\n')
+        stats = sequence_stats(path, records=True)
+        self.assertEqual(stats.record_stats, [
+            RecordStats('one', 5, 0.5, 1, hashlib.md5(b'GGNAT').hexdigest())])
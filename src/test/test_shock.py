@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from kbase_workspace_client.shock import (
+    _split_ranges, _load_state, _save_state, can_resume, node_file_size, STATE_SUFFIX
+)
+
+
+class TestShockRanges(unittest.TestCase):
+
+    def test_split_ranges(self):
+        self.assertEqual(_split_ranges(10, 4), [(0, 4), (4, 4), (8, 2)])
+        self.assertEqual(_split_ranges(8, 4), [(0, 4), (4, 4)])
+        self.assertEqual(_split_ranges(3, 4), [(0, 3)])
+
+    def test_node_file_size(self):
+        self.assertEqual(node_file_size({'data': {'file': {'size': 12}}}), 12)
+        self.assertEqual(node_file_size({'data': {'file': {}}}), None)
+        self.assertEqual(node_file_size({'data': None}), None)
+
+    def test_state_round_trip(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            dest = os.path.join(tmp_dir, 'file')
+            state_path = dest + STATE_SUFFIX
+            layout = {'node': 'http://x/node/1', 'size': 10, 'range_size': 4}
+            self.assertFalse(can_resume(dest))
+            open(dest, 'wb').close()
+            _save_state(state_path, layout, {2, 0})
+            self.assertTrue(can_resume(dest))
+            self.assertEqual(_load_state(state_path, layout), {0, 2})
+            # A different node or range layout starts over
+            self.assertEqual(_load_state(state_path, dict(layout, node='other')), set())
+            self.assertEqual(_load_state(state_path, dict(layout, range_size=5)), set())
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,77 @@
+import unittest
+
+from kbase_workspace_client.main import ObjInfo
+from kbase_workspace_client.table import ObjInfoTable
+
+_INFOS = [
+    [1, 'narr', 'KBaseNarrative.Narrative-4.0', '2020-01-01T00:00:00+0000', 3, 'alice', 10, 'ws10',
+     'a' * 32, 100, {'k': 'v'}],
+    [2, 'genome', 'KBaseGenomes.Genome-17.0', '2020-02-01T00:00:00+0000', 1, 'bob', 10, 'ws10',
+     'b' * 32, 2000, None],
+    [1, 'old narr', 'KBaseNarrative.Narrative-3.0', '2019-05-01T00:00:00+0000', 1, 'alice', 11,
+     'ws11', 'c' * 32, 50, {}],
+    [2, 'ünïcode', 'KBaseGenomes.Genome-17.0', '2020-03-01T00:00:00+0000', 2, 'carol', 12,
+     'ws12', 'd' * 32, 7, None],
+]
+
+
+class TestObjInfoTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = ObjInfoTable.from_infos(_INFOS)
+
+    def test_rows_round_trip(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(list(self.table), [ObjInfo(*info) for info in _INFOS])
+        self.assertEqual(self.table[-1], ObjInfo(*_INFOS[-1]))
+        with self.assertRaises(IndexError):
+            self.table[4]
+
+    def test_slice(self):
+        sliced = self.table[1:3]
+        self.assertIsInstance(sliced, ObjInfoTable)
+        self.assertEqual(list(sliced), [ObjInfo(*info) for info in _INFOS[1:3]])
+
+    def test_column(self):
+        self.assertEqual(self.table.column('wsid'), [10, 10, 11, 12])
+        self.assertEqual(self.table.column('saved_by'), ['alice', 'bob', 'alice', 'carol'])
+        self.assertEqual(self.table.column('name')[3], 'ünïcode')
+        with self.assertRaises(KeyError):
+            self.table.column('nope')
+
+    def test_filter(self):
+        narratives = self.table.filter(type_prefix='KBaseNarrative.Narrative-')
+        self.assertEqual(narratives.column('name'), ['narr', 'old narr'])
+        self.assertEqual(len(self.table.filter(type_prefix='KBaseNarrative.Narrative-4')), 1)
+        self.assertEqual(self.table.filter(wsid=10).column('objid'), [1, 2])
+        self.assertEqual(self.table.filter(wsid=[11, 12]).column('wsid'), [11, 12])
+        self.assertEqual(self.table.filter(saved_by='alice').column('wsid'), [10, 11])
+        dated = self.table.filter(saved_after='2020-01-01', saved_before='2020-03-01')
+        self.assertEqual(dated.column('name'), ['narr', 'genome'])
+        combined = self.table.filter(type_prefix='KBaseGenomes.', saved_by='carol', wsid=12)
+        self.assertEqual(list(combined), [ObjInfo(*_INFOS[3])])
+        self.assertEqual(len(self.table.filter(saved_by='nobody')), 0)
+
+    def test_save_dates(self):
+        # Dates in other formats read back unchanged, and still filter by time
+        odd = ['2020-02-01T01:00:00.5+01:00', '2020-02-01', 'not a date', None]
+        table = ObjInfoTable.from_infos(
+            [[idx, str(idx), 'T-1.0', value, 1, 'u', 1, 'ws', '', 1, None]
+             for (idx, value) in enumerate(odd + ['2020-02-01T00:00:01+0000'])])
+        self.assertEqual(table.column('save_date')[:4], odd)
+        dated = table.filter(saved_after='2020-02-01T00:00:00Z', saved_before='2020-02-01T00:00:01')
+        self.assertEqual(dated.column('objid'), [0, 1])
+        self.assertEqual(dated[0].save_date, odd[0])
+        with self.assertRaises(ValueError):
+            table.filter(saved_after='yesterday')
+
+    def test_append_after_filter(self):
+        """Filtered tables share string dictionaries, but stay independent."""
+        filtered = self.table.filter(wsid=10)
+        filtered.append(_INFOS[3])
+        self.assertEqual(filtered[-1], ObjInfo(*_INFOS[3]))
+        self.assertEqual(len(self.table), 4)
+        self.table.append([9, 'new', 'New.Type-1.0', '2021-01-01T00:00:00+0000', 1, 'dave', 99,
+                           'ws99', 'e' * 32, 1, None])
+        self.assertEqual(self.table.filter(type_prefix='New.').column('wsid'), [99])
+        self.assertEqual(len(filtered.filter(type_prefix='New.')), 0)
@@ -0,0 +1,95 @@
+import unittest
+
+from kbase_workspace_client import WorkspaceClient
+from kbase_workspace_client.exceptions import InaccessibleWSObject
+from kbase_workspace_client.traverse import EDGE_MEMO
+from test.mock_server import MockKBase
+
+_GENOME = 'KBaseGenomes.Genome-17.0'
+_ASSEMBLY = 'KBaseGenomeAnnotations.Assembly-6.0'
+_READS = 'KBaseFile.PairedEndLibrary-2.0'
+
+
+class TestTraverseRefs(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Two genomes sharing an assembly, made from reads that reference the first genome
+        cls.server = MockKBase().start()
+        cls.server.add_object(1, 1, _GENOME, refs=['1/2/1'])
+        cls.server.add_object(1, 2, _ASSEMBLY, refs=['1/4/1'])
+        cls.server.add_object(1, 3, _GENOME, refs=['1/2/1'])
+        cls.server.add_object(1, 4, _READS, refs=['1/1/1'])
+        cls.server.add_object(1, 5, _GENOME, refs=['9/9/9'])
+        cls.client = WorkspaceClient(cls.server.url)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.server.stop()
+
+    def setUp(self):
+        EDGE_MEMO.clear()
+        self.server.reset_calls()
+
+    def test_breadth_first(self):
+        nodes = list(self.client.traverse_refs(['1/1/1', '1/3', '1/1/1']))
+        self.assertEqual([(node.ref, node.path, node.depth) for node in nodes], [
+            ('1/1/1', '1/1/1', 0),
+            ('1/3/1', '1/3', 0),
+            ('1/2/1', '1/1/1;1/2/1', 1),
+            ('1/4/1', '1/1/1;1/2/1;1/4/1', 2),
+        ])
+        self.assertEqual(nodes[2].info.type, _ASSEMBLY)
+        self.assertEqual(nodes[3].refs, ['1/1/1'])
+        # One request per level
+        self.assertEqual(self.server.calls_to('get_objects2'), 3)
+
+    def test_memo(self):
+        list(self.client.traverse_refs(['1/1/1']))
+        self.server.reset_calls()
+        nodes = list(self.client.traverse_refs(['1/3/1']))
+        self.assertEqual([node.ref for node in nodes], ['1/3/1', '1/2/1', '1/4/1', '1/1/1'])
+        # The shared assembly, reads, and genome edges come from the memo
+        self.assertEqual(self.server.calls_to('get_objects2'), 1)
+
+    def test_start_reached_by_another_start(self):
+        nodes = list(self.client.traverse_refs(['1/1/1', '1/2/1']))
+        self.assertEqual([(node.ref, node.path, node.depth) for node in nodes], [
+            ('1/1/1', '1/1/1', 0),
+            ('1/2/1', '1/2/1', 0),
+            ('1/4/1', '1/2/1;1/4/1', 1),
+        ])
+
+    def test_memo_copies(self):
+        node = next(self.client.traverse_refs(['1/1/1'], max_depth=0))
+        node.refs.append('6/6/6')
+        node = next(self.client.traverse_refs(['1/1/1'], max_depth=0))
+        self.assertEqual(node.refs, ['1/2/1'])
+        self.assertEqual(self.server.calls_to('get_objects2'), 1)
+
+    def test_memo_ref_path(self):
+        list(self.client.traverse_refs(['1/1/1']))
+        self.server.reset_calls()
+        node = next(self.client.traverse_refs(['1/1/1;1/2/1'], max_depth=0))
+        self.assertEqual((node.ref, node.path), ('1/2/1', '1/1/1;1/2/1'))
+        self.assertEqual(self.server.calls_to('get_objects2'), 0)
+
+    def test_max_depth(self):
+        nodes = list(self.client.traverse_refs(['1/1/1'], max_depth=1))
+        self.assertEqual([node.ref for node in nodes], ['1/1/1', '1/2/1'])
+
+    def test_type_filters(self):
+        nodes = list(self.client.traverse_refs(['1/3/1'], types=['Assembly', 'Library']))
+        self.assertEqual([node.ref for node in nodes], ['1/2/1', '1/4/1'])
+        nodes = list(self.client.traverse_refs(['1/3/1'], expand_types=['KBaseGenomes.Genome']))
+        self.assertEqual([node.ref for node in nodes], ['1/3/1', '1/2/1'])
+
+    def test_errors(self):
+        nodes = list(self.client.traverse_refs(['1/5/1', '7/7/7']))
+        errors = [(node.ref, node.path) for node in nodes if node.error is not None]
+        self.assertEqual(errors, [('7/7/7', '7/7/7'), ('9/9/9', '1/5/1;9/9/9')])
+        for node in nodes:
+            if node.error is not None:
+                self.assertIsInstance(node.error, InaccessibleWSObject)
+                self.assertIsNone(node.info)